@@ -7,14 +7,29 @@ from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
 from dotenv import load_dotenv
 
-from db import db, redis_jwt_blocklist
+from db import db, get_redis
+from metrics import init_metrics
+from profiling import init_profiling
+from pools import TimedQueuePool
 import models
+from commands import (
+    recommendations_cli,
+    ingest_cli,
+    check_query_plans_command,
+    check_query_counts_command,
+    profile_cli,
+    import_posts_command,
+    gc_orphans_command,
+    gazetteer_cli,
+)
+from services import ingest_pipeline, get_blocklist
 from resources import (
     UsersBlueprint,
     PostsBlueprint,
     CollectionsBlueprint,
     AuthorsBlueprint,
     TitlesBlueprint,
+    InternalBlueprint,
 )
 
 
@@ -35,22 +50,92 @@ def create_app(db_url=None):
         "DATABASE_URL", "sqlite:///data.db"
     )
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            "poolclass": TimedQueuePool,
+            "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 5)),
+            "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+            "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+            "pool_pre_ping": True,
+        }
     app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024
     app.config["THUMBNAIL_SIZE"] = 256, 256
     app.config["QUOTE_SAMPLE_LENGHT"] = 10
+    app.config["LOCAL_INDEX_TTL"] = 60
+    app.config["LOOKUP_SIMILARITY_THRESHOLD"] = 0.8
+    app.config["LOOKUP_AUTOCOMPLETE_THRESHOLD"] = 0.6
+    app.config["RECOMMENDATIONS_TOP_N"] = 100
+    app.config["GEOCODER_BACKEND"] = os.getenv("GEOCODER_BACKEND", "nominatim")
+    app.config["GEOCODER_CACHE_REDIS"] = True
+    app.config["GEOCODER_CACHE_TTL"] = 30 * 24 * 3600
+    app.config["GEOCODER_CACHE_LOCAL_TTL"] = 3600
+    app.config["GEOCODER_CACHE_SIZE"] = 1024
+    app.config["GEOCODER_CACHE_PRECISION"] = 4
+    app.config["GEOCODER_RATE_LIMIT"] = float(os.getenv("GEOCODER_RATE_LIMIT", 1))
+    app.config["GEOCODER_RATE_BURST"] = 1
+    app.config["GEOCODER_RATE_LIMIT_TIMEOUT"] = 10
+    app.config["GEOCODER_GAZETTEER"] = os.getenv("GEOCODER_GAZETTEER")
+    app.config["GEOCODER_GAZETTEER_MAX_DISTANCE"] = 10000
+    app.config["FILENAME_COUNTER_TTL"] = 24 * 3600
+    app.config["UPLOADER_BACKEND"] = os.getenv("UPLOADER_BACKEND", "cloudinary")
+    app.config["INGEST_EXECUTOR"] = os.getenv("INGEST_EXECUTOR", "thread")
+    app.config["INGEST_WORKERS"] = int(os.getenv("INGEST_WORKERS", 4))
+    app.config["INGEST_JOB_TIMEOUT"] = 600
+    app.config["IMPORT_CHUNK_SIZE"] = 100
+    app.config["IMPORT_UPLOAD_WORKERS"] = 8
+    app.config["RESPONSE_CACHE_ENABLED"] = True
+    app.config["RESPONSE_CACHE_REDIS"] = True
+    app.config["RESPONSE_CACHE_TTL"] = 300
+    app.config["RESPONSE_CACHE_LOCAL_TTL"] = 60
+    app.config["RESPONSE_CACHE_SIZE"] = 1024
     app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
+    # /login issues tokens for integer user ids, which PyJWT rejects as `sub`
+    # unless the check is off.
+    app.config["JWT_VERIFY_SUB"] = False
+    app.config["REDIS_BACKEND"] = os.getenv("REDIS_BACKEND", "redis")
+    app.config["REDIS_URL"] = os.getenv("REDIS_URL", os.getenv("REDIS_BLOCKLIST_URL"))
+    app.config["REDIS_MAX_CONNECTIONS"] = int(os.getenv("REDIS_MAX_CONNECTIONS", 20))
+    app.config["REDIS_POOL_TIMEOUT"] = 5
+    app.config["REDIS_SOCKET_TIMEOUT"] = 5
+    app.config["REDIS_HEALTH_CHECK_INTERVAL"] = 30
+    app.config["INTERNAL_TOKEN"] = os.getenv("INTERNAL_TOKEN")
+    # Without a token the internal endpoints are closed unless localhost is
+    # trusted explicitly; behind a proxy on the same host every request is local.
+    app.config["INTERNAL_ALLOW_LOCAL"] = os.getenv(
+        "INTERNAL_ALLOW_LOCAL", ""
+    ).lower() in ("1", "true")
+    app.config["CLOUDINARY_CLOUD_NAME"] = os.getenv("CLOUDINARY_CLOUD_NAME")
+    app.config["CLOUDINARY_API_KEY"] = os.getenv("CLOUDINARY_API_KEY")
+    app.config["CLOUDINARY_API_SECRET"] = os.getenv("CLOUDINARY_API_SECRET")
+    app.config["JWT_BLOCKLIST_EXPIRY"] = 3600
+    app.config["JWT_BLOCKLIST_SLICE"] = 600
+    app.config["JWT_BLOCKLIST_BLOOM_BITS"] = 2**18
+    app.config["JWT_BLOCKLIST_BLOOM_HASHES"] = 5
+    app.config["METRICS_STORAGE"] = os.getenv("METRICS_STORAGE", "worker")
+    app.config["METRICS_FLUSH_SECONDS"] = 1.0
+    app.config["PROFILE_SAMPLE_RATE"] = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+    app.config["PROFILE_SECRET"] = os.getenv("PROFILE_SECRET")
+    app.config["PROFILE_STORAGE"] = os.getenv("PROFILE_STORAGE", "directory")
+    app.config["PROFILE_DIR"] = os.getenv("PROFILE_DIR", "profiles")
+    app.config["PROFILE_KEEP"] = 200
+    app.config["PROFILE_SLOW_QUERY_SECONDS"] = float(
+        os.getenv("PROFILE_SLOW_QUERY_SECONDS", 0.5)
+    )
 
     warnings.filterwarnings("ignore", message="Multiple schemas resolved to the name")
 
     db.init_app(app)
+    ingest_pipeline.init_app(app)
+    init_metrics(app, get_redis)
+    init_profiling(app)
     migrate = Migrate(app, db)
     api = Api(app)
     jwt = JWTManager(app)
 
     @jwt.token_in_blocklist_loader
     def check_if_token_in_blocklist(jwt_header, jwt_payload):
-        jti = jwt_payload["jti"]
-        return bool(redis_jwt_blocklist.get(jti))
+        return get_blocklist().is_revoked(jwt_payload["jti"])
 
     @jwt.revoked_token_loader
     def revoked_token_callback(jwt_header, jwt_payload):
@@ -92,5 +177,15 @@ def create_app(db_url=None):
     api.register_blueprint(CollectionsBlueprint)
     api.register_blueprint(AuthorsBlueprint)
     api.register_blueprint(TitlesBlueprint)
+    app.register_blueprint(InternalBlueprint)
+
+    app.cli.add_command(recommendations_cli)
+    app.cli.add_command(ingest_cli)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(check_query_counts_command)
+    app.cli.add_command(profile_cli)
+    app.cli.add_command(import_posts_command)
+    app.cli.add_command(gc_orphans_command)
+    app.cli.add_command(gazetteer_cli)
 
     return app
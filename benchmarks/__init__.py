@@ -0,0 +1,10 @@
+from benchmarks.environment import create_benchmark_app
+from benchmarks.data import generate_data, table_counts
+from benchmarks.runner import (
+    run_benchmarks,
+    compare_results,
+    save_results,
+    scenarios,
+    TestClientTarget,
+    HttpTarget,
+)
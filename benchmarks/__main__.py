@@ -0,0 +1,108 @@
+import json
+
+import click
+
+from benchmarks import (
+    HttpTarget,
+    TestClientTarget,
+    compare_results,
+    create_benchmark_app,
+    generate_data,
+    run_benchmarks,
+    save_results,
+    scenarios,
+    table_counts,
+)
+from db import db
+
+SCENARIOS = list(scenarios({"users": 1, "posts": 1}))
+
+
+@click.group(help="Offline benchmarks of the API.")
+def cli():
+    pass
+
+
+@cli.command("generate")
+@click.option("--db-url", required=True, help="E.g. sqlite:///bench.db.")
+@click.option("--users", default=1000, show_default=True)
+@click.option("--authors", default=200, show_default=True)
+@click.option("--titles-per-author", default=5, show_default=True)
+@click.option("--posts", default=20000, show_default=True)
+@click.option("--collections", default=50000, show_default=True)
+@click.option("--seed", default=0, show_default=True)
+@click.option("--batch-size", default=10000, show_default=True)
+@click.option("--reset", is_flag=True, help="Drop all tables first.")
+def generate_command(db_url, reset, **options):
+    """Fill an empty database with synthetic data."""
+    app = create_benchmark_app(db_url)
+    with app.app_context():
+        if reset:
+            db.drop_all()
+        db.create_all()
+        if any(table_counts().values()):
+            raise click.ClickException("The database is not empty, use --reset.")
+        generate_data(
+            **options,
+            progress=lambda table, count: click.echo(f"{table}: {count}"),
+        )
+        click.echo(json.dumps(table_counts()))
+
+
+@cli.command("run")
+@click.option("--db-url", required=True)
+@click.option(
+    "--base-url",
+    help="Benchmark a server running on the same database instead of the "
+    "test client, e.g. http://127.0.0.1:8000.",
+)
+@click.option(
+    "--scenario",
+    "names",
+    multiple=True,
+    type=click.Choice(SCENARIOS),
+    help="Run only these (repeatable).",
+)
+@click.option("--requests", default=200, show_default=True)
+@click.option("--warmup", default=20, show_default=True)
+@click.option("--concurrency", default=1, show_default=True)
+@click.option("--seed", default=0, show_default=True)
+@click.option(
+    "--response-cache/--no-response-cache",
+    default=False,
+    show_default=True,
+    help="Serve cached GET responses (test client only).",
+)
+@click.option("--output", type=click.Path(), help="Save the results as JSON.")
+def run_command(db_url, base_url, names, response_cache, output, **options):
+    """Measure latency and throughput of the endpoints."""
+    app = create_benchmark_app(db_url)
+    app.config["RESPONSE_CACHE_ENABLED"] = response_cache
+    target = HttpTarget(base_url) if base_url else TestClientTarget(app)
+    with app.app_context():
+        results = run_benchmarks(
+            target,
+            names=names,
+            progress=lambda name, result: click.echo(
+                f"{name}: p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, "
+                f"{result['throughput_rps']} req/s, "
+                f"{result['queries_per_request']} queries, "
+                f"{result['errors']} errors"
+            ),
+            **options,
+        )
+    if output:
+        save_results(results, output)
+
+
+@cli.command("compare")
+@click.argument("old", type=click.File())
+@click.argument("new", type=click.File())
+def compare_command(old, new):
+    """Compare two saved results."""
+    for line in compare_results(json.load(old), json.load(new)):
+        click.echo(line)
+
+
+if __name__ == "__main__":
+    cli()
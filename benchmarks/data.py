@@ -0,0 +1,181 @@
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, text
+from werkzeug.security import generate_password_hash
+
+from db import db
+from models import AuthorModel, CollectionModel, PostModel, TitleModel, UserModel
+from services.clusters import rebuild_clusters
+from services.counters import recount_counters
+from services.geocoding import FakeGeocoder
+from services.spatial import geohash_encode
+
+PASSWORD = "benchmark"
+
+FIRST_NAMES = (
+    "Anna Bruno Clarice Dante Elena Franz Gustave Herta Italo Jorge Karen "
+    "Leo Mary Nikolai Olga Primo Rainer Sylvia Thomas Ursula Virginia "
+    "Wislawa Yasunari"
+).split()
+LAST_NAMES = (
+    "Achebe Borges Calvino Dickens Eliot Flaubert Grass Hesse Ishiguro "
+    "Joyce Kafka Lispector Mann Nabokov Orwell Pessoa Rilke Sebald "
+    "Tokarczuk Undset Woolf"
+).split()
+WORDS = (
+    "light house river garden night winter city letter silence memory "
+    "island window mirror journey stone harbour summer station forest "
+    "shadow voice bridge morning rain archive orchard tower street sea road"
+).split()
+
+TABLES = (
+    ("users", UserModel),
+    ("authors", AuthorModel),
+    ("titles", TitleModel),
+    ("posts", PostModel),
+    ("collections", CollectionModel),
+)
+
+
+def table_counts():
+    return {
+        name: db.session.scalar(select(func.count()).select_from(model))
+        for name, model in TABLES
+    }
+
+
+def _insert(model, rows, batch_size, progress):
+    batch = []
+    inserted = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            db.session.execute(insert(model), batch)
+            db.session.commit()
+            inserted += len(batch)
+            progress(model.__tablename__, inserted)
+            batch = []
+    if batch:
+        db.session.execute(insert(model), batch)
+        db.session.commit()
+        progress(model.__tablename__, inserted + len(batch))
+
+
+def _sentence(rng, length):
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def generate_data(
+    users=1000,
+    authors=200,
+    titles_per_author=5,
+    posts=20000,
+    collections=50000,
+    seed=0,
+    batch_size=10000,
+    progress=lambda table, count: None,
+):
+    """Bulk-load synthetic rows into the empty tables of the app's database.
+
+    Ids are assigned here, so every table is written with plain multi-row
+    inserts. Collections favour low post ids, to give the recommendations
+    popular posts to work on.
+    """
+    rng = random.Random(seed)
+    password = generate_password_hash(PASSWORD, method="pbkdf2:sha256", salt_length=8)
+    _insert(
+        UserModel,
+        (
+            {"id": id, "username": f"user{id}", "password": password}
+            for id in range(1, users + 1)
+        ),
+        batch_size,
+        progress,
+    )
+
+    _insert(
+        AuthorModel,
+        (
+            {"id": id, "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"}
+            for id in range(1, authors + 1)
+        ),
+        batch_size,
+        progress,
+    )
+
+    titles = authors * titles_per_author
+    title_authors = [rng.randint(1, authors) for _ in range(titles)]
+    _insert(
+        TitleModel,
+        (
+            {
+                "id": id,
+                "title": _sentence(rng, rng.randint(1, 4)).capitalize(),
+                "author_id": title_authors[id - 1],
+            }
+            for id in range(1, titles + 1)
+        ),
+        batch_size,
+        progress,
+    )
+
+    places = list(FakeGeocoder.PLACES.items())
+    owners = [rng.randint(1, users) for _ in range(posts)]
+    started = datetime.utcnow() - timedelta(seconds=posts)
+
+    def post_rows():
+        for id in range(1, posts + 1):
+            title_id = rng.randint(1, titles)
+            address, (latitude, longitude) = rng.choice(places)
+            quote = _sentence(rng, rng.randint(8, 40))
+            latitude += rng.uniform(-0.1, 0.1)
+            longitude += rng.uniform(-0.1, 0.1)
+            url = f"https://images.invalid/picturesque/bench_{id}"
+            yield {
+                "id": id,
+                "user_id": owners[id - 1],
+                "author_id": title_authors[title_id - 1],
+                "title_id": title_id,
+                "quote": quote,
+                "latitude": latitude,
+                "longitude": longitude,
+                "geohash": geohash_encode(latitude, longitude),
+                "address": address.title(),
+                "filename": f"bench_{id}",
+                "thumbnail_url": f'<img src="{url}_thumb"/>',
+                "photo_url": url,
+                "added": started + timedelta(seconds=id),
+            }
+
+    _insert(PostModel, post_rows(), batch_size, progress)
+
+    def collection_rows():
+        id = 0
+        per_user, extra = divmod(collections, users)
+        for user_id in range(1, users + 1):
+            wanted = min(per_user + (user_id <= extra), posts // 2)
+            chosen = set()
+            while len(chosen) < wanted:
+                post_id = 1 + int(posts * rng.random() ** 3)
+                if owners[post_id - 1] != user_id:
+                    chosen.add(post_id)
+            for post_id in sorted(chosen):
+                id += 1
+                yield {"id": id, "user_id": user_id, "post_id": post_id}
+
+    _insert(CollectionModel, collection_rows(), batch_size, progress)
+    recount_counters()
+    rebuild_clusters()
+    db.session.commit()
+
+    if db.engine.dialect.name == "postgresql":
+        # Explicit ids do not advance the id sequences.
+        for name, _ in TABLES:
+            db.session.execute(
+                text(
+                    f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+                    f"(SELECT max(id) FROM {name}))"
+                )
+            )
+        db.session.commit()
@@ -0,0 +1,18 @@
+import os
+
+from app import create_app
+
+OFFLINE_BACKENDS = {
+    "REDIS_BACKEND": "memory",
+    "GEOCODER_BACKEND": "fake",
+    "UPLOADER_BACKEND": "fake",
+    "INGEST_EXECUTOR": "inline",
+    "JWT_SECRET_KEY": "benchmark-secret-key-benchmark-secret",
+}
+
+
+def create_benchmark_app(db_url):
+    """The app on `db_url`, without outside services unless set in the env."""
+    for name, value in OFFLINE_BACKENDS.items():
+        os.environ.setdefault(name, value)
+    return create_app(db_url)
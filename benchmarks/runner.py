@@ -0,0 +1,267 @@
+import json
+import math
+import random
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from flask import current_app
+from flask_jwt_extended import create_access_token
+from sqlalchemy import select
+
+from benchmarks.data import LAST_NAMES, WORDS, table_counts
+from db import db
+from models import CollectionModel, PostModel
+from pagination import encode_cursor
+from services.query_plans import count_queries
+
+PAGE_SIZE = 50
+
+
+def _uncollected_post(rng, user_id, posts):
+    """A random post `user_id` may add to their collection."""
+    while True:
+        post_id = rng.randint(1, posts)
+        owner = db.session.scalar(select(PostModel.user_id).filter_by(id=post_id))
+        collected = db.session.scalar(
+            select(CollectionModel.id).filter_by(user_id=user_id, post_id=post_id)
+        )
+        if owner is not None and owner != user_id and collected is None:
+            return post_id
+
+
+def scenarios(counts):
+    """Return {name: make(rng)}, `make` returning one iteration's requests.
+
+    A request is (method, url, user id to authenticate as or None).
+    """
+    users, posts = counts["users"], counts["posts"]
+    pages = max(1, math.ceil(posts / PAGE_SIZE))
+
+    def user(rng):
+        return rng.randint(1, users)
+
+    def prefix(rng, words):
+        word = rng.choice(words)
+        return word[: rng.randint(3, len(word))]
+
+    def collect(rng):
+        user_id = user(rng)
+        post_id = _uncollected_post(rng, user_id, posts)
+        return [
+            ("POST", f"/collections/{post_id}", user_id),
+            ("DELETE", f"/collections/{post_id}", user_id),
+        ]
+
+    def feed_page(rng):
+        # A cursor at a random post, so pages come from the whole feed and
+        # not only its start.
+        post_id = rng.randint(1, posts)
+        added = db.session.scalar(select(PostModel.added).filter_by(id=post_id))
+        after = encode_cursor(added, post_id) if added else ""
+        return [("GET", f"/posts/?after={after}&page_size={PAGE_SIZE}", None)]
+
+    return {
+        "posts-feed": feed_page,
+        "posts-page": lambda rng: [
+            ("GET", f"/posts/?page={rng.randint(1, pages)}&page_size={PAGE_SIZE}", None)
+        ],
+        "post": lambda rng: [("GET", f"/posts/{rng.randint(1, posts)}", None)],
+        "posts-search": lambda rng: [
+            ("GET", f"/posts/?q={'+'.join(rng.sample(WORDS, rng.randint(1, 2)))}", None)
+        ],
+        "authors-autocomplete": lambda rng: [
+            ("GET", f"/authors/?q={prefix(rng, LAST_NAMES)}", None)
+        ],
+        "titles-autocomplete": lambda rng: [
+            ("GET", f"/titles/?q={prefix(rng, WORDS)}", None)
+        ],
+        "user-posts": lambda rng: [
+            ("GET", f"/users/{user(rng)}/posts/?page_size={PAGE_SIZE}", None)
+        ],
+        "user-collections": lambda rng: [
+            ("GET", f"/users/{user(rng)}/collections/?page_size={PAGE_SIZE}", None)
+        ],
+        "recommendations": lambda rng: [
+            ("POST", f"/users/recommendations/?page_size={PAGE_SIZE}", user(rng))
+        ],
+        # Last, as it marks recommendations stale.
+        "collection-add-remove": collect,
+    }
+
+
+class TestClientTarget:
+    """Sends requests through the Flask test client, in this process."""
+
+    name = "test client"
+    counts_queries = True
+
+    def __init__(self, app):
+        self.app = app
+
+    def client(self):
+        client = self.app.test_client()
+        return lambda method, url, headers: client.open(
+            url, method=method, headers=headers
+        ).status_code
+
+
+class HttpTarget:
+    """Sends requests to a running server, e.g. gunicorn on the same database."""
+
+    counts_queries = False
+
+    def __init__(self, base_url):
+        self.name = base_url
+        self.base_url = base_url.rstrip("/")
+
+    def client(self):
+        def send(method, url, headers):
+            request = urllib.request.Request(
+                self.base_url + url, method=method, headers=headers
+            )
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as error:
+                return error.code
+
+        return send
+
+
+def _percentile(ordered, share):
+    return ordered[min(len(ordered) - 1, math.ceil(share * len(ordered)) - 1)]
+
+
+def _run_scenario(target, iterations, headers, concurrency):
+    """Return (latencies, errors, wall time) of running every iteration."""
+    chunks = [iterations[start::concurrency] for start in range(concurrency)]
+
+    def work(chunk):
+        send = target.client()
+        latencies, errors = [], 0
+        for requests in chunk:
+            started = time.perf_counter()
+            for method, url, user_id in requests:
+                status = send(method, url, headers(user_id))
+                errors += status >= 400
+            latencies.append(time.perf_counter() - started)
+        return latencies, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(work, chunks))
+    wall = time.perf_counter() - started
+    latencies = sorted(latency for chunk, _ in results for latency in chunk)
+    return latencies, sum(errors for _, errors in results), wall
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    target, names=None, requests=200, warmup=20, concurrency=1, seed=0, progress=print
+):
+    """Benchmark the endpoints of `scenarios` and return the results.
+
+    Must run in an app context. Every scenario first sends `warmup`
+    iterations, which are not measured, so local indexes and caches are
+    built. Latencies are of whole iterations, i.e. both requests of
+    collection-add-remove.
+    """
+    rng = random.Random(seed)
+    counts = table_counts()
+    available = scenarios(counts)
+    tokens = {}
+
+    def headers(user_id):
+        if user_id is None:
+            return {}
+        if user_id not in tokens:
+            tokens[user_id] = create_access_token(identity=user_id)
+        return {"Authorization": f"Bearer {tokens[user_id]}"}
+
+    results = {}
+    for name in names or available:
+        make = available[name]
+        iterations = [make(rng) for _ in range(warmup + requests)]
+        for iteration in iterations:
+            for _, _, user_id in iteration:
+                headers(user_id)
+        db.session.remove()
+
+        _run_scenario(target, iterations[:warmup], headers, 1)
+        if target.counts_queries:
+            with count_queries() as statements:
+                latencies, errors, wall = _run_scenario(
+                    target, iterations[warmup:], headers, concurrency
+                )
+            queries = round(len(statements) / requests, 2)
+        else:
+            latencies, errors, wall = _run_scenario(
+                target, iterations[warmup:], headers, concurrency
+            )
+            queries = None
+
+        results[name] = {
+            "requests": requests,
+            "errors": errors,
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+            "p50_ms": round(_percentile(latencies, 0.5) * 1000, 3),
+            "p90_ms": round(_percentile(latencies, 0.9) * 1000, 3),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3),
+            "throughput_rps": round(requests / wall, 2),
+            "queries_per_request": queries,
+        }
+        progress(name, results[name])
+
+    return {
+        "started": datetime.utcnow().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "database": db.engine.dialect.name,
+        "target": target.name,
+        "response_cache": current_app.config["RESPONSE_CACHE_ENABLED"],
+        "concurrency": concurrency,
+        "seed": seed,
+        "rows": counts,
+        "scenarios": results,
+    }
+
+
+def compare_results(old, new):
+    """Lines comparing two `run_benchmarks` results, scenario by scenario."""
+    lines = []
+    for name, after in new["scenarios"].items():
+        before = old["scenarios"].get(name)
+        if before is None:
+            lines.append(f"{name}: new")
+            continue
+        changes = []
+        for key in ("p50_ms", "p99_ms", "throughput_rps", "queries_per_request"):
+            if before[key] is None or after[key] is None:
+                continue
+            change = (after[key] / before[key] - 1) * 100 if before[key] else 0
+            changes.append(f"{key} {before[key]} -> {after[key]} ({change:+.1f}%)")
+        lines.append(f"{name}: {', '.join(changes)}")
+    return lines
+
+
+def save_results(results, path):
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
@@ -0,0 +1,207 @@
+import os
+
+import click
+from flask import current_app, g
+from flask.cli import AppGroup, with_appcontext
+
+from db import db
+from models import UserModel
+from profiling import get_profile_storage, make_token, summarize
+from services import (
+    refresh_recommendations,
+    ingest_pipeline,
+    check_query_plans,
+    check_query_counts,
+    BulkImporter,
+    collect_orphans,
+    collect_stale_reservations,
+    recount_counters,
+    rebuild_clusters,
+    ImportFormatError,
+    open_import,
+    build_gazetteer,
+)
+
+recommendations_cli = AppGroup(
+    "recommendations", help="Manage precomputed recommendations."
+)
+
+
+@recommendations_cli.command("refresh")
+@click.option(
+    "--all",
+    "refresh_all",
+    is_flag=True,
+    help="Recompute every user, not only stale ones.",
+)
+@click.option("--batch-size", default=100, show_default=True, help="Users per commit.")
+def refresh_recommendations_command(refresh_all, batch_size):
+    """Recompute stored recommendations."""
+    query = db.session.query(UserModel.id).order_by(UserModel.id)
+    if not refresh_all:
+        query = query.filter(UserModel.recommendations_computed.is_(None))
+    user_ids = [user_id for user_id, in query]
+    for count, user_id in enumerate(user_ids, 1):
+        refresh_recommendations(user_id)
+        if count % batch_size == 0:
+            db.session.commit()
+    db.session.commit()
+    click.echo(f"Refreshed recommendations of {len(user_ids)} users.")
+
+
+ingest_cli = AppGroup("ingest", help="Process queued post uploads.")
+
+
+@ingest_cli.command("work")
+@click.option("--once", is_flag=True, help="Exit when no pending job is left.")
+@click.option("--poll-interval", default=1.0, show_default=True)
+def ingest_work_command(once, poll_interval):
+    """Process pending ingest jobs and take over abandoned ones."""
+    ingest_pipeline.work(once=once, poll_interval=poll_interval)
+
+
+@click.command("check-query-plans")
+@with_appcontext
+def check_query_plans_command():
+    """Fail if a hot query does not use an index."""
+    failed = []
+    for name, (uses_index, plan) in check_query_plans().items():
+        click.echo(f"{'ok  ' if uses_index else 'SCAN'} {name}: {'; '.join(plan)}")
+        if not uses_index:
+            failed.append(name)
+    if failed:
+        raise click.ClickException(f"Full table scans in: {', '.join(failed)}.")
+
+
+@click.command("check-query-counts")
+@with_appcontext
+def check_query_counts_command():
+    """Fail if an endpoint runs more queries than its budget."""
+    failed = []
+    for (method, url), (count, budget, status) in check_query_counts().items():
+        if not 200 <= status < 300:
+            outcome = "FAIL"
+        else:
+            outcome = "ok  " if count <= budget else "OVER"
+        click.echo(f"{outcome} {method} {url}: {count}/{budget} ({status})")
+        if outcome != "ok  ":
+            failed.append(url)
+    if failed:
+        raise click.ClickException(f"Failed or over budget: {', '.join(failed)}.")
+
+
+@click.command("import-posts")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--user", "username", required=True, help="Owner of the posts.")
+@click.option("--chunk-size", type=int, help="Posts per transaction.")
+@with_appcontext
+def import_posts_command(path, username, chunk_size):
+    """Import posts from an NDJSON file or a ZIP archive.
+
+    Photos referred to by an NDJSON file are read from its directory.
+    """
+    user = UserModel.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f"No user {username}.")
+    g.metrics_endpoint = "import"
+    config = current_app.config
+    importer = BulkImporter(
+        user.id,
+        chunk_size=chunk_size or config["IMPORT_CHUNK_SIZE"],
+        upload_workers=config["IMPORT_UPLOAD_WORKERS"],
+    )
+    with open(path, "rb") as file:
+        try:
+            source = open_import(file, directory=os.path.dirname(os.path.abspath(path)))
+            report = importer.run(
+                source,
+                lambda report: click.echo(
+                    f"{report['total']} read, {report['created']} created, "
+                    f"{report['failed']} failed"
+                ),
+            )
+        except ImportFormatError as e:
+            raise click.ClickException(str(e))
+    for error in report["errors"]:
+        click.echo(f"line {error['item']}: {error['error']}", err=True)
+
+
+@click.command("gc-orphans")
+@click.option("--batch-size", default=500, show_default=True, help="Rows per commit.")
+@click.option(
+    "--recount", is_flag=True, help="Recompute all counters from the tables first."
+)
+@with_appcontext
+def gc_orphans_command(batch_size, recount):
+    """Delete titles and authors that have no posts left, and filename
+    reservations left by crashed workers."""
+    if recount:
+        recount_counters()
+        rebuild_clusters()
+        db.session.commit()
+    titles, authors = collect_orphans(batch_size=batch_size)
+    reservations = collect_stale_reservations()
+    click.echo(
+        f"Deleted {titles} titles, {authors} authors "
+        f"and {reservations} filename reservations."
+    )
+
+
+gazetteer_cli = AppGroup("gazetteer", help="Build the offline geocoder's data.")
+
+
+@gazetteer_cli.command("build")
+@click.argument("source", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output", type=click.Path(dir_okay=False))
+@click.option(
+    "--admin1",
+    type=click.Path(exists=True, dir_okay=False),
+    help="GeoNames admin1CodesASCII.txt, for region names.",
+)
+@click.option(
+    "--countries",
+    type=click.Path(exists=True, dir_okay=False),
+    help="GeoNames countryInfo.txt, for country names.",
+)
+@click.option(
+    "--feature-classes", default="P", show_default=True, help="Classes to keep."
+)
+@click.option("--min-population", default=0, show_default=True)
+@click.option("--alternate-names", is_flag=True, help="Index alternate names too.")
+def gazetteer_build_command(
+    source, output, admin1, countries, feature_classes, min_population, alternate_names
+):
+    """Build a gazetteer file from a GeoNames dump (e.g. cities500.zip)."""
+    count = build_gazetteer(
+        source,
+        output,
+        admin1=admin1,
+        countries=countries,
+        feature_classes=feature_classes,
+        min_population=min_population,
+        alternate_names=alternate_names,
+    )
+    click.echo(f"Wrote {count} places to {output}.")
+
+
+profile_cli = AppGroup("profile", help="Profile requests and read the results.")
+
+
+@profile_cli.command("token")
+def profile_token_command():
+    """Print an X-Profile header value, valid for five minutes."""
+    secret = current_app.config["PROFILE_SECRET"]
+    if not secret:
+        raise click.ClickException("PROFILE_SECRET is not set.")
+    click.echo(make_token(secret))
+
+
+@profile_cli.command("summary")
+@click.option("--endpoint", help="Only requests to this endpoint.")
+@click.option("--limit", default=20, show_default=True, help="Rows per section.")
+def profile_summary_command(endpoint, limit):
+    """Summarize the stored profiles."""
+    profiles = get_profile_storage().load()
+    if endpoint:
+        profiles = (item for item in profiles if item[0]["endpoint"] == endpoint)
+    click.echo(summarize(profiles, limit=limit))
@@ -1,12 +1,34 @@
-import os
-from dotenv import load_dotenv
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
-import redis
 
-load_dotenv()
+from memory_redis import MemoryRedis
+from metrics import InstrumentedRedis
+from pools import TimedRedisPool
 
 db = SQLAlchemy()
 
-redis_jwt_blocklist = redis.from_url(
-    os.getenv("REDIS_URL", os.environ["REDIS_BLOCKLIST_URL"])
-)
+
+def get_redis():
+    """The app's Redis client, created on first use.
+
+    The client connects lazily through a bounded, blocking pool. With
+    REDIS_BACKEND=memory an in-process MemoryRedis is used instead.
+    """
+    if "redis" not in current_app.extensions:
+        config = current_app.config
+        if config["REDIS_BACKEND"] == "memory":
+            client = MemoryRedis()
+        elif config["REDIS_URL"]:
+            pool = TimedRedisPool.from_url(
+                config["REDIS_URL"],
+                max_connections=config["REDIS_MAX_CONNECTIONS"],
+                timeout=config["REDIS_POOL_TIMEOUT"],
+                socket_timeout=config["REDIS_SOCKET_TIMEOUT"],
+                socket_connect_timeout=config["REDIS_SOCKET_TIMEOUT"],
+                health_check_interval=config["REDIS_HEALTH_CHECK_INTERVAL"],
+            )
+            client = InstrumentedRedis(connection_pool=pool)
+        else:
+            raise RuntimeError("REDIS_URL or REDIS_BLOCKLIST_URL must be set.")
+        current_app.extensions["redis"] = client
+    return current_app.extensions["redis"]
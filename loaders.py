@@ -0,0 +1,33 @@
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+from models import AuthorModel, PostModel, TitleModel
+
+# Loader options matching what each response schema serializes, so a page
+# costs a fixed number of queries whatever its size. These are functions
+# because the backref attributes only exist once the mappers are configured.
+
+
+def post_loaders(in_collection=True):
+    """For PostSchema: author, title and (unless excluded) in_collection."""
+    options = [joinedload(PostModel.author), joinedload(PostModel.title)]
+    if in_collection:
+        options.append(selectinload(PostModel.in_collection))
+    return options
+
+
+def title_loaders():
+    """For TitleSchema: the author and the posts (only rendered by id)."""
+    return [
+        joinedload(TitleModel.author),
+        selectinload(TitleModel.posts).options(load_only(PostModel.id)),
+    ]
+
+
+def author_loaders():
+    """For AuthorSchema: titles and their posts."""
+    return [
+        selectinload(AuthorModel.titles)
+        .selectinload(TitleModel.posts)
+        .options(load_only(PostModel.id))
+    ]
+
@@ -0,0 +1,217 @@
+import queue
+import threading
+import time
+
+from redis import RedisError
+
+
+class MemoryRedis:
+    """In-process stand-in for the few Redis commands the app uses.
+
+    Selected with REDIS_BACKEND=memory for tests, benchmarks and running
+    without outside services. Everything lives in this process, so it is
+    only correct with a single worker.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._expires = {}
+        self._sorted_sets = {}
+        self._lists = {}
+        self._hashes = {}
+        self._subscribers = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode()
+
+    def _alive(self, key):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._values.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._values
+
+    def get(self, key):
+        with self._lock:
+            return self._values[key] if self._alive(key) else None
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._alive(key):
+                return None
+            self._values[key] = self._encode(value)
+            self._expires.pop(key, None)
+            if ex is not None:
+                self.expire(key, ex)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            deleted = sum(self._alive(key) for key in keys)
+            for key in keys:
+                self._values.pop(key, None)
+                self._expires.pop(key, None)
+                self._sorted_sets.pop(key, None)
+                self._lists.pop(key, None)
+                self._hashes.pop(key, None)
+            return deleted
+
+    def exists(self, *keys):
+        with self._lock:
+            return sum(self._alive(key) for key in keys)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self.get(key) or 0) + 1
+            self._values[key] = self._encode(value)
+            return value
+
+    def expire(self, key, seconds):
+        if hasattr(seconds, "total_seconds"):
+            seconds = seconds.total_seconds()
+        with self._lock:
+            if not self._alive(key):
+                return False
+            self._expires[key] = time.monotonic() + seconds
+            return True
+
+    def zadd(self, key, mapping):
+        with self._lock:
+            members = self._sorted_sets.setdefault(key, {})
+            mapping = {
+                self._encode(member): float(score) for member, score in mapping.items()
+            }
+            added = len(mapping.keys() - members.keys())
+            members.update(mapping)
+            return added
+
+    def zrangebyscore(self, key, min, max, withscores=False):
+        min, max = float(min), float(max)
+        with self._lock:
+            members = sorted(
+                self._sorted_sets.get(key, {}).items(), key=lambda item: item[1]
+            )
+        found = [(member, score) for member, score in members if min <= score <= max]
+        return found if withscores else [member for member, _ in found]
+
+    def zremrangebyscore(self, key, min, max):
+        min, max = float(min), float(max)
+        with self._lock:
+            members = self._sorted_sets.get(key, {})
+            removed = [
+                member for member, score in members.items() if min <= score <= max
+            ]
+            for member in removed:
+                del members[member]
+            return len(removed)
+
+    def lpush(self, key, *values):
+        with self._lock:
+            items = self._lists.setdefault(key, [])
+            for value in values:
+                items.insert(0, self._encode(value))
+            return len(items)
+
+    def ltrim(self, key, start, end):
+        with self._lock:
+            items = self._lists.get(key, [])
+            items[:] = items[start : (end + 1) or None]
+            return True
+
+    def lrange(self, key, start, end):
+        with self._lock:
+            return list(self._lists.get(key, [])[start : (end + 1) or None])
+
+    def hincrbyfloat(self, key, field, amount=1.0):
+        with self._lock:
+            fields = self._hashes.setdefault(key, {})
+            field = self._encode(field)
+            value = float(fields.get(field, 0)) + float(amount)
+            fields[field] = self._encode(repr(value))
+            return value
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._hashes.get(key, {}))
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for messages in subscribers:
+            messages.put(
+                {"type": "message", "channel": channel, "data": self._encode(message)}
+            )
+        return len(subscribers)
+
+    def pubsub(self, **kwargs):
+        return MemoryPubSub(self)
+
+    def pipeline(self, transaction=True):
+        return MemoryPipeline(self)
+
+    def register_script(self, script):
+        return MemoryScript()
+
+
+class MemoryPipeline:
+    """Queues commands and runs them on `execute`, like a Redis pipeline."""
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._redis, name)
+
+        def queue_command(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+
+        return queue_command
+
+    def execute(self):
+        with self._redis._lock:
+            results = [
+                method(*args, **kwargs) for method, args, kwargs in self._commands
+            ]
+        self._commands = []
+        return results
+
+
+class MemoryPubSub:
+    def __init__(self, redis):
+        self._redis = redis
+        self._messages = queue.Queue()
+        self._channels = []
+
+    def subscribe(self, *channels):
+        with self._redis._lock:
+            for channel in channels:
+                self._redis._subscribers.setdefault(channel, []).append(self._messages)
+                self._channels.append(channel)
+
+    def get_message(self, timeout=0.0):
+        try:
+            return self._messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        with self._redis._lock:
+            for channel in self._channels:
+                self._redis._subscribers[channel].remove(self._messages)
+        self._channels = []
+
+
+class MemoryScript:
+    """Lua scripts cannot run in memory; callers fall back to local logic."""
+
+    def __call__(self, keys=None, args=None):
+        raise RedisError("Scripts are not supported by MemoryRedis.")
@@ -0,0 +1,341 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import redis
+from redis import RedisError
+from flask import g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Redis hash holding the totals of all workers with METRICS_STORAGE=redis.
+SHARED_KEY = "metrics"
+
+HELP = {
+    "http_request_duration_seconds": ("histogram", "Request latency."),
+    "sql_queries_total": ("counter", "SQL statements executed."),
+    "sql_query_seconds_total": ("counter", "Time spent executing SQL."),
+    "redis_commands_total": ("counter", "Redis commands and pipelines sent."),
+    "redis_command_seconds_total": ("counter", "Time spent in Redis calls."),
+    "external_call_duration_seconds": (
+        "histogram",
+        "Geocoder and photo storage calls.",
+    ),
+    "ingest_stage_duration_seconds": ("histogram", "Post ingest stages."),
+    "import_stage_duration_seconds": ("histogram", "Bulk import stages per chunk."),
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Registry:
+    """Counters and histograms, in Prometheus text format.
+
+    By default every worker counts for itself and its series carry a
+    `worker` label, so a restarted worker starts new series instead of
+    making a counter go backwards. After `share()` the workers add what
+    they counted to totals in Redis every `interval` seconds (see `flush`)
+    and any of them renders the totals of all.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.shared = False
+        self.interval = 1.0
+        self._redis = None
+        self._flushed = time.monotonic()
+
+    def share(self, redis, interval=1.0):
+        """Keep the totals in Redis; `redis` returns the client to use."""
+        self.shared = True
+        self.interval = interval
+        self._redis = redis
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * len(self.buckets) + [0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def flush(self, force=False):
+        """Add the values counted since the last flush to the totals in Redis.
+
+        Does nothing unless shared, and unless `interval` has passed or
+        `force` is given. Values that cannot be sent are kept for the next
+        flush.
+        """
+        now = time.monotonic()
+        if not self.shared or (not force and now - self._flushed < self.interval):
+            return
+        with self._lock:
+            self._flushed = now
+            counters, self._counters = self._counters, {}
+            histograms, self._histograms = self._histograms, {}
+        fields = {}
+        for (name, labels), value in counters.items():
+            fields[json.dumps(["counter", name, labels])] = value
+        for (name, labels), values in histograms.items():
+            for index, value in enumerate(values):
+                fields[json.dumps(["histogram", name, labels, index])] = value
+        if not fields:
+            return
+        try:
+            pipeline = self._redis().pipeline(transaction=False)
+            for field, value in fields.items():
+                pipeline.hincrbyfloat(SHARED_KEY, field, value)
+            pipeline.execute()
+        except RedisError:
+            with self._lock:
+                for key, value in counters.items():
+                    self._counters[key] = self._counters.get(key, 0) + value
+                for key, values in histograms.items():
+                    histogram = self._histograms.setdefault(key, [0] * len(values))
+                    for index, value in enumerate(values):
+                        histogram[index] += value
+
+    def _load(self):
+        counters, histograms = {}, {}
+        for field, value in self._redis().hgetall(SHARED_KEY).items():
+            kind, name, labels, *index = json.loads(field)
+            key = (name, tuple(tuple(label) for label in labels))
+            value = float(value)
+            if value.is_integer():
+                value = int(value)
+            if kind == "counter":
+                counters[key] = value
+            else:
+                histogram = histograms.setdefault(key, [0] * (len(self.buckets) + 2))
+                histogram[index[0]] = value
+        return counters, histograms
+
+    def render(self, gauges=()):
+        """Return the exposition text; `gauges` are (name, help, labels, value)."""
+        if self.shared:
+            self.flush(force=True)
+            counters, histograms = self._load()
+            counters, histograms = sorted(counters.items()), sorted(histograms.items())
+        else:
+            worker = (("worker", os.getpid()),)
+            with self._lock:
+                counters = sorted(
+                    ((name, labels + worker), value)
+                    for (name, labels), value in self._counters.items()
+                )
+                histograms = sorted(
+                    ((name, labels + worker), list(values))
+                    for (name, labels), values in self._histograms.items()
+                )
+        lines = []
+        described = set()
+
+        def describe(name, kind, text):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name, *HELP.get(name, ("counter", name)))
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), values in histograms:
+            describe(name, *HELP.get(name, ("histogram", name)))
+            for bound, count in zip(self.buckets, values):
+                bucket_labels = labels + (("le", bound),)
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+            lines.append(
+                f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} "
+                f"{values[-1]}"
+            )
+            lines.append(f"{name}_sum{_format_labels(labels)} {values[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {values[-1]}")
+        for name, text, labels, value in gauges:
+            describe(name, "gauge", text)
+            lines.append(f"{name}{_format_labels(tuple(labels.items()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Registry()
+
+
+def current_endpoint():
+    """The endpoint that work is attributed to, e.g. "posts.PostsList"."""
+    if has_request_context():
+        return request.endpoint or "unknown"
+    if has_app_context():
+        return g.get("metrics_endpoint", "background")
+    return "background"
+
+
+class TimedCalls:
+    """Proxy timing every method call of `target` as `service`."""
+
+    def __init__(self, target, service):
+        self._target = target
+        self._service = service
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = attribute(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                metrics.observe(
+                    "external_call_duration_seconds",
+                    time.perf_counter() - started,
+                    service=self._service,
+                    operation=name,
+                    outcome=outcome,
+                )
+
+        return call
+
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    def execute(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().execute(*args, **kwargs)
+        finally:
+            _record_redis("PIPELINE", started)
+
+
+class InstrumentedRedis(redis.Redis):
+    """Redis client counting commands and their time per endpoint."""
+
+    def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            _record_redis(str(args[0]).upper(), started)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+def _record_redis(command, started):
+    endpoint = current_endpoint()
+    metrics.inc("redis_commands_total", endpoint=endpoint, command=command)
+    metrics.inc(
+        "redis_command_seconds_total",
+        time.perf_counter() - started,
+        endpoint=endpoint,
+    )
+
+
+_query_listeners = []
+
+
+def on_query(listener):
+    """Call `listener(statement, duration)` after every SQL statement.
+
+    Metrics and profiling share these engine events instead of timing
+    each statement twice.
+    """
+    _query_listeners.append(listener)
+    return listener
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(connection, cursor, statement, parameters, context, many):
+    connection.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "handle_error")
+def _drop_query_timer(exception_context):
+    if exception_context.connection is not None:
+        started = exception_context.connection.info.get("query_started")
+        if started:
+            started.pop()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_query_timer(connection, cursor, statement, parameters, context, many):
+    duration = time.perf_counter() - connection.info["query_started"].pop()
+    for listener in _query_listeners:
+        listener(statement, duration)
+
+
+@on_query
+def _record_query(statement, duration):
+    endpoint = current_endpoint()
+    metrics.inc("sql_queries_total", endpoint=endpoint)
+    metrics.inc("sql_query_seconds_total", duration, endpoint=endpoint)
+
+
+def init_metrics(app, redis):
+    """Time requests; with METRICS_STORAGE=redis the workers share their
+    metrics through the client `redis` returns."""
+    if app.config["METRICS_STORAGE"] == "redis":
+        metrics.share(redis, app.config["METRICS_FLUSH_SECONDS"])
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def remember_status(response):
+        g.request_status = response.status_code
+        return response
+
+    # Recorded on teardown, which also runs for requests that raised.
+    @app.teardown_request
+    def record_request(exception):
+        started = g.pop("request_started", None)
+        if started is not None and request.endpoint != "internal.metrics_view":
+            metrics.observe(
+                "http_request_duration_seconds",
+                time.perf_counter() - started,
+                blueprint=request.blueprint or "",
+                endpoint=request.endpoint or "unknown",
+                method=request.method,
+                status=g.pop("request_status", 500),
+            )
+        metrics.flush()
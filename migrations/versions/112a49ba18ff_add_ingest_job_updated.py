@@ -0,0 +1,26 @@
+"""add ingest job claim time
+
+Revision ID: 112a49ba18ff
+Revises: 9fde93cfbc78
+Create Date: 2026-10-19 10:02:17.640391
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "112a49ba18ff"
+down_revision = "9fde93cfbc78"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("ingest_jobs", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("updated", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("ingest_jobs", schema=None) as batch_op:
+        batch_op.drop_column("updated")
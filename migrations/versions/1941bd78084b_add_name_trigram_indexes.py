@@ -0,0 +1,42 @@
+"""add name trigram indexes
+
+Revision ID: 1941bd78084b
+Revises: c51fab4df854
+Create Date: 2026-10-18 10:02:47.530611
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "1941bd78084b"
+down_revision = "c51fab4df854"
+branch_labels = None
+depends_on = None
+
+TRIGRAM_INDEXES = (
+    ("ix_authors_name_trgm", "authors", "name"),
+    ("ix_titles_title_trgm", "titles", "title"),
+)
+
+
+def upgrade():
+    # Other databases use the in-process n-gram index from services.lookup.
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        op.create_index(
+            name,
+            table,
+            [sa.text(f"lower({column}) gin_trgm_ops")],
+            postgresql_using="gin",
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for name, table, _ in TRIGRAM_INDEXES:
+        op.drop_index(name, table_name=table)
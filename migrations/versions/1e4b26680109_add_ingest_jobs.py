@@ -0,0 +1,47 @@
+"""add ingest jobs
+
+Revision ID: 1e4b26680109
+Revises: c1934519019e
+Create Date: 2026-10-18 12:40:31.774120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "1e4b26680109"
+down_revision = "c1934519019e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ingest_jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("author", sa.String(length=80), nullable=False),
+        sa.Column("title", sa.String(length=80), nullable=False),
+        sa.Column("quote", sa.Text(), nullable=False),
+        sa.Column("latitude", sa.Float(), nullable=True),
+        sa.Column("longitude", sa.Float(), nullable=True),
+        sa.Column("address", sa.String(), nullable=True),
+        sa.Column("photo", sa.LargeBinary(), nullable=True),
+        sa.Column("photo_name", sa.String(length=256), nullable=False),
+        sa.Column("error", sa.String(length=256), nullable=True),
+        sa.Column("post_id", sa.Integer(), nullable=True),
+        sa.Column("added", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["post_id"], ["posts.id"], ondelete="SET NULL"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_ingest_jobs_status"), "ingest_jobs", ["status"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_ingest_jobs_status"), table_name="ingest_jobs")
+    op.drop_table("ingest_jobs")
@@ -0,0 +1,74 @@
+"""add lookup indexes
+
+Revision ID: 44ca4f3cd9e1
+Revises: 562757124e64
+Create Date: 2026-10-18 14:52:19.603877
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "44ca4f3cd9e1"
+down_revision = "562757124e64"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The unique constraint needs the duplicate entries gone, keep the oldest.
+    op.execute(
+        "DELETE FROM collections WHERE id NOT IN "
+        "(SELECT min(id) FROM collections GROUP BY user_id, post_id)"
+    )
+    with op.batch_alter_table("collections", schema=None) as batch_op:
+        # Also serves the lookups by user_id.
+        batch_op.create_unique_constraint(
+            "uq_collections_user_id_post_id", ["user_id", "post_id"]
+        )
+        batch_op.create_index(
+            batch_op.f("ix_collections_post_id"), ["post_id"], unique=False
+        )
+
+    with op.batch_alter_table("posts", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_posts_user_id_added", ["user_id", "added"], unique=False
+        )
+        batch_op.create_index("ix_posts_added_id", ["added", "id"], unique=False)
+        batch_op.create_index(
+            batch_op.f("ix_posts_author_id"), ["author_id"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_posts_title_id"), ["title_id"], unique=False
+        )
+
+    with op.batch_alter_table("authors", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_authors_name"), ["name"], unique=False)
+
+    with op.batch_alter_table("titles", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_titles_title_author_id", ["title", "author_id"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_titles_author_id"), ["author_id"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("titles", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_titles_author_id"))
+        batch_op.drop_index("ix_titles_title_author_id")
+
+    with op.batch_alter_table("authors", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_authors_name"))
+
+    with op.batch_alter_table("posts", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_posts_title_id"))
+        batch_op.drop_index(batch_op.f("ix_posts_author_id"))
+        batch_op.drop_index("ix_posts_added_id")
+        batch_op.drop_index("ix_posts_user_id_added")
+
+    with op.batch_alter_table("collections", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_collections_post_id"))
+        batch_op.drop_constraint("uq_collections_user_id_post_id", type_="unique")
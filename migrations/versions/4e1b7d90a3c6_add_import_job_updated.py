@@ -0,0 +1,26 @@
+"""add import job claim time
+
+Revision ID: 4e1b7d90a3c6
+Revises: cf2c52f19202
+Create Date: 2026-10-19 15:03:52.207114
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "4e1b7d90a3c6"
+down_revision = "cf2c52f19202"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("import_jobs", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("updated", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("import_jobs", schema=None) as batch_op:
+        batch_op.drop_column("updated")
@@ -0,0 +1,29 @@
+"""make post filenames unique
+
+Revision ID: 562757124e64
+Revises: 1e4b26680109
+Create Date: 2026-10-18 14:05:52.390144
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "562757124e64"
+down_revision = "1e4b26680109"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Earlier uploads could race on a name; keep the oldest post's filename.
+    op.execute(
+        "UPDATE posts SET filename = filename || '_' || id "
+        "WHERE id NOT IN (SELECT min(id) FROM posts GROUP BY filename)"
+    )
+    op.create_index(op.f("ix_posts_filename"), "posts", ["filename"], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f("ix_posts_filename"), table_name="posts")
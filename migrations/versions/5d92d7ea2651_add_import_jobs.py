@@ -0,0 +1,43 @@
+"""add import jobs
+
+Revision ID: 5d92d7ea2651
+Revises: 44ca4f3cd9e1
+Create Date: 2026-10-18 16:05:12.408311
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "5d92d7ea2651"
+down_revision = "44ca4f3cd9e1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "import_jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("archive", sa.LargeBinary(), nullable=True),
+        sa.Column("archive_name", sa.String(length=256), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("created", sa.Integer(), nullable=False),
+        sa.Column("failed", sa.Integer(), nullable=False),
+        sa.Column("errors", sa.JSON(), nullable=True),
+        sa.Column("error", sa.String(length=256), nullable=True),
+        sa.Column("added", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_import_jobs_status"), "import_jobs", ["status"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_import_jobs_status"), table_name="import_jobs")
+    op.drop_table("import_jobs")
@@ -0,0 +1,57 @@
+"""unaccent name trigram indexes
+
+Revision ID: 91bf31590d32
+Revises: d73a5e0c81f4
+Create Date: 2026-10-20 09:26:41.207385
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "91bf31590d32"
+down_revision = "d73a5e0c81f4"
+branch_labels = None
+depends_on = None
+
+TRIGRAM_INDEXES = (
+    ("ix_authors_name_trgm", "authors", "name"),
+    ("ix_titles_title_trgm", "titles", "title"),
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    # unaccent() is only STABLE, as its dictionary could change; indexes
+    # need an IMMUTABLE function.
+    op.execute(
+        "CREATE OR REPLACE FUNCTION immutable_unaccent(text) RETURNS text "
+        "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+        "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$"
+    )
+    # Expressions must match services.lookup.fold_name().
+    for name, table, column in TRIGRAM_INDEXES:
+        op.drop_index(name, table_name=table)
+        op.create_index(
+            name,
+            table,
+            [sa.text(f"lower(immutable_unaccent({column})) gin_trgm_ops")],
+            postgresql_using="gin",
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        op.drop_index(name, table_name=table)
+        op.create_index(
+            name,
+            table,
+            [sa.text(f"lower({column}) gin_trgm_ops")],
+            postgresql_using="gin",
+        )
+    op.execute("DROP FUNCTION immutable_unaccent(text)")
@@ -0,0 +1,43 @@
+"""add post clusters
+
+Revision ID: 9fde93cfbc78
+Revises: b8c7b8d62bb9
+Create Date: 2026-10-18 21:16:09.407263
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "9fde93cfbc78"
+down_revision = "b8c7b8d62bb9"
+branch_labels = None
+depends_on = None
+
+# Must match services.clusters.CLUSTER_PRECISION.
+CLUSTER_PRECISION = 8
+
+
+def upgrade():
+    op.create_table(
+        "post_clusters",
+        sa.Column("precision", sa.Integer(), nullable=False),
+        sa.Column("geohash", sa.String(length=12), nullable=False),
+        sa.Column("post_count", sa.Integer(), nullable=False),
+        sa.Column("latitude_sum", sa.Float(), nullable=False),
+        sa.Column("longitude_sum", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("precision", "geohash"),
+    )
+    for precision in range(1, CLUSTER_PRECISION + 1):
+        op.execute(
+            "INSERT INTO post_clusters "
+            "(precision, geohash, post_count, latitude_sum, longitude_sum) "
+            f"SELECT {precision}, substr(geohash, 1, {precision}), count(*), "
+            "sum(latitude), sum(longitude) FROM posts "
+            f"WHERE geohash IS NOT NULL GROUP BY substr(geohash, 1, {precision})"
+        )
+
+
+def downgrade():
+    op.drop_table("post_clusters")
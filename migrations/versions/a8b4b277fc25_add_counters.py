@@ -0,0 +1,63 @@
+"""add post and collection counters
+
+Revision ID: a8b4b277fc25
+Revises: 5d92d7ea2651
+Create Date: 2026-10-18 18:21:47.913520
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "a8b4b277fc25"
+down_revision = "5d92d7ea2651"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("titles", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("post_count", sa.Integer(), server_default="0", nullable=False)
+        )
+        batch_op.create_index(
+            batch_op.f("ix_titles_post_count"), ["post_count"], unique=False
+        )
+    with op.batch_alter_table("authors", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("post_count", sa.Integer(), server_default="0", nullable=False)
+        )
+        batch_op.create_index(
+            batch_op.f("ix_authors_post_count"), ["post_count"], unique=False
+        )
+    with op.batch_alter_table("posts", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "collected_count", sa.Integer(), server_default="0", nullable=False
+            )
+        )
+
+    op.execute(
+        "UPDATE titles SET post_count = "
+        "(SELECT count(*) FROM posts WHERE posts.title_id = titles.id)"
+    )
+    op.execute(
+        "UPDATE authors SET post_count = "
+        "(SELECT count(*) FROM posts WHERE posts.author_id = authors.id)"
+    )
+    op.execute(
+        "UPDATE posts SET collected_count = "
+        "(SELECT count(*) FROM collections WHERE collections.post_id = posts.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("posts", schema=None) as batch_op:
+        batch_op.drop_column("collected_count")
+    with op.batch_alter_table("authors", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_authors_post_count"))
+        batch_op.drop_column("post_count")
+    with op.batch_alter_table("titles", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_titles_post_count"))
+        batch_op.drop_column("post_count")
@@ -0,0 +1,68 @@
+"""add post location indexes
+
+Revision ID: b8c7b8d62bb9
+Revises: a8b4b277fc25
+Create Date: 2026-10-18 20:04:31.552817
+
+"""
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from services.spatial import geohash_encode
+
+# revision identifiers, used by Alembic.
+revision = "b8c7b8d62bb9"
+down_revision = "a8b4b277fc25"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("posts", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("geohash", sa.String(length=12), nullable=True))
+        batch_op.create_index(batch_op.f("ix_posts_geohash"), ["geohash"], unique=False)
+
+    # Expression must match services.spatial.location_point().
+    if op.get_bind().dialect.name == "postgresql":
+        op.create_index(
+            "ix_posts_location",
+            "posts",
+            [sa.text("point(longitude, latitude)")],
+            postgresql_using="gist",
+        )
+
+    # Geohashes are computed in Python, so they cannot be part of a SQL script.
+    if context.is_offline_mode():
+        return
+    posts = sa.table(
+        "posts",
+        sa.column("id", sa.Integer),
+        sa.column("latitude", sa.Float),
+        sa.column("longitude", sa.Float),
+        sa.column("geohash", sa.String),
+    )
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select(posts.c.id, posts.c.latitude, posts.c.longitude).where(
+            posts.c.latitude.is_not(None), posts.c.longitude.is_not(None)
+        )
+    ).all()
+    if rows:
+        connection.execute(
+            posts.update()
+            .where(posts.c.id == sa.bindparam("post_id"))
+            .values(geohash=sa.bindparam("post_geohash")),
+            [
+                {"post_id": id, "post_geohash": geohash_encode(latitude, longitude)}
+                for id, latitude, longitude in rows
+            ],
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index("ix_posts_location", table_name="posts")
+    with op.batch_alter_table("posts", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_posts_geohash"))
+        batch_op.drop_column("geohash")
@@ -0,0 +1,45 @@
+"""add recommendations
+
+Revision ID: c1934519019e
+Revises: 1941bd78084b
+Create Date: 2026-10-18 11:24:10.907215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c1934519019e"
+down_revision = "1941bd78084b"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "recommendations",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("post_id", sa.Integer(), nullable=False),
+        sa.Column("score", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["post_id"], ["posts.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "post_id"),
+    )
+    op.create_index(
+        "ix_recommendations_user_id_score",
+        "recommendations",
+        ["user_id", "score"],
+        unique=False,
+    )
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("recommendations_computed", sa.DateTime(), nullable=True)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.drop_column("recommendations_computed")
+    op.drop_index("ix_recommendations_user_id_score", table_name="recommendations")
+    op.drop_table("recommendations")
@@ -0,0 +1,44 @@
+"""add post search indexes
+
+Revision ID: c51fab4df854
+Revises: 654e7829dbc8
+Create Date: 2026-10-18 09:12:04.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c51fab4df854"
+down_revision = "654e7829dbc8"
+branch_labels = None
+depends_on = None
+
+# Expressions must match services.search.search_document().
+SEARCH_INDEXES = (
+    ("ix_titles_title_search", "titles", "title"),
+    ("ix_authors_name_search", "authors", "name"),
+    ("ix_posts_quote_search", "posts", "quote"),
+    ("ix_posts_address_search", "posts", "address"),
+)
+
+
+def upgrade():
+    # Other databases use the in-process index from services.search.
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for name, table, column in SEARCH_INDEXES:
+        op.create_index(
+            name,
+            table,
+            [sa.text(f"to_tsvector('simple', coalesce({column}, ''))")],
+            postgresql_using="gin",
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for name, table, _ in SEARCH_INDEXES:
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,29 @@
+"""add filename reservations
+
+Revision ID: cf2c52f19202
+Revises: 112a49ba18ff
+Create Date: 2026-10-19 14:21:40.118306
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "cf2c52f19202"
+down_revision = "112a49ba18ff"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "filename_reservations",
+        sa.Column("filename", sa.String(length=80), nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("filename"),
+    )
+
+
+def downgrade():
+    op.drop_table("filename_reservations")
@@ -0,0 +1,33 @@
+"""add recommendations version
+
+Revision ID: d73a5e0c81f4
+Revises: 4e1b7d90a3c6
+Create Date: 2026-10-19 16:40:11.583920
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "d73a5e0c81f4"
+down_revision = "4e1b7d90a3c6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "recommendations_version",
+                sa.Integer(),
+                server_default="0",
+                nullable=False,
+            )
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.drop_column("recommendations_version")
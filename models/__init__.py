@@ -3,3 +3,8 @@ from models.authors import AuthorModel
 from models.titles import TitleModel
 from models.collections import CollectionModel
 from models.posts import PostModel
+from models.recommendations import RecommendationModel
+from models.ingest_jobs import IngestJobModel
+from models.import_jobs import ImportJobModel
+from models.post_clusters import PostClusterModel
+from models.filename_reservations import FilenameReservationModel
@@ -5,9 +5,11 @@ class AuthorModel(db.Model):
     __tablename__ = "authors"
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(80), nullable=False)
-    titles = db.relationship(
-        "TitleModel", backref="author", lazy="dynamic")
+    name = db.Column(db.String(80), nullable=False, index=True)
+    post_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0", index=True
+    )
+    titles = db.relationship("TitleModel", backref="author")
     posts = db.relationship("PostModel", backref="author", lazy="dynamic")
 
     def __repr__(self):
@@ -4,8 +4,13 @@ from datetime import datetime
 
 class CollectionModel(db.Model):
     __tablename__ = "collections"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "user_id", "post_id", name="uq_collections_user_id_post_id"
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
-    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"))
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), index=True)
     added = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
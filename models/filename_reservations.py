@@ -0,0 +1,10 @@
+from datetime import datetime
+from db import db
+
+
+class FilenameReservationModel(db.Model):
+    __tablename__ = "filename_reservations"
+
+    # A post filename taken while its photo is uploaded, see services.filenames.
+    filename = db.Column(db.String(80), primary_key=True)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,28 @@
+from datetime import datetime
+from db import db
+
+
+class ImportJobModel(db.Model):
+    __tablename__ = "import_jobs"
+
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    status = db.Column(db.String(16), nullable=False, default=PENDING, index=True)
+    archive = db.Column(db.LargeBinary)
+    archive_name = db.Column(db.String(256), nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    created = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.JSON)
+    error = db.Column(db.String(256))
+    added = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # When a worker claimed the job or last saved progress, to take over
+    # jobs it never finished.
+    updated = db.Column(db.DateTime)
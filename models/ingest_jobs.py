@@ -0,0 +1,32 @@
+from datetime import datetime
+from db import db
+
+
+class IngestJobModel(db.Model):
+    __tablename__ = "ingest_jobs"
+
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    status = db.Column(db.String(16), nullable=False, default=PENDING, index=True)
+    author = db.Column(db.String(80), nullable=False)
+    title = db.Column(db.String(80), nullable=False)
+    quote = db.Column(db.Text, nullable=False)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    address = db.Column(db.String)
+    photo = db.Column(db.LargeBinary)
+    photo_name = db.Column(db.String(256), nullable=False)
+    error = db.Column(db.String(256))
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id", ondelete="SET NULL"))
+    added = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # When a worker claimed the job, to take over jobs it never finished.
+    updated = db.Column(db.DateTime)
+
+    post = db.relationship("PostModel")
@@ -0,0 +1,12 @@
+from db import db
+
+
+class PostClusterModel(db.Model):
+    __tablename__ = "post_clusters"
+
+    # One row per geohash prefix with posts, see services.clusters.
+    precision = db.Column(db.Integer, primary_key=True)
+    geohash = db.Column(db.String(12), primary_key=True)
+    post_count = db.Column(db.Integer, nullable=False)
+    latitude_sum = db.Column(db.Float, nullable=False)
+    longitude_sum = db.Column(db.Float, nullable=False)
@@ -4,19 +4,31 @@ from db import db
 
 class PostModel(db.Model):
     __tablename__ = "posts"
+    __table_args__ = (
+        db.Index("ix_posts_user_id_added", "user_id", "added"),
+        db.Index("ix_posts_added_id", "added", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    author_id = db.Column(db.Integer, db.ForeignKey("authors.id"), nullable=False)
-    title_id = db.Column(db.Integer, db.ForeignKey("titles.id"), nullable=False)
+    author_id = db.Column(
+        db.Integer, db.ForeignKey("authors.id"), nullable=False, index=True
+    )
+    title_id = db.Column(
+        db.Integer, db.ForeignKey("titles.id"), nullable=False, index=True
+    )
     quote = db.Column(db.Text, nullable=False)
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12), index=True)
     address = db.Column(db.String)
-    filename = db.Column(db.String(80), nullable=False)
+    filename = db.Column(db.String(80), nullable=False, unique=True, index=True)
     thumbnail_url = db.Column(db.String(256), nullable=False)
     photo_url = db.Column(db.String(256), nullable=False)
     added = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    collected_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
     in_collection = db.relationship(
         "UserModel", back_populates="collection", secondary="collections"
     )
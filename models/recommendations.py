@@ -0,0 +1,14 @@
+from db import db
+
+
+class RecommendationModel(db.Model):
+    __tablename__ = "recommendations"
+    __table_args__ = (db.Index("ix_recommendations_user_id_score", "user_id", "score"),)
+
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    post_id = db.Column(
+        db.Integer, db.ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True
+    )
+    score = db.Column(db.Integer, nullable=False)
@@ -3,11 +3,19 @@ from db import db
 
 class TitleModel(db.Model):
     __tablename__ = "titles"
+    __table_args__ = (db.Index("ix_titles_title_author_id", "title", "author_id"),)
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(80), nullable=False)
     author_id = db.Column(
-        db.Integer, db.ForeignKey("authors.id"), unique=False, nullable=False
+        db.Integer,
+        db.ForeignKey("authors.id"),
+        unique=False,
+        nullable=False,
+        index=True,
+    )
+    post_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0", index=True
     )
 
     posts = db.relationship("PostModel", backref="title")
@@ -7,9 +7,17 @@ class UserModel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(18), unique=True, nullable=False)
     password = db.Column(db.String, nullable=False)
+    recommendations_computed = db.Column(db.DateTime)
+    # Bumped whenever the recommendations go stale, see services.recommendations.
+    recommendations_version = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
     posts = db.relationship(
         "PostModel", backref="user", lazy="dynamic", cascade="all, delete-orphan"
     )
     collection = db.relationship(
         "PostModel", back_populates="in_collection", secondary="collections"
     )
+    recommendations = db.relationship(
+        "RecommendationModel", lazy="dynamic", cascade="all, delete-orphan"
+    )
@@ -0,0 +1,90 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask_smorest import Blueprint, abort
+from sqlalchemy import and_, or_
+
+CURSOR_HEADER_NAME = "X-Cursor"
+# item_count of keyset pages, whose items are not counted.
+NOT_COUNTED = object()
+
+
+class CursorBlueprint(Blueprint):
+    """Blueprint whose keyset pages have X-Cursor instead of X-Pagination."""
+
+    def _set_pagination_metadata(self, page_params, result, headers):
+        if page_params.item_count is NOT_COUNTED:
+            return result, headers
+        return super()._set_pagination_metadata(page_params, result, headers)
+
+
+def count_query(query):
+    return query.order_by(None).count()
+
+
+def paginate_query(query, pagination_parameters):
+    pagination_parameters.item_count = count_query(query)
+    return (
+        query.limit(pagination_parameters.page_size)
+        .offset(pagination_parameters.first_item)
+        .all()
+    )
+
+
+def encode_cursor(added, id):
+    payload = json.dumps([added.isoformat(), id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        added, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(added), int(id)
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        abort(400, message="Invalid cursor.")
+
+
+def paginate_keyset(query, added_column, id_column, after, pagination_parameters):
+    """Return the page following the `after` cursor.
+
+    `query` must be ordered by (added_column, id_column). The cost of a page
+    does not depend on how deep it is, so no total is counted: the endpoint's
+    blueprint must be a CursorBlueprint.
+    """
+    if after:
+        added, id = decode_cursor(after)
+        query = query.filter(
+            or_(
+                added_column > added,
+                and_(added_column == added, id_column > id),
+            )
+        )
+    rows = query.limit(pagination_parameters.page_size + 1).all()
+    items = rows[: pagination_parameters.page_size]
+    has_more = len(rows) > pagination_parameters.page_size
+    pagination_parameters.item_count = NOT_COUNTED
+    pagination_parameters.next_cursor = (
+        encode_cursor(items[-1].added, items[-1].id) if has_more else None
+    )
+    return items
+
+
+def set_next_cursor(items, pagination_parameters):
+    """Set the cursor continuing an offset page, for switching to keyset mode."""
+    has_more = (
+        pagination_parameters.first_item + len(items) < pagination_parameters.item_count
+    )
+    pagination_parameters.next_cursor = (
+        encode_cursor(items[-1].added, items[-1].id) if items and has_more else None
+    )
+
+
+def cursor_headers(pagination_parameters):
+    return {
+        CURSOR_HEADER_NAME: json.dumps(
+            {"next_cursor": getattr(pagination_parameters, "next_cursor", None)}
+        )
+    }
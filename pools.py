@@ -0,0 +1,135 @@
+import threading
+import time
+
+import redis
+from sqlalchemy.pool import QueuePool
+
+
+class WaitStats:
+    """Counts checkouts and the time spent waiting for a free connection.
+
+    Failures are checkouts that timed out waiting or could not connect.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.failures = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, started, failed=False):
+        waited = time.perf_counter() - started
+        with self._lock:
+            if failed:
+                self.failures += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "failures": self.failures,
+                "wait_seconds_total": round(self.wait_total, 6),
+                "wait_seconds_max": round(self.wait_max, 6),
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = WaitStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            # A timeout, or the database refusing a new connection.
+            self.wait_stats.record(started, failed=True)
+            raise
+        self.wait_stats.record(started)
+        return connection
+
+
+class TimedRedisPool(redis.BlockingConnectionPool):
+    """Blocking Redis pool that counts connections in use and waits."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = WaitStats()
+
+    def reset(self):
+        # Also called by redis-py in a forked worker.
+        super().reset()
+        self.created = 0
+        self._in_use = set()
+        self._count_lock = threading.Lock()
+
+    def make_connection(self):
+        connection = super().make_connection()
+        with self._count_lock:
+            self.created += 1
+        return connection
+
+    def get_connection(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            self.wait_stats.record(started, failed=True)
+            raise
+        self.wait_stats.record(started)
+        with self._count_lock:
+            self._in_use.add(id(connection))
+        return connection
+
+    def release(self, connection):
+        # redis-py also releases connections that failed to connect, which
+        # were never handed out.
+        with self._count_lock:
+            self._in_use.discard(id(connection))
+        super().release(connection)
+
+    @property
+    def in_use(self):
+        return len(self._in_use)
+
+
+def sqlalchemy_pool_stats(engine):
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    stats = {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+    if isinstance(pool, TimedQueuePool):
+        stats.update(pool.wait_stats.as_dict())
+    return stats
+
+
+def redis_pool_stats(client):
+    pool = getattr(client, "connection_pool", None)
+    if not isinstance(pool, TimedRedisPool):
+        return {"pool": type(pool or client).__name__}
+    return {
+        "pool": type(pool).__name__,
+        "max_connections": pool.max_connections,
+        "created": pool.created,
+        "in_use": pool.in_use,
+        **pool.wait_stats.as_dict(),
+    }
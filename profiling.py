@@ -0,0 +1,220 @@
+import base64
+import cProfile
+import hashlib
+import hmac
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from flask import current_app, g, has_app_context, has_request_context, request
+
+from db import get_redis
+from metrics import on_query
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+TOKEN_LIFETIME = 300
+
+
+def make_token(secret, now=None):
+    """Value for the X-Profile header, valid for TOKEN_LIFETIME seconds."""
+    timestamp = str(int(now or time.time()))
+    signature = hmac.new(secret.encode(), timestamp.encode(), hashlib.sha256)
+    return f"{timestamp}.{signature.hexdigest()}"
+
+
+def valid_token(secret, token):
+    timestamp = (token or "").partition(".")[0]
+    if not secret or not timestamp.isdigit():
+        return False
+    if abs(time.time() - int(timestamp)) > TOKEN_LIFETIME:
+        return False
+    return hmac.compare_digest(make_token(secret, int(timestamp)), token)
+
+
+class DirectoryStorage:
+    """One <id>.json (request and SQL) and <id>.prof (cProfile) per profile."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def save(self, record, stats):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, f"{record['id']}.prof"), "wb") as file:
+            file.write(stats)
+        with open(os.path.join(self.path, f"{record['id']}.json"), "w") as file:
+            json.dump(record, file)
+
+    def load(self):
+        if not os.path.isdir(self.path):
+            return
+        for name in sorted(os.listdir(self.path)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.path, name)) as file:
+                    record = json.load(file)
+                with open(
+                    os.path.join(self.path, f"{record['id']}.prof"), "rb"
+                ) as file:
+                    yield record, file.read()
+
+
+class RedisStorage:
+    """Keeps the last `keep` profiles in a Redis list."""
+
+    KEY = "profiles"
+
+    def __init__(self, redis, keep=200):
+        self.redis = redis
+        self.keep = keep
+
+    def save(self, record, stats):
+        item = dict(record, stats=base64.b64encode(stats).decode())
+        pipeline = self.redis.pipeline()
+        pipeline.lpush(self.KEY, json.dumps(item))
+        pipeline.ltrim(self.KEY, 0, self.keep - 1)
+        pipeline.execute()
+
+    def load(self):
+        for item in self.redis.lrange(self.KEY, 0, -1):
+            record = json.loads(item)
+            yield record, base64.b64decode(record.pop("stats"))
+
+
+def get_profile_storage():
+    config = current_app.config
+    if config["PROFILE_STORAGE"] == "redis":
+        return RedisStorage(get_redis(), keep=config["PROFILE_KEEP"])
+    return DirectoryStorage(config["PROFILE_DIR"])
+
+
+def _should_profile():
+    config = current_app.config
+    if valid_token(config["PROFILE_SECRET"], request.headers.get(PROFILE_HEADER)):
+        return True
+    rate = config["PROFILE_SAMPLE_RATE"]
+    return rate > 0 and random.random() < rate
+
+
+@on_query
+def _record_statement(statement, duration):
+    if not has_app_context():
+        return
+    threshold = current_app.config["PROFILE_SLOW_QUERY_SECONDS"]
+    if threshold and duration >= threshold:
+        endpoint = request.endpoint if has_request_context() else "background"
+        logger.warning("Slow query (%.3fs) in %s: %s", duration, endpoint, statement)
+    statements = g.get("profile_statements")
+    if statements is not None:
+        statements.append({"statement": statement, "duration": duration})
+
+
+def init_profiling(app):
+    """Profile sampled requests, or those with a signed X-Profile header.
+
+    PROFILE_SAMPLE_RATE is the share of requests profiled (0 disables
+    sampling). A header made by `flask profile token` profiles one request
+    regardless. Profiles go to PROFILE_DIR or, with PROFILE_STORAGE=redis,
+    to Redis, and are summarized by `flask profile summary`.
+    """
+
+    @app.before_request
+    def start_profile():
+        if not _should_profile():
+            return
+        g.profile_id = f"{datetime.utcnow():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        g.profile_statements = []
+        g.profile_started = time.perf_counter()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    @app.after_request
+    def add_profile_id(response):
+        if "profiler" in g:
+            g.profile_status = response.status_code
+            response.headers["X-Profile-Id"] = g.profile_id
+        return response
+
+    # Teardown runs even when the view raised, which after_request does not.
+    @app.teardown_request
+    def save_profile(exception):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return
+        profiler.disable()
+        profiler.create_stats()
+        record = {
+            "id": g.pop("profile_id"),
+            "endpoint": request.endpoint,
+            "method": request.method,
+            "path": request.full_path,
+            "status": g.pop("profile_status", 500),
+            "duration": time.perf_counter() - g.pop("profile_started"),
+            "statements": g.pop("profile_statements"),
+        }
+        try:
+            get_profile_storage().save(record, marshal.dumps(profiler.stats))
+        except Exception:
+            logger.exception("Could not save profile %s.", record["id"])
+
+
+def summarize(profiles, limit=20):
+    """Text report over (record, stats) pairs: endpoints, SQL, functions."""
+    profiles = list(profiles)
+    if not profiles:
+        return "No profiles."
+    lines = ["Requests:"]
+    by_endpoint = {}
+    for record, _ in profiles:
+        by_endpoint.setdefault(record["endpoint"], []).append(record)
+    for endpoint, records in sorted(by_endpoint.items(), key=lambda item: str(item[0])):
+        durations = [record["duration"] for record in records]
+        statements = sum(len(record["statements"]) for record in records)
+        lines.append(
+            f"  {endpoint}: {len(records)} requests, "
+            f"mean {sum(durations) / len(durations) * 1000:.1f} ms, "
+            f"max {max(durations) * 1000:.1f} ms, "
+            f"{statements / len(records):.1f} SQL statements per request"
+        )
+
+    grouped = {}
+    for record, _ in profiles:
+        for statement in record["statements"]:
+            text = " ".join(statement["statement"].split())
+            count, total, longest = grouped.get(text, (0, 0.0, 0.0))
+            grouped[text] = (
+                count + 1,
+                total + statement["duration"],
+                max(longest, statement["duration"]),
+            )
+    lines.append("")
+    lines.append(f"SQL statements by total time (top {limit}):")
+    for text, (count, total, longest) in sorted(
+        grouped.items(), key=lambda item: -item[1][1]
+    )[:limit]:
+        lines.append(
+            f"  {total * 1000:9.1f} ms total, {count:5} calls, "
+            f"max {longest * 1000:.1f} ms: {text[:200]}"
+        )
+
+    stream = io.StringIO()
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for record, stats in profiles:
+            path = os.path.join(directory, f"{record['id']}.prof")
+            with open(path, "wb") as file:
+                file.write(stats)
+            paths.append(path)
+        pstats.Stats(*paths, stream=stream).sort_stats("cumulative").print_stats(limit)
+    lines.append("")
+    lines.append(f"Functions by cumulative time (top {limit}):")
+    lines.append(stream.getvalue())
+    return "\n".join(lines)
@@ -3,3 +3,4 @@ from resources.posts import blp as PostsBlueprint
 from resources.collections import blp as CollectionsBlueprint
 from resources.authors import blp as AuthorsBlueprint
 from resources.titles import blp as TitlesBlueprint
+from resources.internal import blp as InternalBlueprint
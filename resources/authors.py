@@ -1,9 +1,12 @@
 from flask.views import MethodView
-from flask_smorest import Blueprint, Page
+from flask_smorest import Blueprint
 
-from schemas import AuthorSchema
+from loaders import author_loaders
+from pagination import paginate_query
+from schemas import AuthorSchema, NameSearchSchema
 
 from models import AuthorModel
+from services import author_lookup, cached_response
 
 
 blp = Blueprint("authors", "authors", description="Operations on authors.")
@@ -11,18 +14,23 @@ blp = Blueprint("authors", "authors", description="Operations on authors.")
 
 @blp.route("/authors/")
 class AuthorsList(MethodView):
+    @cached_response("authors")
+    @blp.arguments(NameSearchSchema, location="query")
     @blp.response(200, AuthorSchema(many=True))
     @blp.paginate()
-    def get(self, pagination_parameters):
-        authors = AuthorModel.query.all()
-        pagination_parameters.item_count = len(authors)
-        pager = Page(collection=authors, page_params=pagination_parameters)
-        return pager.items
+    def get(self, search, pagination_parameters):
+        if search.get("q"):
+            return author_lookup.autocomplete(
+                search["q"], pagination_parameters, options=author_loaders()
+            )
+        query = AuthorModel.query.options(*author_loaders()).order_by(AuthorModel.id)
+        return paginate_query(query, pagination_parameters)
 
 
 @blp.route("/authors/<int:id>")
 class Authors(MethodView):
+    @cached_response("author:{id}")
     @blp.response(200, AuthorSchema)
     def get(self, id):
-        author = AuthorModel.query.get_or_404(id)
+        author = AuthorModel.query.options(*author_loaders()).get_or_404(id)
         return author
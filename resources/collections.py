@@ -4,52 +4,91 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy.exc import SQLAlchemyError
 
 from db import db
-from schemas import UserSchema
+from schemas import (
+    CollectionBatchSchema,
+    CollectionBatchResultSchema,
+    CollectionChangeSchema,
+)
 
 from models import PostModel, UserModel
+from services import (
+    add_to_collection,
+    collection_size,
+    remove_from_collection,
+    NOT_FOUND,
+)
 
 blp = Blueprint("collections", "collections", description="Operations on collections.")
 
 
-@blp.route("/collections/<int:post_id>")
-class AddToCollection(MethodView):
-    @blp.response(201, UserSchema(only=["collection"]))
-    @jwt_required()
-    def post(self, post_id):
-        post = PostModel.query.get_or_404(post_id)
-        user = UserModel.query.get_or_404(get_jwt_identity())
+def _commit():
+    try:
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        abort(500)
 
-        if post in user.collection:
-            abort(400, message="Post already in the collection.")
 
-        if post in user.posts:
-            abort(400, message="User cannot add own post to own collection.")
+def _current_user_id():
+    user_id = get_jwt_identity()
+    if db.session.get(UserModel, user_id) is None:
+        abort(404)
+    return user_id
 
-        user.collection.append(post)
 
-        try:
-            db.session.add(user)
-            db.session.commit()
-        except SQLAlchemyError:
-            abort(500)
-
-        return user
-
-    @blp.response(201, UserSchema(only=["collection"]))
+@blp.route("/collections/")
+class CollectionBatch(MethodView):
+    @blp.arguments(CollectionBatchSchema)
+    @blp.response(200, CollectionBatchResultSchema)
     @jwt_required()
-    def delete(self, post_id):
-        post = PostModel.query.get_or_404(post_id)
-        user = UserModel.query.get_or_404(get_jwt_identity())
+    def post(self, batch):
+        """Add and remove many posts in one transaction"""
+        user_id = _current_user_id()
+        added, skipped = add_to_collection(user_id, batch["add"])
+        removed, not_removed = remove_from_collection(user_id, batch["remove"])
+        skipped.update(not_removed)
+        _commit()
+        return {
+            "added": added,
+            "removed": removed,
+            "skipped": [
+                {"post_id": post_id, "reason": reason}
+                for post_id, reason in skipped.items()
+            ],
+            "collection_size": collection_size(user_id),
+        }
 
-        if post not in user.collection:
-            abort(400, message="Post not in the collection")
 
-        user.collection.remove(post)
-
-        try:
-            db.session.add(user)
-            db.session.commit()
-        except SQLAlchemyError:
-            abort(500)
+@blp.route("/collections/<int:post_id>")
+class AddToCollection(MethodView):
+    @blp.response(201, CollectionChangeSchema)
+    @jwt_required()
+    def post(self, post_id):
+        user_id = _current_user_id()
+        _, skipped = add_to_collection(user_id, [post_id])
+        if post_id in skipped:
+            abort(
+                404 if skipped[post_id] == NOT_FOUND else 400, message=skipped[post_id]
+            )
+        _commit()
+        return {
+            "post_id": post_id,
+            "in_collection": True,
+            "collection_size": collection_size(user_id),
+        }
 
-        return user
+    @blp.response(201, CollectionChangeSchema)
+    @jwt_required()
+    def delete(self, post_id):
+        user_id = _current_user_id()
+        _, skipped = remove_from_collection(user_id, [post_id])
+        if post_id in skipped:
+            if db.session.get(PostModel, post_id) is None:
+                abort(404, message=NOT_FOUND)
+            abort(400, message=skipped[post_id])
+        _commit()
+        return {
+            "post_id": post_id,
+            "in_collection": False,
+            "collection_size": collection_size(user_id),
+        }
@@ -0,0 +1,63 @@
+from flask import Blueprint, Response, current_app, jsonify, request
+from flask_smorest import abort
+
+from db import db, get_redis
+from metrics import metrics
+from pools import redis_pool_stats, sqlalchemy_pool_stats
+
+# Operational endpoints, kept out of the public API documentation.
+blp = Blueprint("internal", __name__)
+
+
+@blp.before_request
+def require_internal_access():
+    config = current_app.config
+    token = config["INTERNAL_TOKEN"]
+    if token:
+        if request.headers.get("Authorization") != f"Bearer {token}":
+            abort(401, message="Invalid token.")
+    elif not (
+        config["INTERNAL_ALLOW_LOCAL"] and request.remote_addr in ("127.0.0.1", "::1")
+    ):
+        abort(403, message="Set INTERNAL_TOKEN to use the internal endpoints.")
+
+
+def _redis_pool_stats():
+    try:
+        return redis_pool_stats(get_redis())
+    except RuntimeError:
+        # Redis is not configured.
+        return None
+
+
+@blp.get("/internal/pools")
+def pools():
+    return jsonify(
+        {
+            "database": sqlalchemy_pool_stats(db.engine),
+            "redis": _redis_pool_stats(),
+        }
+    )
+
+
+def _gauges():
+    for name, stats in (
+        ("db_pool", sqlalchemy_pool_stats(db.engine)),
+        ("redis_pool", _redis_pool_stats() or {}),
+    ):
+        for key, value in stats.items():
+            if key != "pool":
+                yield f"{name}_{key}", f"Connection pool {key}.", {}, value
+    for name in ("geocoder", "response_cache"):
+        if name in current_app.extensions:
+            stats = current_app.extensions[name].stats
+            for event, count in sorted(stats.items()):
+                yield f"{name}_events", "Cache events.", {"event": event}, count
+
+
+@blp.get("/metrics")
+def metrics_view():
+    return Response(
+        metrics.render(gauges=_gauges()),
+        mimetype="text/plain; version=0.0.4",
+    )
@@ -1,51 +1,53 @@
-import os
 import datetime
-from dotenv import load_dotenv
 
-from flask_smorest import Blueprint, Page, abort
+from flask import url_for
+from flask_smorest import abort
 from flask.views import MethodView
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderUnavailable
 from sqlalchemy.exc import SQLAlchemyError
 
-import cloudinary
-from cloudinary.exceptions import GeneralError
-from cloudinary.uploader import upload, destroy
-
 from db import db
+from loaders import post_loaders
+from pagination import (
+    CursorBlueprint,
+    cursor_headers,
+    paginate_keyset,
+    paginate_query,
+    set_next_cursor,
+)
 from schemas import (
     PostSchema,
     PostUploadSchema,
     PostSearchSchema,
+    PostNearbySchema,
+    ClusterSearchSchema,
+    ClusterListSchema,
     PostResultSchema,
     PostUpdateSchema,
     PostUpdateUploadSchema,
+    IngestJobSchema,
+    PostImportUploadSchema,
+    ImportJobSchema,
 )
-from models import PostModel, AuthorModel, TitleModel
-
-geolocator = Nominatim(user_agent="picturesque_api")
-
-load_dotenv()
-
-cloudinary.config(
-    cloud_name=os.environ["CLOUDINARY_CLOUD_NAME"],
-    api_key=os.environ["CLOUDINARY_API_KEY"],
-    api_secret=os.environ["CLOUDINARY_API_SECRET"],
-    secure=True,
+from models import PostModel, IngestJobModel, ImportJobModel
+from services import (
+    search_posts,
+    posts_in_box,
+    clusters_in_box,
+    posts_nearby,
+    cached_response,
+    get_or_create_author,
+    get_or_create_title,
+    get_geocoder,
+    get_uploader,
+    UploadError,
+    ingest_pipeline,
+    locate,
+    process_import_job,
 )
 
-blp = Blueprint("posts", "posts", description="Operations on posts.")
-
-
-def create_unique_filename(filename):
-    segments = filename.split("_")
-    number_of_segments = len(segments)
-    if number_of_segments > 2:
-        segments[-1] = str(int(segments[-1]) + 1)
-    else:
-        segments.append("1")
-    return f"{'_'.join(segments)}"
+blp = CursorBlueprint("posts", "posts", description="Operations on posts.")
 
 
 @blp.route("/posts/")
@@ -54,158 +56,148 @@ class PostsList(MethodView):
     @blp.response(200, PostResultSchema(many=True))
     @blp.paginate()
     def get(self, search, pagination_parameters):
-        collection = []
-        if search:
-            categories = []
-            categories.append(
-                [
-                    {"found_in": "title", "post": post}
-                    for post in PostModel.query.join(TitleModel)
-                    .filter(TitleModel.title.ilike(f"%{search['q']}%"))
-                    .all()
-                ]
-            )
-            categories.append(
-                [
-                    {"found_in": "author", "post": post}
-                    for post in PostModel.query.join(AuthorModel)
-                    .filter(AuthorModel.name.ilike(f"%{search['q']}%"))
-                    .all()
-                ]
-            )
-            categories.append(
-                [
-                    {"found_in": "quote", "post": post}
-                    for post in PostModel.query.filter(
-                        PostModel.quote.ilike(f"%{search['q']}%")
-                    ).all()
-                ]
-            )
-            categories.append(
-                [
-                    {"found_in": "address", "post": post}
-                    for post in PostModel.query.filter(
-                        PostModel.address.ilike(f"%{search['q']}%")
-                    ).all()
-                ]
+        if search.get("q"):
+            if "after" in search:
+                abort(400, message="Cursor pagination is not available for search.")
+            if "bbox" in search:
+                abort(400, message="Search cannot be limited to an area.")
+            return search_posts(search["q"], pagination_parameters)
+        if "bbox" in search:
+            if "after" in search:
+                abort(400, message="Cursor pagination is not available for areas.")
+            west, south, east, north = search["bbox"]
+            return posts_in_box(south, west, north, east, pagination_parameters)
+
+        query = PostModel.query.options(*post_loaders(in_collection=False)).order_by(
+            PostModel.added, PostModel.id
+        )
+        if "after" in search:
+            posts = paginate_keyset(
+                query,
+                PostModel.added,
+                PostModel.id,
+                search["after"],
+                pagination_parameters,
             )
-            categories.sort(key=lambda x: len(x), reverse=True)
-            for cat in categories:
-                if len(cat) > 0:
-                    collection.extend(cat)
         else:
-            collection = [{"post": post} for post in PostModel.query.all()]
-        pagination_parameters.item_count = len(collection)
-        pager = Page(collection=collection, page_params=pagination_parameters)
-        return pager.items
+            posts = paginate_query(query, pagination_parameters)
+            set_next_cursor(posts, pagination_parameters)
+        return [{"post": post} for post in posts], cursor_headers(
+            pagination_parameters
+        )
 
     @blp.arguments(PostSchema, location="form")
     @blp.arguments(PostUploadSchema, location="files")
-    @blp.response(201, PostSchema)
+    @blp.response(202, IngestJobSchema)
     @jwt_required()
     def post(self, form_data, file_data):
-        user_id = get_jwt_identity()
-        author = form_data["author"]
-        title = form_data["title"]
-        quote = form_data["quote"]
-        latitude = form_data.get("latitude", None)
-        longitude = form_data.get("longitude", None)
-        address = form_data.get("address", None)
         file = file_data["photo"]
-        added = datetime.datetime.utcnow()
 
         if file.filename.rsplit(".", 1)[-1].lower() not in ("jpg", "png", "jpeg"):
             abort(422, message="Invalid format.")
 
-        try:
-            author_id = AuthorModel.query.filter_by(name=author).first().id
-        except AttributeError:
-            new_author = AuthorModel(name=author)
-            db.session.add(new_author)
-            db.session.flush()
-            author_id = new_author.id
-
-        title_in_db = TitleModel.query.filter_by(
-            title=title, author_id=author_id
-        ).first()
-        if title_in_db:
-            title_id = title_in_db.id
-        else:
-            new_title = TitleModel(title=title, author_id=author_id)
-            db.session.add(new_title)
-            db.session.flush()
-            title_id = new_title.id
+        job = IngestJobModel(
+            user_id=get_jwt_identity(),
+            author=form_data["author"],
+            title=form_data["title"],
+            quote=form_data["quote"],
+            latitude=form_data.get("latitude", None),
+            longitude=form_data.get("longitude", None),
+            address=form_data.get("address", None),
+            photo=file.read(),
+            photo_name=file.filename,
+            added=datetime.datetime.utcnow(),
+        )
 
-        if address:
-            try:
-                address_found = geolocator.geocode(address)
-                if address_found:
-                    latitude, longitude = (
-                        address_found.latitude,
-                        address_found.longitude,
-                    )
-            except GeocoderUnavailable:
-                abort(404, message="Geocoder currently not available. Try later.")
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            abort(500)
 
-        if latitude != None and longitude != None:
-            try:
-                address = geolocator.reverse(
-                    f"{str(latitude)}, {str(longitude)}"
-                ).address
-            except GeocoderUnavailable:
-                abort(404, message="Geocoder currently not available. Try later.")
+        ingest_pipeline.submit(job.id)
 
-        time_string = added.strftime("%y%m%d%H%M%S")
-        filename = f"{user_id}_{time_string}"
-        while filename in (post.filename for post in PostModel.query.all()):
-            filename = create_unique_filename(filename)
+        return job, 202, {"Location": url_for("posts.IngestJobs", id=job.id)}
 
-        try:
-            response = upload(
-                file,
-                public_id=filename,
-                folder="picturesque",
-                width=800,
-                height=600,
-                crop="limit",
-            )
-        except GeneralError as e:
-            abort(400, message=str(e) or "Photo upload failed.")
 
-        thumbnail_url = cloudinary.CloudinaryImage(response["public_id"]).image(
-            gravity="auto", height=120, width=150, crop="thumb"
+@blp.route("/posts/nearby")
+class PostsNearby(MethodView):
+    @blp.arguments(PostNearbySchema, location="query")
+    @blp.response(200, PostResultSchema(many=True))
+    @blp.paginate()
+    def get(self, args, pagination_parameters):
+        """Posts within `radius` meters, nearest first"""
+        return posts_nearby(
+            args["lat"], args["lon"], args["radius"], pagination_parameters
         )
 
-        new_post = PostModel(
-            user_id=user_id,
-            author_id=author_id,
-            title_id=title_id,
-            quote=quote,
-            latitude=latitude,
-            longitude=longitude,
-            address=address,
-            filename=filename,
-            thumbnail_url=thumbnail_url,
-            photo_url=response["secure_url"],
-            added=added,
+
+@blp.route("/posts/clusters")
+class PostClusters(MethodView):
+    @blp.arguments(ClusterSearchSchema, location="query")
+    @blp.response(200, ClusterListSchema)
+    def get(self, args):
+        """Number and centroid of the posts per map cell"""
+        west, south, east, north = args["bbox"]
+        precision, clusters = clusters_in_box(south, west, north, east, args["zoom"])
+        return {"precision": precision, "clusters": clusters}
+
+
+@blp.route("/posts/ingest/<int:id>")
+class IngestJobs(MethodView):
+    @blp.response(200, IngestJobSchema)
+    @jwt_required()
+    def get(self, id):
+        job = IngestJobModel.query.get_or_404(id)
+        if get_jwt_identity() != job.user_id:
+            abort(401, message="Invalid token.")
+        return job
+
+
+@blp.route("/posts/import")
+class PostsImport(MethodView):
+    @blp.arguments(PostImportUploadSchema, location="files")
+    @blp.response(202, ImportJobSchema)
+    @jwt_required()
+    def post(self, file_data):
+        file = file_data["file"]
+        job = ImportJobModel(
+            user_id=get_jwt_identity(),
+            archive=file.read(),
+            archive_name=file.filename,
+            added=datetime.datetime.utcnow(),
         )
 
-        db.session.add(new_post)
+        db.session.add(job)
         try:
             db.session.commit()
-        except SQLAlchemyError as e:
+        except SQLAlchemyError:
             db.session.rollback()
-            destroy(public_id=response["public_id"])
             abort(500)
 
-        return new_post
+        ingest_pipeline.submit(job.id, process_import_job)
+
+        return job, 202, {"Location": url_for("posts.ImportJobs", id=job.id)}
+
+
+@blp.route("/posts/import/<int:id>")
+class ImportJobs(MethodView):
+    @blp.response(200, ImportJobSchema)
+    @jwt_required()
+    def get(self, id):
+        job = ImportJobModel.query.get_or_404(id)
+        if get_jwt_identity() != job.user_id:
+            abort(401, message="Invalid token.")
+        return job
 
 
 @blp.route("/posts/<int:id>")
 class Posts(MethodView):
+    @cached_response("post:{id}")
     @blp.response(200, PostSchema)
     def get(self, id):
-        post = PostModel.query.get(id)
+        post = PostModel.query.options(*post_loaders()).get(id)
         if not post:
             abort(400, message="Post does not exists.")
         return post
@@ -232,66 +224,34 @@ class Posts(MethodView):
         file = file_data.get("photo", None)
 
         if author:
-            author_in_db = AuthorModel.query.filter_by(name=author).first()
-            if author_in_db:
-                author_id = author_in_db.id
-            else:
-                new_author = AuthorModel(name=author)
-                db.session.add(new_author)
-                db.session.flush()
-                author_id = new_author.id
-            post.author_id = author_id
+            post.author_id = get_or_create_author(author).id
 
         if title:
-            if not author:
-                author_id = post.author_id
-            title_in_db = TitleModel.query.filter_by(title=title).first()
-            if title_in_db:
-                title_id = title_in_db.id
-            else:
-                new_title = TitleModel(title=title, author_id=author_id)
-                db.session.add(new_title)
-                db.session.flush()
-                title_id = new_title.id
-            post.title_id = title_id
+            post.title_id = get_or_create_title(title, post.author_id).id
 
         if quote:
             post.quote = quote
 
-        if address:
+        if address or (latitude != None and longitude != None):
             try:
-                address_found = geolocator.geocode(address)
-                if address_found:
-                    latitude, longitude = (
-                        address_found.latitude,
-                        address_found.longitude,
-                    )
+                latitude, longitude, address = locate(
+                    get_geocoder(), latitude, longitude, address
+                )
             except GeocoderUnavailable:
                 abort(404, message="Geocoder currently not available. Try later.")
-
-        if latitude != None and longitude != None:
-            try:
-                address = geolocator.reverse(
-                    f"{str(latitude)}, {str(longitude)}"
-                ).address
+            if latitude != None and longitude != None:
                 post.address = address
                 post.latitude = latitude
                 post.longitude = longitude
-            except GeocoderUnavailable:
-                abort(404, message="Geocoder currently not available. Try later.")
 
         if file:
-            filename = post.filename
-
             try:
-                response = upload(file, public_id=filename, folder="picturesque", width=800, height=600, crop="limit")
-            except GeneralError as e:
+                uploaded = get_uploader().upload(file, public_id=post.filename)
+            except UploadError as e:
                 abort(400, message=str(e) or "Photo upload failed.")
 
-            thumbnail_url = cloudinary.CloudinaryImage(response["public_id"]).image(gravity="auto", height=120, width=150, crop="thumb")
-
-            post.thumbnail_url = (thumbnail_url,)
-            post.photo_url = response["secure_url"]
+            post.thumbnail_url = uploaded["thumbnail_url"]
+            post.photo_url = uploaded["photo_url"]
 
         try:
             db.session.commit()
@@ -314,21 +274,13 @@ class Posts(MethodView):
                 db.session.commit()
 
                 public_id = "picturesque/" + post.filename
-                destroy(public_id=public_id)
+                get_uploader().destroy(public_id=public_id)
             except SQLAlchemyError:
                 db.session.rollback()
                 abort(500)
         else:
             abort(401, message="Invalid token.")
 
-        title = TitleModel.query.get(post.title_id)
-        author = AuthorModel.query.get(post.author_id)
-        if len(title.posts) == 0:
-            db.session.delete(title)
-
-        if author.titles.count() == 0:
-            db.session.delete(author)
-
-        db.session.commit()
-
+        # Titles and authors left without posts are deleted by
+        # `flask gc-orphans`.
         return {"message": "Post successfully deleted."}, 200
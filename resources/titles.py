@@ -1,10 +1,13 @@
 from flask.views import MethodView
-from flask_smorest import Blueprint, Page
+from flask_smorest import Blueprint
 
 from db import db
-from schemas import TitleSchema
+from loaders import title_loaders
+from pagination import paginate_query
+from schemas import TitleSchema, NameSearchSchema
 
 from models import TitleModel
+from services import title_lookup, cached_response
 
 
 blp = Blueprint("title", "titles", description="Operations on titles.")
@@ -12,18 +15,23 @@ blp = Blueprint("title", "titles", description="Operations on titles.")
 
 @blp.route("/titles/")
 class TitlesList(MethodView):
+    @cached_response("titles")
+    @blp.arguments(NameSearchSchema, location="query")
     @blp.response(200, TitleSchema(many=True))
     @blp.paginate()
-    def get(self, pagination_parameters):
-        titles = TitleModel.query.all()
-        pagination_parameters.item_count = len(titles)
-        pager = Page(collection=titles, page_params=pagination_parameters)
-        return pager.items
+    def get(self, search, pagination_parameters):
+        if search.get("q"):
+            return title_lookup.autocomplete(
+                search["q"], pagination_parameters, options=title_loaders()
+            )
+        query = TitleModel.query.options(*title_loaders()).order_by(TitleModel.id)
+        return paginate_query(query, pagination_parameters)
 
 
 @blp.route("/titles/<int:id>")
 class Titles(MethodView):
+    @cached_response("title:{id}")
     @blp.response(200, TitleSchema)
     def get(self, id):
-        title = TitleModel.query.get_or_404(id)
+        title = TitleModel.query.options(*title_loaders()).get_or_404(id)
         return title
@@ -1,4 +1,4 @@
-from flask_smorest import Blueprint, Page, abort
+from flask_smorest import abort
 from flask.views import MethodView
 from flask_jwt_extended import (
     create_access_token,
@@ -11,12 +11,27 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.exc import IntegrityError
 from datetime import timedelta
 
-from db import db, redis_jwt_blocklist
-from schemas import UserSchema, UserRegisterSchema, UserLoginSchema, PostSchema
-from models import UserModel, PostModel, CollectionModel
+from db import db
+from loaders import post_loaders
+from pagination import (
+    CursorBlueprint,
+    cursor_headers,
+    paginate_keyset,
+    paginate_query,
+    set_next_cursor,
+)
+from schemas import (
+    UserSchema,
+    UserRegisterSchema,
+    UserLoginSchema,
+    PostSchema,
+    CursorPaginationSchema,
+)
+from models import UserModel, PostModel
+from services import recommended_posts, get_blocklist
 
 
-blp = Blueprint("users", "users", description="Operations on users.")
+blp = CursorBlueprint("users", "users", description="Operations on users.")
 
 
 @blp.route("/register")
@@ -74,8 +89,7 @@ class UserLogin(MethodView):
 class UserLogout(MethodView):
     @jwt_required()
     def delete(self):
-        jti = get_jwt()["jti"]
-        redis_jwt_blocklist.set(jti, 1, ex=timedelta(hours=1))
+        get_blocklist().revoke(get_jwt()["jti"])
         return {"message": "Successfully logged out."}, 200
 
 
@@ -90,13 +104,27 @@ class TokenRefresh(MethodView):
 
 @blp.route("/users/<int:id>/posts/")
 class UsersPostsList(MethodView):
+    @blp.arguments(CursorPaginationSchema, location="query")
     @blp.response(200, PostSchema(many=True))
     @blp.paginate()
-    def get(self, id, pagination_parameters):
-        posts = PostModel.query.filter_by(user_id=id).all()
-        pagination_parameters.item_count = len(posts)
-        pager = Page(collection=posts, page_params=pagination_parameters)
-        return pager.items
+    def get(self, cursor, id, pagination_parameters):
+        query = (
+            PostModel.query.options(*post_loaders())
+            .filter_by(user_id=id)
+            .order_by(PostModel.added, PostModel.id)
+        )
+        if "after" in cursor:
+            posts = paginate_keyset(
+                query,
+                PostModel.added,
+                PostModel.id,
+                cursor["after"],
+                pagination_parameters,
+            )
+        else:
+            posts = paginate_query(query, pagination_parameters)
+            set_next_cursor(posts, pagination_parameters)
+        return posts, cursor_headers(pagination_parameters)
 
 
 @blp.route("/users/<int:id>/collections/")
@@ -104,10 +132,12 @@ class UsersPostsList(MethodView):
     @blp.response(200, PostSchema(many=True))
     @blp.paginate()
     def get(self, id, pagination_parameters):
-        posts = PostModel.query.filter(PostModel.in_collection.any(id=id)).all()
-        pagination_parameters.item_count = len(posts)
-        pager = Page(collection=posts, page_params=pagination_parameters)
-        return pager.items
+        query = (
+            PostModel.query.options(*post_loaders())
+            .filter(PostModel.in_collection.any(id=id))
+            .order_by(PostModel.id)
+        )
+        return paginate_query(query, pagination_parameters)
 
 
 @blp.route("/users/recommendations/")
@@ -116,44 +146,12 @@ class UserRecommendations(MethodView):
     @blp.paginate()
     @jwt_required()
     def post(self, pagination_parameters):
-        user_id = get_jwt_identity()
-        user_choice = set(
-            x.post_id for x in CollectionModel.query.filter_by(user_id=user_id).all()
-        )
-
-        users_who_chose_the_same = set()
-        for post_id in user_choice:
-            users_who_chose_the_post = set(
-                x.user_id
-                for x in CollectionModel.query.filter_by(post_id=post_id).all()
-                if x.user_id != user_id
-            )
-            users_who_chose_the_same |= users_who_chose_the_post
-
-        points_dict = {}
-        for a_user in users_who_chose_the_same:
-            a_user_likes = set(
-                x.post_id for x in CollectionModel.query.filter_by(user_id=a_user).all()
-            )
+        """Recommended posts, best first
 
-            a_users_points = len(user_choice & a_user_likes)
-
-            user_posts = set(
-                x.id for x in PostModel.query.filter_by(user_id=user_id).all()
-            )
-            a_user_distinct_likes = a_user_likes - user_choice - user_posts
-            for post in a_user_distinct_likes:
-                points_dict.setdefault(post, 0)
-                points_dict[post] += a_users_points
-
-        posts = (
-            PostModel.query.filter(PostModel.id.in_(points_dict))
-            .order_by(PostModel.id.desc())
-            .all()
-        )
-
-        posts = sorted(posts, key=lambda x: points_dict[x.id], reverse=True)
-
-        pagination_parameters.item_count = len(posts)
-        pager = Page(collection=posts, page_params=pagination_parameters)
-        return pager.items
+        Only the best RECOMMENDATIONS_TOP_N posts are stored per user, so
+        pages past them are empty. After collections change, the previous
+        recommendations are shown until a background refresh replaces them.
+        """
+        user_id = get_jwt_identity()
+        query = recommended_posts(user_id).options(*post_loaders())
+        return paginate_query(query, pagination_parameters)
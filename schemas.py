@@ -1,6 +1,14 @@
 import re
-from marshmallow import Schema, fields, validate, validates, ValidationError
+from marshmallow import (
+    Schema,
+    fields,
+    validate,
+    validates,
+    validates_schema,
+    ValidationError,
+)
 from flask_smorest.fields import Upload
+from webargs.fields import DelimitedList
 
 
 ALLOWED_EXTENSIONS = "image/jpeg", "image/png"
@@ -46,6 +54,9 @@ class PostSchema(Schema):
     filename = fields.Str(dump_only=True)
     thumbnail_url = fields.Str(dump_only=True)
     photo_url = fields.Str(dump_only=True)
+    collected_count = fields.Int(
+        dump_only=True, metadata={"description": "Number of users who collected it"}
+    )
     in_collection = fields.List(fields.Nested(PlainUserSchema()), dump_only=True)
 
 
@@ -69,12 +80,163 @@ class PostUpdateUploadSchema(Schema):
     photo = Upload(required=False, load_only=True)
 
 
-class PostSearchSchema(Schema):
+class CursorPaginationSchema(Schema):
+    after = fields.Str(
+        metadata={
+            "description": "Opaque cursor from the X-Cursor header. Switches to cursor pagination, `page` is ignored"
+        }
+    )
+
+
+class IngestJobSchema(Schema):
+    id = fields.Int(dump_only=True)
+    status = fields.Str(
+        dump_only=True,
+        metadata={"description": "One of pending, processing, done or failed"},
+    )
+    error = fields.Str(dump_only=True)
+    added = fields.DateTime(dump_only=True)
+    post = fields.Nested(PostSchema(), dump_only=True)
+
+
+class PostImportSchema(PostSchema):
+    """One line of an import file."""
+
+    author = fields.Str(required=True, validate=validate.Length(min=1, max=80))
+    title = fields.Str(required=True, validate=validate.Length(min=1, max=80))
+    photo = fields.Str(
+        metadata={"description": "File name of the photo in the ZIP archive"}
+    )
+    photo_data = fields.Str(metadata={"description": "Base64 encoded photo"})
+
+    @validates_schema
+    def validate_photo(self, data, **kwargs):
+        if "photo" not in data and "photo_data" not in data:
+            raise ValidationError("Either photo or photo_data is required.", "photo")
+
+
+class PostImportUploadSchema(Schema):
+    file = Upload(
+        required=True,
+        load_only=True,
+        metadata={
+            "description": "NDJSON file, or a ZIP archive of one NDJSON file and the photos"
+        },
+    )
+
+
+class ImportJobSchema(Schema):
+    id = fields.Int(dump_only=True)
+    status = fields.Str(
+        dump_only=True,
+        metadata={"description": "One of pending, processing, done or failed"},
+    )
+    error = fields.Str(dump_only=True)
+    added = fields.DateTime(dump_only=True)
+    total = fields.Int(dump_only=True)
+    created = fields.Int(dump_only=True)
+    failed = fields.Int(dump_only=True)
+    errors = fields.List(
+        fields.Dict(),
+        dump_only=True,
+        metadata={
+            "description": "Line number and error of the first 1000 failed posts"
+        },
+    )
+
+
+class CollectionChangeSchema(Schema):
+    post_id = fields.Int(dump_only=True)
+    in_collection = fields.Bool(dump_only=True)
+    collection_size = fields.Int(dump_only=True)
+
+
+class CollectionBatchSchema(Schema):
+    add = fields.List(
+        fields.Int(), load_default=list, validate=validate.Length(max=1000)
+    )
+    remove = fields.List(
+        fields.Int(), load_default=list, validate=validate.Length(max=1000)
+    )
+
+    @validates_schema
+    def validate_disjoint(self, data, **kwargs):
+        if set(data["add"]) & set(data["remove"]):
+            raise ValidationError("A post cannot be added and removed at once.")
+
+
+class SkippedPostSchema(Schema):
+    post_id = fields.Int()
+    reason = fields.Str()
+
+
+class CollectionBatchResultSchema(Schema):
+    added = fields.List(fields.Int())
+    removed = fields.List(fields.Int())
+    skipped = fields.List(fields.Nested(SkippedPostSchema()))
+    collection_size = fields.Int()
+
+
+def validate_bbox(value):
+    if len(value) != 4:
+        raise ValidationError("Must be west,south,east,north.")
+    west, south, east, north = value
+    if not (-180 <= west <= 180 and -180 <= east <= 180):
+        raise ValidationError("Longitudes must be between -180 and 180.")
+    if not -90 <= south <= north <= 90:
+        raise ValidationError("Latitudes must be between -90 and 90, south first.")
+
+
+class PostSearchSchema(CursorPaginationSchema):
     q = fields.Str()
+    bbox = DelimitedList(
+        fields.Float(),
+        validate=validate_bbox,
+        metadata={
+            "description": "west,south,east,north in degrees. Lists the posts inside, nearest to its center first"
+        },
+    )
+
+
+class PostNearbySchema(Schema):
+    lat = fields.Float(required=True, validate=validate.Range(min=-90, max=90))
+    lon = fields.Float(required=True, validate=validate.Range(min=-180, max=180))
+    radius = fields.Float(
+        load_default=1000,
+        validate=validate.Range(min=0, min_inclusive=False, max=500000),
+        metadata={"description": "In meters"},
+    )
+
+
+class ClusterSearchSchema(Schema):
+    bbox = DelimitedList(
+        fields.Float(),
+        required=True,
+        validate=validate_bbox,
+        metadata={"description": "west,south,east,north in degrees"},
+    )
+    zoom = fields.Int(required=True, validate=validate.Range(min=0, max=22))
+
+
+class ClusterSchema(Schema):
+    geohash = fields.Str()
+    count = fields.Int()
+    latitude = fields.Float(metadata={"description": "Centroid of the posts"})
+    longitude = fields.Float(metadata={"description": "Centroid of the posts"})
+
+
+class ClusterListSchema(Schema):
+    precision = fields.Int(metadata={"description": "Geohash length of the cells"})
+    clusters = fields.List(fields.Nested(ClusterSchema()))
+
+
+class NameSearchSchema(Schema):
+    q = fields.Str(metadata={"description": "Fuzzy, typo-tolerant name prefix"})
 
 
 class PostResultSchema(Schema):
     found_in = fields.Str()
+    distance = fields.Float(metadata={"description": "In meters"})
     post = fields.Nested(PostSchema(exclude=["in_collection", "photo_url"]))
 
 
@@ -87,10 +249,12 @@ class TitleSchema(Schema):
     id = fields.Int(dump_only=True)
     title = fields.Str(dump_only=True)
     author = fields.Nested(PlainAuthorSchema(), dump_only=True)
-    posts = fields.List(fields.String(dump_only=True))
+    post_count = fields.Int(dump_only=True)
+    posts = fields.Pluck(PostSchema, "id", many=True, dump_only=True)
 
 
 class AuthorSchema(PlainAuthorSchema):
+    post_count = fields.Int(dump_only=True)
     titles = fields.List(
         fields.Nested(TitleSchema(), exclude=["author"]), dump_only=True
     )
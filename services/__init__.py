@@ -0,0 +1,35 @@
+from services.search import search_posts
+from services.lookup import (
+    author_lookup,
+    title_lookup,
+    get_or_create_author,
+    get_or_create_title,
+)
+from services.recommendations import (
+    recommended_posts,
+    refresh_recommendations,
+    mark_recommendations_stale,
+)
+from services.counters import recount_counters, collect_orphans
+from services.collections import (
+    add_to_collection,
+    remove_from_collection,
+    collection_size,
+    NOT_FOUND,
+)
+from services.gazetteer import Gazetteer, build_gazetteer
+from services.geocoding import get_geocoder, locate
+from services.spatial import posts_nearby, posts_in_box
+from services.clusters import clusters_in_box, rebuild_clusters
+from services.uploads import get_uploader, UploadError
+from services.filenames import collect_stale_reservations
+from services.ingest import ingest_pipeline
+from services.bulk_import import (
+    BulkImporter,
+    ImportFormatError,
+    open_import,
+    process_import_job,
+)
+from services.response_cache import cached_response, get_response_cache
+from services.blocklist import get_blocklist
+from services.query_plans import check_query_plans, check_query_counts
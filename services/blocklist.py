@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import threading
+import time
+
+from flask import current_app
+from redis import RedisError
+
+from db import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    def __init__(self, bits, hashes):
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray((bits + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(
+            self._array[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class TokenBlocklist:
+    """Revoked access tokens, checked without a Redis call in the common case.
+
+    Revoked JTIs are stored in Redis for `expiry` seconds as before, and
+    also added to a sorted set and published on a channel. Every worker
+    keeps them in Bloom filters, one per `slice` seconds of expiry time, so
+    whole filters are dropped once everything in them has expired. A token
+    missing from the filters is not revoked; a possible hit is confirmed
+    with a Redis GET.
+
+    Until the worker is subscribed (and after losing the subscription) every
+    check goes to Redis.
+    """
+
+    CHANNEL = "jwt:revoked"
+    RECENT = "jwt:revoked:recent"
+
+    def __init__(self, redis, expiry=3600, slice=600, bits=2**18, hashes=5):
+        self.redis = redis
+        self.expiry = expiry
+        self.slice = slice
+        self.bits = bits
+        self.hashes = hashes
+        self.ready = False
+        self._filters = {}
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def revoke(self, jti):
+        expires = time.time() + self.expiry
+        pipeline = self.redis.pipeline()
+        pipeline.set(jti, 1, ex=self.expiry)
+        pipeline.zadd(self.RECENT, {jti: expires})
+        pipeline.zremrangebyscore(self.RECENT, "-inf", time.time())
+        pipeline.publish(self.CHANNEL, f"{jti} {expires}")
+        pipeline.execute()
+        self._add(jti, expires)
+
+    def is_revoked(self, jti):
+        self._start()
+        if self.ready and not self._might_contain(jti):
+            return False
+        return bool(self.redis.get(jti))
+
+    def _add(self, jti, expires):
+        number = int(expires // self.slice)
+        with self._lock:
+            if number not in self._filters:
+                self._filters[number] = BloomFilter(self.bits, self.hashes)
+            self._filters[number].add(jti)
+
+    def _might_contain(self, jti):
+        current = int(time.time() // self.slice)
+        with self._lock:
+            for number in [number for number in self._filters if number < current]:
+                del self._filters[number]
+            filters = list(self._filters.values())
+        return any(jti in bloom for bloom in filters)
+
+    def _seed(self):
+        now = time.time()
+        for jti, expires in self.redis.zrangebyscore(
+            self.RECENT, now, "+inf", withscores=True
+        ):
+            self._add(jti.decode(), expires)
+
+    def _start(self):
+        if self._listener is None:
+            with self._lock:
+                if self._listener is None:
+                    self._listener = threading.Thread(
+                        target=self._listen, name="jwt-blocklist", daemon=True
+                    )
+                    self._listener.start()
+
+    def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.CHANNEL)
+                # Seed after subscribing, so no revocation falls in between.
+                self._seed()
+                self.ready = True
+                while True:
+                    # Polling keeps socket timeouts from dropping a quiet
+                    # subscription.
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        jti, expires = message["data"].decode().split()
+                        self._add(jti, float(expires))
+            except (RedisError, ValueError):
+                if self.ready:
+                    logger.warning("JWT blocklist subscription lost, retrying.")
+            finally:
+                pubsub.close()
+            self.ready = False
+            time.sleep(1)
+
+
+def get_blocklist():
+    if "jwt_blocklist" not in current_app.extensions:
+        config = current_app.config
+        current_app.extensions["jwt_blocklist"] = TokenBlocklist(
+            get_redis(),
+            expiry=config["JWT_BLOCKLIST_EXPIRY"],
+            slice=config["JWT_BLOCKLIST_SLICE"],
+            bits=config["JWT_BLOCKLIST_BLOOM_BITS"],
+            hashes=config["JWT_BLOCKLIST_BLOOM_HASHES"],
+        )
+    return current_app.extensions["jwt_blocklist"]
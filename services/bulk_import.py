@@ -0,0 +1,444 @@
+import base64
+import binascii
+import io
+import itertools
+import json
+import logging
+import os
+import posixpath
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app, g
+from geopy.exc import GeocoderUnavailable
+from marshmallow import ValidationError
+from sqlalchemy import insert, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from db import db
+from metrics import metrics
+from models import AuthorModel, ImportJobModel, PostModel, TitleModel
+from schemas import PostImportSchema
+from services.clusters import adjust_clusters
+from services.counters import adjust_counters
+from services.filenames import (
+    discard_reservations,
+    release_filenames,
+    reserve_filenames,
+)
+from services.geocoding import get_geocoder, locate
+from services.indexing import mark_local_indexes_dirty
+from services.jobs import claimable
+from services.lookup import author_lookup, title_lookup
+from services.response_cache import invalidate_on_commit
+from services.spatial import geohash_encode
+from services.uploads import UploadError, get_uploader
+from services.utils import normalize_name
+
+logger = logging.getLogger(__name__)
+
+PHOTO_EXTENSIONS = ("jpg", "png", "jpeg")
+MANIFEST_EXTENSIONS = (".ndjson", ".jsonl")
+# Errors an import job keeps in its report.
+MAX_JOB_ERRORS = 1000
+
+
+class ImportFormatError(Exception):
+    """The import file as a whole cannot be read."""
+
+
+class ItemError(Exception):
+    """One post of the import cannot be created."""
+
+
+def _format_messages(messages):
+    if isinstance(messages, dict):
+        return "; ".join(
+            f"{field}: {_format_messages(value)}" for field, value in messages.items()
+        )
+    if isinstance(messages, list):
+        return " ".join(str(message) for message in messages)
+    return str(messages)
+
+
+class ImportSource:
+    """Posts to import, one JSON object per line, and their photos.
+
+    A line has the fields of a post and either `photo`, the file name of the
+    photo (in the ZIP archive or next to the NDJSON file), or `photo_data`,
+    the base64 encoded photo.
+    """
+
+    def __init__(self, lines, read_photo):
+        self.lines = lines
+        self.read_photo = read_photo
+
+    def items(self):
+        """Yield (line number, post data or ItemError)."""
+        schema = PostImportSchema()
+        try:
+            for number, line in enumerate(self.lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, schema.load(json.loads(line))
+                except json.JSONDecodeError:
+                    yield number, ItemError("Invalid JSON.")
+                except ValidationError as e:
+                    yield number, ItemError(_format_messages(e.messages))
+        except UnicodeDecodeError:
+            raise ImportFormatError("The NDJSON file must be UTF-8 encoded.")
+
+    def photo(self, data):
+        if "photo_data" in data:
+            try:
+                return base64.b64decode(data["photo_data"], validate=True)
+            except binascii.Error:
+                raise ItemError("photo_data is not valid base64.")
+        if data["photo"].rsplit(".", 1)[-1].lower() not in PHOTO_EXTENSIONS:
+            raise ItemError("Invalid format.")
+        return self.read_photo(data["photo"])
+
+
+def open_import(file, directory=None):
+    """Return the ImportSource of a binary file, a ZIP archive or NDJSON.
+
+    Photos of an NDJSON file are read from `directory`, if given.
+    """
+    if zipfile.is_zipfile(file):
+        archive = zipfile.ZipFile(file)
+        manifests = [
+            name
+            for name in archive.namelist()
+            if name.lower().endswith(MANIFEST_EXTENSIONS)
+        ]
+        if len(manifests) != 1:
+            raise ImportFormatError("The archive must contain one NDJSON file.")
+        base = posixpath.dirname(manifests[0])
+
+        def read_photo(name):
+            try:
+                return archive.read(posixpath.join(base, name))
+            except KeyError:
+                raise ItemError("Photo not found in the archive.")
+            except zipfile.BadZipFile:
+                raise ItemError("Photo could not be read from the archive.")
+
+        lines = io.TextIOWrapper(archive.open(manifests[0]), encoding="utf-8")
+        return ImportSource(lines, read_photo)
+
+    def read_photo(name):
+        if directory is None:
+            raise ItemError("Without an archive photos must be sent as photo_data.")
+        try:
+            with open(os.path.join(directory, name), "rb") as photo:
+                return photo.read()
+        except OSError:
+            raise ItemError("Photo not found.")
+
+    file.seek(0)
+    return ImportSource(io.TextIOWrapper(file, encoding="utf-8"), read_photo)
+
+
+class BulkImporter:
+    """Creates the posts of an ImportSource for one user, in chunks.
+
+    Every chunk geocodes each distinct address once, reserves its filenames,
+    uploads its photos concurrently, then resolves each distinct author and
+    title once (and remembers them for later chunks) and inserts its posts
+    with one statement in a short transaction. A post that fails is reported with its line number and left
+    out; the rest of the chunk is still created.
+
+    Given the `report` of an interrupted run, the importer continues it,
+    skipping the items that report already counts.
+    """
+
+    def __init__(self, user_id, chunk_size=100, upload_workers=8, report=None):
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.upload_workers = upload_workers
+        self.report = report or {"total": 0, "created": 0, "failed": 0, "errors": []}
+        self._author_ids = {}
+        self._title_ids = {}
+
+    def run(self, source, progress=lambda report: None):
+        """Import everything and return the report, calling `progress`
+        after each chunk."""
+        with ThreadPoolExecutor(
+            max_workers=self.upload_workers, thread_name_prefix="import-upload"
+        ) as executor:
+            self._executor = executor
+            chunk = {}
+            done = self.report["total"]
+            for number, data in itertools.islice(source.items(), done, None):
+                self.report["total"] += 1
+                if isinstance(data, ItemError):
+                    self._fail(number, data)
+                    continue
+                chunk[number] = data
+                if len(chunk) == self.chunk_size:
+                    self._import_chunk(source, chunk)
+                    progress(self.report)
+                    chunk = {}
+            if chunk:
+                self._import_chunk(source, chunk)
+            progress(self.report)
+        return self.report
+
+    def _fail(self, number, error, chunk=None):
+        # Only the first MAX_JOB_ERRORS errors are kept; `failed` counts all.
+        self.report["failed"] += 1
+        if len(self.report["errors"]) < MAX_JOB_ERRORS:
+            self.report["errors"].append({"item": number, "error": str(error)})
+        if chunk is not None:
+            del chunk[number]
+
+    def _stage(self, stage):
+        return metrics.timer("import_stage_duration_seconds", stage=stage)
+
+    def _import_chunk(self, source, chunk):
+        photos = {}
+        for number, data in list(chunk.items()):
+            try:
+                photos[number] = source.photo(data)
+            except ItemError as e:
+                self._fail(number, e, chunk)
+
+        with self._stage("locate"):
+            locations = self._locate(chunk)
+        if not chunk:
+            return
+
+        added = datetime.utcnow()
+        try:
+            # Committed, so no transaction stays open during the uploads.
+            with self._stage("reserve_filenames"):
+                filenames = dict(
+                    zip(chunk, reserve_filenames(self.user_id, added, len(chunk)))
+                )
+        except SQLAlchemyError:
+            self._rollback(chunk, "Post could not be saved.")
+            return
+
+        with self._stage("upload"):
+            uploaded = self._upload(chunk, filenames, photos)
+        if not chunk:
+            discard_reservations(filenames.values())
+            return
+
+        try:
+            with self._stage("resolve_names"):
+                names = self._resolve_names(chunk)
+            with self._stage("insert"):
+                self._insert(chunk, locations, names, filenames, uploaded, added)
+            release_filenames(filenames.values())
+            mark_local_indexes_dirty(db.session, PostModel)
+            invalidate_on_commit(
+                db.session,
+                {"authors", "titles"}
+                | {f"author:{names[number][0]}" for number in chunk}
+                | {f"title:{names[number][1]}" for number in chunk},
+            )
+            with self._stage("commit"):
+                db.session.commit()
+        except Exception as e:
+            # Whatever went wrong, the photos and their names are not kept.
+            self._rollback(chunk, "Post could not be saved.")
+            uploader = get_uploader()
+            for result in uploaded.values():
+                uploader.destroy(public_id=result["public_id"])
+            discard_reservations(filenames.values())
+            if isinstance(e, SQLAlchemyError):
+                return
+            raise
+        self.report["created"] += len(chunk)
+
+    def _rollback(self, chunk, error):
+        db.session.rollback()
+        # Names created in this chunk are gone with it.
+        self._author_ids.clear()
+        self._title_ids.clear()
+        for number in list(chunk):
+            self._fail(number, error, chunk)
+
+    def _locate(self, chunk):
+        geocoder = get_geocoder()
+        try:
+            # Fills the geocoder's cache, so `locate` asks for each address once.
+            geocoder.geocode_many(
+                [data["address"] for data in chunk.values() if data.get("address")]
+            )
+        except GeocoderUnavailable:
+            pass
+        locations = {}
+        for number, data in list(chunk.items()):
+            try:
+                locations[number] = locate(
+                    geocoder,
+                    data.get("latitude"),
+                    data.get("longitude"),
+                    data.get("address"),
+                )
+            except GeocoderUnavailable:
+                self._fail(
+                    number, "Geocoder currently not available. Try later.", chunk
+                )
+        return locations
+
+    def _resolve_names(self, chunk):
+        """Return {number: (author id, title id)}, creating missing names."""
+        new_authors = {}
+        for data in chunk.values():
+            key = normalize_name(data["author"])
+            if key in self._author_ids or key in new_authors:
+                continue
+            author = author_lookup.find(data["author"])
+            if author is None:
+                new_authors[key] = AuthorModel(name=data["author"])
+            else:
+                self._author_ids[key] = author.id
+        db.session.add_all(new_authors.values())
+        db.session.flush()
+        self._author_ids.update((key, author.id) for key, author in new_authors.items())
+
+        new_titles = {}
+        for data in chunk.values():
+            author_id = self._author_ids[normalize_name(data["author"])]
+            key = (normalize_name(data["title"]), author_id)
+            if key in self._title_ids or key in new_titles:
+                continue
+            title = title_lookup.find(data["title"], scope=author_id)
+            if title is None:
+                new_titles[key] = TitleModel(title=data["title"], author_id=author_id)
+            else:
+                self._title_ids[key] = title.id
+        db.session.add_all(new_titles.values())
+        db.session.flush()
+        self._title_ids.update((key, title.id) for key, title in new_titles.items())
+
+        names = {}
+        for number, data in chunk.items():
+            author_id = self._author_ids[normalize_name(data["author"])]
+            title_id = self._title_ids[(normalize_name(data["title"]), author_id)]
+            names[number] = (author_id, title_id)
+        return names
+
+    def _insert(self, chunk, locations, names, filenames, uploaded, added):
+        """Insert the posts of the chunk with one statement."""
+        rows = []
+        for number, data in chunk.items():
+            latitude, longitude, address = locations[number]
+            author_id, title_id = names[number]
+            rows.append(
+                {
+                    "user_id": self.user_id,
+                    "author_id": author_id,
+                    "title_id": title_id,
+                    "quote": data["quote"],
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "geohash": geohash_encode(latitude, longitude),
+                    "address": address,
+                    "filename": filenames[number],
+                    "thumbnail_url": uploaded[number]["thumbnail_url"],
+                    "photo_url": uploaded[number]["photo_url"],
+                    "added": added,
+                }
+            )
+        db.session.execute(insert(PostModel), rows)
+        # Bulk inserts bypass the flush that counts posts.
+        adjust_counters(
+            db.session,
+            titles=Counter(row["title_id"] for row in rows),
+            authors=Counter(row["author_id"] for row in rows),
+        )
+        adjust_clusters(
+            db.session, added=[(row["latitude"], row["longitude"]) for row in rows]
+        )
+
+    def _upload(self, chunk, filenames, photos):
+        """Upload the photos concurrently and return {number: upload result}."""
+        uploader = get_uploader()
+        futures = {
+            number: self._executor.submit(
+                uploader.upload, io.BytesIO(photos[number]), public_id=filename
+            )
+            for number, filename in filenames.items()
+        }
+        uploaded = {}
+        for number, future in futures.items():
+            try:
+                uploaded[number] = future.result()
+            except UploadError as e:
+                self._fail(number, str(e) or "Photo upload failed.", chunk)
+        return uploaded
+
+
+def _claim(job_id):
+    result = db.session.execute(
+        update(ImportJobModel)
+        .where(ImportJobModel.id == job_id, claimable(ImportJobModel))
+        .values(status=ImportJobModel.PROCESSING, updated=datetime.utcnow())
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _fail(job_id, error):
+    db.session.rollback()
+    job = db.session.get(ImportJobModel, job_id)
+    job.status = ImportJobModel.FAILED
+    job.error = error[:256]
+    job.archive = None
+    db.session.commit()
+
+
+def process_import_job(job_id):
+    """Run a pending import job, saving its report after every chunk.
+
+    A job taken over from a worker that gave up continues after the items
+    its saved report counts; a chunk committed right before that worker
+    stopped, but not yet counted, is imported again.
+    """
+    g.metrics_endpoint = "import"
+    if not _claim(job_id):
+        return
+    job = db.session.get(ImportJobModel, job_id)
+    config = current_app.config
+    importer = BulkImporter(
+        job.user_id,
+        chunk_size=config["IMPORT_CHUNK_SIZE"],
+        upload_workers=config["IMPORT_UPLOAD_WORKERS"],
+        report={
+            "total": job.total,
+            "created": job.created,
+            "failed": job.failed,
+            "errors": list(job.errors or []),
+        },
+    )
+
+    def save_progress(report):
+        job.total = report["total"]
+        job.created = report["created"]
+        job.failed = report["failed"]
+        # The importer keeps at most MAX_JOB_ERRORS errors, rewritten only
+        # while they grow.
+        if len(job.errors or []) < len(report["errors"]):
+            job.errors = list(report["errors"])
+        job.updated = datetime.utcnow()
+        db.session.commit()
+
+    try:
+        importer.run(open_import(io.BytesIO(job.archive)), save_progress)
+    except ImportFormatError as e:
+        _fail(job_id, str(e))
+        return
+    except Exception:
+        logger.exception("Import job %s failed.", job_id)
+        _fail(job_id, "Import could not be completed.")
+        return
+    job.status = ImportJobModel.DONE
+    job.archive = None
+    db.session.commit()
@@ -0,0 +1,189 @@
+from sqlalchemy import and_, delete, event, func, literal, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, attributes
+
+from db import db
+from models import PostClusterModel, PostModel
+from services.spatial import (
+    geohash_bounds,
+    geohash_cell_count,
+    geohash_encode,
+    geohash_ranges,
+    split_box,
+)
+
+# Cells are kept for geohash prefixes of 1 to CLUSTER_PRECISION characters,
+# the smallest ones about 38 x 19 meters.
+CLUSTER_PRECISION = 8
+# Most cells one response covers; larger areas get coarser cells.
+MAX_CLUSTERS = 1024
+
+
+def adjust_clusters(session, added=(), removed=()):
+    """Count posts at the `added` and `removed` (latitude, longitude) points.
+
+    Flushes keep the cells up to date by themselves; bulk statements call
+    this in the same transaction.
+    """
+    changes = {}
+    for points, sign in ((added, 1), (removed, -1)):
+        for latitude, longitude in points:
+            geohash = geohash_encode(latitude, longitude, CLUSTER_PRECISION)
+            if geohash is None:
+                continue
+            for precision in range(1, CLUSTER_PRECISION + 1):
+                change = changes.setdefault(
+                    (precision, geohash[:precision]), [0, 0.0, 0.0]
+                )
+                change[0] += sign
+                change[1] += sign * latitude
+                change[2] += sign * longitude
+    if not changes:
+        return
+
+    table = PostClusterModel.__table__
+    dialect = postgresql if db.engine.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=["precision", "geohash"],
+        set_={
+            column: table.c[column] + statement.excluded[column]
+            for column in ("post_count", "latitude_sum", "longitude_sum")
+        },
+    )
+    connection = session.connection()
+    connection.execute(
+        statement,
+        [
+            {
+                "precision": precision,
+                "geohash": geohash,
+                "post_count": count,
+                "latitude_sum": latitude_sum,
+                "longitude_sum": longitude_sum,
+            }
+            for (precision, geohash), (count, latitude_sum, longitude_sum) in (
+                changes.items()
+            )
+        ],
+    )
+    emptied = [key for key, (count, _, _) in changes.items() if count < 0]
+    if emptied:
+        connection.execute(
+            delete(table).where(
+                table.c.post_count <= 0,
+                tuple_(table.c.precision, table.c.geohash).in_(emptied),
+            )
+        )
+
+
+@event.listens_for(Session, "after_flush")
+def _count_flushed_posts(session, flush_context):
+    added, removed = [], []
+    for instances, points in ((session.new, added), (session.deleted, removed)):
+        for instance in instances:
+            if isinstance(instance, PostModel):
+                points.append((instance.latitude, instance.longitude))
+    for instance in session.dirty:
+        if isinstance(instance, PostModel):
+            latitude = attributes.get_history(instance, "latitude")
+            longitude = attributes.get_history(instance, "longitude")
+            if latitude.has_changes() or longitude.has_changes():
+                removed.append(
+                    (
+                        (latitude.deleted or latitude.unchanged or [None])[0],
+                        (longitude.deleted or longitude.unchanged or [None])[0],
+                    )
+                )
+                added.append((instance.latitude, instance.longitude))
+    if added or removed:
+        adjust_clusters(session, added, removed)
+
+
+def rebuild_clusters():
+    """Recompute every cell from the posts; the caller commits."""
+    table = PostClusterModel.__table__
+    db.session.execute(delete(table))
+    for precision in range(1, CLUSTER_PRECISION + 1):
+        prefix = func.substr(PostModel.geohash, 1, precision)
+        db.session.execute(
+            table.insert().from_select(
+                [
+                    "precision",
+                    "geohash",
+                    "post_count",
+                    "latitude_sum",
+                    "longitude_sum",
+                ],
+                select(
+                    literal(precision),
+                    prefix,
+                    func.count(),
+                    func.sum(PostModel.latitude),
+                    func.sum(PostModel.longitude),
+                )
+                .where(PostModel.geohash.is_not(None))
+                .group_by(prefix),
+            )
+        )
+
+
+def zoom_precision(zoom):
+    """Geohash precision giving a few cells per web map tile at `zoom`."""
+    return max(1, min(CLUSTER_PRECISION, round((zoom + 2) / 2.5)))
+
+
+def clusters_in_box(south, west, north, east, zoom):
+    """Return (precision, clusters) of the cells overlapping the box.
+
+    Each cluster has the number of posts in the cell and their centroid.
+    The precision follows the zoom level, lowered until the box has at most
+    MAX_CLUSTERS cells, so the work depends on the cells shown, not on the
+    posts in them.
+    """
+    if east < west:
+        east += 360
+    boxes = split_box(south, west, north, east)
+    precision = zoom_precision(zoom)
+    while (
+        precision > 1
+        and sum(geohash_cell_count(*box, precision) for box in boxes) > MAX_CLUSTERS
+    ):
+        precision -= 1
+
+    ranges = [
+        (
+            PostClusterModel.geohash >= first
+            if after is None
+            else and_(
+                PostClusterModel.geohash >= first, PostClusterModel.geohash < after
+            )
+        )
+        for box in boxes
+        for first, after in geohash_ranges(*box, precision=precision)
+    ]
+    query = select(PostClusterModel).where(
+        PostClusterModel.precision == precision, PostClusterModel.post_count > 0
+    )
+    if ranges:
+        query = query.where(or_(*ranges))
+
+    clusters = []
+    for cell in db.session.scalars(query):
+        cell_south, cell_west, cell_north, cell_east = geohash_bounds(cell.geohash)
+        if any(
+            cell_south <= box_north
+            and cell_north >= box_south
+            and cell_west <= box_east
+            and cell_east >= box_west
+            for box_south, box_west, box_north, box_east in boxes
+        ):
+            clusters.append(
+                {
+                    "geohash": cell.geohash,
+                    "count": cell.post_count,
+                    "latitude": cell.latitude_sum / cell.post_count,
+                    "longitude": cell.longitude_sum / cell.post_count,
+                }
+            )
+    return precision, clusters
@@ -0,0 +1,99 @@
+from datetime import datetime
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db import db
+from models import CollectionModel, PostModel
+from services.counters import adjust_counters
+from services.recommendations import mark_recommendations_stale
+from services.response_cache import invalidate_on_commit
+
+NOT_FOUND = "Post does not exist."
+OWN_POST = "User cannot add own post to own collection."
+ALREADY_COLLECTED = "Post already in the collection."
+NOT_COLLECTED = "Post not in the collection."
+
+
+def collection_size(user_id):
+    return db.session.scalar(
+        select(func.count()).where(CollectionModel.user_id == user_id)
+    )
+
+
+def add_to_collection(user_id, post_ids):
+    """Collect `post_ids` for `user_id` with one insert; the caller commits.
+
+    Returns (added ids, {skipped id: reason}). Ownership is checked on the
+    posts' primary key and duplicates are skipped by the unique index, so
+    nothing of the existing collection is loaded.
+    """
+    post_ids = list(dict.fromkeys(post_ids))
+    owners = dict(
+        db.session.execute(
+            select(PostModel.id, PostModel.user_id).where(PostModel.id.in_(post_ids))
+        ).all()
+    )
+    skipped = {}
+    for post_id in post_ids:
+        if post_id not in owners:
+            skipped[post_id] = NOT_FOUND
+        elif owners[post_id] == user_id:
+            skipped[post_id] = OWN_POST
+    candidates = [post_id for post_id in post_ids if post_id not in skipped]
+    if not candidates:
+        return [], skipped
+
+    dialect = postgresql if db.engine.dialect.name == "postgresql" else sqlite
+    added = datetime.utcnow()
+    inserted = set(
+        db.session.scalars(
+            dialect.insert(CollectionModel)
+            .values(
+                [
+                    {"user_id": user_id, "post_id": post_id, "added": added}
+                    for post_id in candidates
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=["user_id", "post_id"])
+            .returning(CollectionModel.post_id)
+        )
+    )
+    skipped.update(
+        (post_id, ALREADY_COLLECTED)
+        for post_id in candidates
+        if post_id not in inserted
+    )
+    added_ids = [post_id for post_id in candidates if post_id in inserted]
+    _collection_changed(user_id, added_ids, 1)
+    return added_ids, skipped
+
+
+def remove_from_collection(user_id, post_ids):
+    """Remove `post_ids` from the collection of `user_id`; the caller commits.
+
+    Returns (removed ids, {skipped id: reason}).
+    """
+    post_ids = list(dict.fromkeys(post_ids))
+    deleted = set(
+        db.session.scalars(
+            delete(CollectionModel)
+            .where(
+                CollectionModel.user_id == user_id,
+                CollectionModel.post_id.in_(post_ids),
+            )
+            .returning(CollectionModel.post_id)
+        )
+    )
+    removed = [post_id for post_id in post_ids if post_id in deleted]
+    skipped = {post_id: NOT_COLLECTED for post_id in post_ids if post_id not in deleted}
+    _collection_changed(user_id, removed, -1)
+    return removed, skipped
+
+
+def _collection_changed(user_id, post_ids, change):
+    if post_ids:
+        mark_recommendations_stale(user_id, *post_ids)
+        # The statements above bypass the flush events.
+        adjust_counters(db.session, posts={post_id: change for post_id in post_ids})
+        invalidate_on_commit(db.session, {f"post:{post_id}" for post_id in post_ids})
@@ -0,0 +1,135 @@
+from collections import Counter
+
+from sqlalchemy import delete, event, exists, func, select, update
+from sqlalchemy.orm import Session, attributes
+
+from db import db
+from models import AuthorModel, CollectionModel, PostModel, TitleModel, UserModel
+from services.indexing import mark_local_indexes_dirty
+from services.response_cache import invalidate_on_commit
+
+# posts per title, posts per author and times collected per post
+COUNTERS = (
+    (TitleModel, "post_count"),
+    (AuthorModel, "post_count"),
+    (PostModel, "collected_count"),
+)
+
+
+def adjust_counters(session, titles=(), authors=(), posts=()):
+    """Add the {id: change} of `titles`, `authors` and `posts` to their counters.
+
+    Flushes keep the counters up to date by themselves; bulk statements
+    call this in the same transaction.
+    """
+    connection = session.connection()
+    for (model, column), changes in zip(COUNTERS, (titles, authors, posts)):
+        table = model.__table__
+        ids_by_change = {}
+        for id, change in dict(changes).items():
+            if change and id is not None:
+                ids_by_change.setdefault(change, []).append(id)
+        for change, ids in ids_by_change.items():
+            connection.execute(
+                update(table)
+                .where(table.c.id.in_(ids))
+                .values({column: table.c[column] + change})
+            )
+
+
+@event.listens_for(Session, "before_flush")
+def _uncount_collections_of_deleted_users(session, flush_context, instances):
+    # Their collection rows go with them, without CollectionModel objects.
+    user_ids = [
+        instance.id
+        for instance in session.deleted
+        if isinstance(instance, UserModel) and instance.id is not None
+    ]
+    if user_ids:
+        posts = PostModel.__table__
+        collected = select(CollectionModel.post_id).where(
+            CollectionModel.user_id.in_(user_ids)
+        )
+        session.connection().execute(
+            update(posts)
+            .where(posts.c.id.in_(collected))
+            .values(collected_count=posts.c.collected_count - 1)
+        )
+
+
+@event.listens_for(Session, "after_flush")
+def _count_flushed_changes(session, flush_context):
+    titles, authors, posts = Counter(), Counter(), Counter()
+    for instances, change in ((session.new, 1), (session.deleted, -1)):
+        for instance in instances:
+            if isinstance(instance, PostModel):
+                titles[instance.title_id] += change
+                authors[instance.author_id] += change
+            elif isinstance(instance, CollectionModel):
+                posts[instance.post_id] += change
+    for instance in session.dirty:
+        if isinstance(instance, PostModel):
+            for column, counter in (("title_id", titles), ("author_id", authors)):
+                history = attributes.get_history(instance, column)
+                if history.has_changes():
+                    counter.subtract(history.deleted)
+                    counter.update(history.added)
+    if titles or authors or posts:
+        adjust_counters(session, titles, authors, posts)
+
+
+def recount_counters():
+    """Recompute every counter, e.g. after manual edits."""
+    for model, column, counted, key in (
+        (TitleModel, "post_count", PostModel, PostModel.title_id),
+        (AuthorModel, "post_count", PostModel, PostModel.author_id),
+        (PostModel, "collected_count", CollectionModel, CollectionModel.post_id),
+    ):
+        count = (
+            select(func.count())
+            .select_from(counted)
+            .where(key == model.id)
+            .scalar_subquery()
+        )
+        db.session.execute(update(model).values({column: count}))
+    db.session.commit()
+
+
+def collect_orphans(batch_size=500):
+    """Delete titles and then authors without posts, a batch per commit.
+
+    The counter is checked again by the DELETE itself, so a title that
+    got a post since it was selected is kept. Returns (titles, authors)
+    deleted.
+    """
+    deleted = []
+    for model, orphaned, tag in (
+        (TitleModel, TitleModel.post_count == 0, "title"),
+        (
+            AuthorModel,
+            (AuthorModel.post_count == 0)
+            & ~exists().where(TitleModel.author_id == AuthorModel.id),
+            "author",
+        ),
+    ):
+        total = 0
+        while True:
+            ids = db.session.scalars(
+                select(model.id).where(orphaned).limit(batch_size)
+            ).all()
+            if not ids:
+                break
+            result = db.session.execute(
+                delete(model)
+                .where(model.id.in_(ids), orphaned)
+                .execution_options(synchronize_session=False)
+            )
+            mark_local_indexes_dirty(db.session, model)
+            invalidate_on_commit(
+                db.session,
+                {"authors", "titles"} | {f"{tag}:{id}" for id in ids},
+            )
+            db.session.commit()
+            total += result.rowcount
+        deleted.append(total)
+    return tuple(deleted)
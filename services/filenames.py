@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from redis import RedisError
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from db import db, get_redis
+from models import FilenameReservationModel, PostModel
+
+
+def filename_candidates(user_id, added):
+    """Yield `<user_id>_<timestamp>`, then `<user_id>_<timestamp>_1`, ...
+
+    With Redis every call continues an atomic per-prefix counter, so
+    concurrent workers get different names without looking at the table.
+    """
+    prefix = f"{user_id}_{added.strftime('%y%m%d%H%M%S')}"
+    key = f"filename:{prefix}"
+    number = 0
+    redis = get_redis()
+    while True:
+        try:
+            pipeline = redis.pipeline()
+            pipeline.incr(key)
+            pipeline.expire(key, current_app.config["FILENAME_COUNTER_TTL"])
+            number = pipeline.execute()[0] - 1
+        except RedisError:
+            pass
+        yield prefix if number == 0 else f"{prefix}_{number}"
+        number += 1
+
+
+def reserve_filenames(user_id, added, count=1, attempts=20):
+    """Reserve `count` free filenames and return them.
+
+    The reservations are committed before returning, so photos can be
+    uploaded under the names without a transaction left open. The
+    transaction inserting the posts releases the names again with
+    `release_filenames`.
+    """
+    candidates = filename_candidates(user_id, added)
+    filenames = []
+    for _ in range(attempts):
+        wanted = [next(candidates) for _ in range(count - len(filenames))]
+        now = datetime.utcnow()
+        try:
+            db.session.execute(
+                insert(FilenameReservationModel),
+                [{"filename": filename, "created": now} for filename in wanted],
+            )
+        except IntegrityError:
+            # Another worker reserved one of them; keep the others.
+            db.session.rollback()
+            reserved = []
+            for filename in wanted:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(
+                            insert(FilenameReservationModel).values(
+                                filename=filename, created=now
+                            )
+                        )
+                    reserved.append(filename)
+                except IntegrityError:
+                    continue
+            wanted = reserved
+        db.session.commit()
+        # A post committed before its reservation was released.
+        taken = set(
+            db.session.scalars(
+                select(PostModel.filename).where(PostModel.filename.in_(wanted))
+            )
+        )
+        if taken:
+            release_filenames(taken)
+        db.session.commit()
+        filenames.extend(filename for filename in wanted if filename not in taken)
+        if len(filenames) == count:
+            return filenames
+    discard_reservations(filenames)
+    raise IntegrityError(None, None, Exception("No free filename found."))
+
+
+def release_filenames(filenames):
+    """Delete the reservations in the current transaction, for the caller
+    to commit along with the posts using the names."""
+    if filenames:
+        db.session.execute(
+            delete(FilenameReservationModel).where(
+                FilenameReservationModel.filename.in_(list(filenames))
+            )
+        )
+
+
+def discard_reservations(filenames):
+    """Release names that will not be used, in a transaction of their own.
+
+    A name that cannot be released stays reserved until
+    `collect_stale_reservations` removes it.
+    """
+    try:
+        release_filenames(filenames)
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+
+
+def collect_stale_reservations():
+    """Delete reservations left by crashed workers; returns how many."""
+    stale = datetime.utcnow() - timedelta(
+        seconds=current_app.config["FILENAME_COUNTER_TTL"]
+    )
+    result = db.session.execute(
+        delete(FilenameReservationModel).where(FilenameReservationModel.created < stale)
+    )
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,283 @@
+import io
+import math
+import mmap
+import struct
+import zipfile
+from bisect import bisect_left
+
+from services.utils import normalize_name
+
+# File layout, all little-endian:
+#   header  | places (PLACE, in k-d tree order) | names (NAME, sorted) | strings
+# Places are stored with their position on the unit sphere, so the tree
+# works for any pair of points, across the antimeridian and the poles.
+# The tree is implicit: the middle place of every range splits it on the
+# axis given by its depth, like in _kd_order().
+MAGIC = b"PQGAZ\x00\x00\x01"
+HEADER = struct.Struct("<8sIII")
+PLACE = struct.Struct("<fffffIIH2x")
+NAME = struct.Struct("<IH2xI")
+
+EARTH_RADIUS = 6371008.8
+
+# GeoNames main dump columns (allCountries.txt, cities500.txt, ...)
+NAME_COLUMN, ASCII_NAME_COLUMN, ALTERNATE_NAMES_COLUMN = 1, 2, 3
+LATITUDE_COLUMN, LONGITUDE_COLUMN, FEATURE_CLASS_COLUMN = 4, 5, 6
+COUNTRY_COLUMN, ADMIN1_COLUMN, POPULATION_COLUMN = 8, 10, 14
+
+
+class GazetteerError(Exception):
+    pass
+
+
+def _unit_vector(latitude, longitude):
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def _open_text(path):
+    """Open a GeoNames text file, or the text file inside a GeoNames ZIP."""
+    if zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        names = [name for name in archive.namelist() if name.endswith(".txt")]
+        names = [name for name in names if name != "readme.txt"] or names
+        if not names:
+            raise GazetteerError(f"{path} holds no .txt file.")
+        return io.TextIOWrapper(archive.open(names[0]), encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def _read_codes(path, key_column, name_column):
+    names = {}
+    if path:
+        with _open_text(path) as file:
+            for line in file:
+                if line.startswith("#") or not line.strip():
+                    continue
+                columns = line.rstrip("\n").split("\t")
+                names[columns[key_column]] = columns[name_column]
+    return names
+
+
+def _kd_order(points):
+    """Order `points` so that every range's middle point splits it."""
+    order = list(range(len(points)))
+    ranges = [(0, len(order), 0)]
+    while ranges:
+        low, high, depth = ranges.pop()
+        if high - low <= 1:
+            continue
+        axis = depth % 3
+        order[low:high] = sorted(order[low:high], key=lambda i: points[i][axis])
+        middle = (low + high) // 2
+        ranges.append((low, middle, depth + 1))
+        ranges.append((middle + 1, high, depth + 1))
+    return order
+
+
+def build_gazetteer(
+    source,
+    output,
+    admin1=None,
+    countries=None,
+    feature_classes="P",
+    min_population=0,
+    alternate_names=False,
+):
+    """Write a gazetteer file from a GeoNames dump; returns the place count.
+
+    `admin1` (admin1CodesASCII.txt) and `countries` (countryInfo.txt) turn
+    region and country codes into names in the addresses.
+    """
+    region_names = _read_codes(admin1, 0, 1)
+    country_names = _read_codes(countries, 0, 4)
+
+    places = []
+    with _open_text(source) as file:
+        for line in file:
+            columns = line.rstrip("\n").split("\t")
+            if len(columns) <= POPULATION_COLUMN:
+                continue
+            if feature_classes and columns[FEATURE_CLASS_COLUMN] not in feature_classes:
+                continue
+            population = int(columns[POPULATION_COLUMN] or 0)
+            if population < min_population:
+                continue
+            country = columns[COUNTRY_COLUMN]
+            parts = []
+            for part in (
+                columns[NAME_COLUMN],
+                region_names.get(f"{country}.{columns[ADMIN1_COLUMN]}"),
+                country_names.get(country, country),
+            ):
+                if part and (not parts or parts[-1] != part):
+                    parts.append(part)
+            names = {columns[NAME_COLUMN], columns[ASCII_NAME_COLUMN]}
+            if alternate_names:
+                names.update(columns[ALTERNATE_NAMES_COLUMN].split(","))
+            keys = {normalize_name(name) for name in names} - {""}
+            latitude = float(columns[LATITUDE_COLUMN])
+            longitude = float(columns[LONGITUDE_COLUMN])
+            places.append(
+                (
+                    _unit_vector(latitude, longitude),
+                    latitude,
+                    longitude,
+                    population,
+                    ", ".join(parts),
+                    keys,
+                )
+            )
+
+    order = _kd_order([place[0] for place in places])
+    strings = bytearray()
+    key_offsets = {}
+    place_records = []
+    name_entries = []
+    for position, index in enumerate(order):
+        point, latitude, longitude, population, label, keys = places[index]
+        label = label.encode()
+        place_records.append(
+            PLACE.pack(
+                *point,
+                latitude,
+                longitude,
+                min(population, 2**32 - 1),
+                len(strings),
+                min(len(label), 2**16 - 1),
+            )
+        )
+        strings += label[: 2**16 - 1]
+        for key in keys:
+            key = key.encode()[: 2**16 - 1]
+            if key not in key_offsets:
+                key_offsets[key] = len(strings)
+                strings += key
+            name_entries.append((key, -population, position))
+    # Among places of the same name the most populous comes first.
+    name_entries.sort()
+
+    with open(output, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(places), len(name_entries), len(strings)))
+        file.writelines(place_records)
+        file.writelines(
+            NAME.pack(key_offsets[key], len(key), position)
+            for key, _, position in name_entries
+        )
+        file.write(strings)
+    return len(places)
+
+
+class Gazetteer:
+    """In-process geocoder reading a file written by `build_gazetteer`.
+
+    The file is memory-mapped, so workers share it through the page cache
+    and only the pages touched by lookups are read. Reverse lookups return
+    the nearest place within `max_distance` meters; forward lookups accept
+    addresses starting with a place name, e.g. "Paris" or "Paris, France".
+    Anything else is a miss (None), left to the next geocoder.
+    """
+
+    rate_limited = False
+
+    def __init__(self, path, max_distance=10000):
+        self.path = path
+        self.max_distance = max_distance
+        try:
+            with open(path, "rb") as file:
+                self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            # mmap raises ValueError for an empty file.
+            raise GazetteerError(f"{path} cannot be read: {e}") from e
+        if len(self._data) < HEADER.size:
+            raise GazetteerError(f"{path} is not a gazetteer file.")
+        magic, self.place_count, self.name_count, strings_size = HEADER.unpack_from(
+            self._data
+        )
+        if magic != MAGIC:
+            raise GazetteerError(f"{path} is not a gazetteer file.")
+        self._places_at = HEADER.size
+        self._names_at = self._places_at + self.place_count * PLACE.size
+        self._strings_at = self._names_at + self.name_count * NAME.size
+        if self._strings_at + strings_size > len(self._data):
+            raise GazetteerError(f"{path} is truncated.")
+
+    def _place(self, position):
+        return PLACE.unpack_from(self._data, self._places_at + position * PLACE.size)
+
+    def _string(self, offset, length):
+        start = self._strings_at + offset
+        return self._data[start : start + length]
+
+    def _label(self, place):
+        return self._string(place[6], place[7]).decode()
+
+    def reverse(self, latitude, longitude):
+        target = _unit_vector(latitude, longitude)
+        # Squared chord length of the largest accepted distance.
+        limit = (2 * math.sin(min(self.max_distance / EARTH_RADIUS, math.pi) / 2)) ** 2
+        best = [limit, None]
+        # (low, high, depth, squared distance from the target to the range)
+        ranges = [(0, self.place_count, 0, 0.0)]
+        while ranges:
+            low, high, depth, bound = ranges.pop()
+            if low >= high or bound > best[0]:
+                continue
+            middle = (low + high) // 2
+            place = self._place(middle)
+            distance = sum((a - b) ** 2 for a, b in zip(place[:3], target))
+            if distance <= best[0]:
+                best[:] = distance, place
+            axis = depth % 3
+            offset = target[axis] - place[axis]
+            near, far = (low, middle), (middle + 1, high)
+            if offset > 0:
+                near, far = far, near
+            # The near side is searched first and can rule the far side out.
+            ranges.append((*far, depth + 1, offset * offset))
+            ranges.append((*near, depth + 1, 0.0))
+        return self._label(best[1]) if best[1] is not None else None
+
+    def _key(self, index):
+        offset, length, _ = NAME.unpack_from(
+            self._data, self._names_at + index * NAME.size
+        )
+        return self._string(offset, length)
+
+    def _named(self, key):
+        """Places named `key`, the most populous first."""
+        key = key.encode()
+        names = _Keys(self)
+        index = bisect_left(names, key)
+        while index < self.name_count and names[index] == key:
+            _, _, position = NAME.unpack_from(
+                self._data, self._names_at + index * NAME.size
+            )
+            yield self._place(position)
+            index += 1
+
+    def geocode(self, address):
+        parts = [normalize_name(part) for part in address.split(",")]
+        parts = [part for part in parts if part]
+        if not parts:
+            return None
+        for place in self._named(parts[0]):
+            label_parts = {
+                normalize_name(part) for part in self._label(place).split(",")
+            }
+            if all(part in label_parts for part in parts[1:]):
+                return round(place[3], 5), round(place[4], 5)
+        return None
+
+
+class _Keys:
+    """Sequence view of the sorted name keys, for bisect."""
+
+    def __init__(self, gazetteer):
+        self.gazetteer = gazetteer
+
+    def __len__(self):
+        return self.gazetteer.name_count
+
+    def __getitem__(self, index):
+        return self.gazetteer._key(index)
@@ -0,0 +1,364 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter
+
+from flask import current_app
+from geopy.exc import GeocoderUnavailable
+from geopy.geocoders import Nominatim
+from redis import RedisError
+
+from db import get_redis
+from metrics import TimedCalls
+from services.gazetteer import Gazetteer, GazetteerError
+from services.utils import LRUCache, normalize_name
+
+logger = logging.getLogger(__name__)
+
+
+class NominatimGeocoder:
+    # Nominatim's usage policy allows one request per second.
+    rate_limited = True
+
+    def __init__(self, user_agent="picturesque_api"):
+        self.client = Nominatim(user_agent=user_agent)
+
+    def geocode(self, address):
+        location = self.client.geocode(address)
+        if location is None:
+            return None
+        return location.latitude, location.longitude
+
+    def reverse(self, latitude, longitude):
+        location = self.client.reverse(f"{latitude}, {longitude}")
+        return location.address if location else None
+
+
+class FakeGeocoder:
+    """Offline geocoder for tests and benchmarks."""
+
+    rate_limited = False
+
+    PLACES = {
+        "london": (51.5073219, -0.1276474),
+        "dublin": (53.3493795, -6.2605593),
+        "paris": (48.8534951, 2.3483915),
+        "krakow": (50.0619474, 19.9368564),
+        "isle of man, douglas": (54.1502412, -4.4779481),
+    }
+
+    def geocode(self, address):
+        return self.PLACES.get(address.strip().casefold())
+
+    def reverse(self, latitude, longitude):
+        return f"{latitude:.5f}, {longitude:.5f}"
+
+
+class TokenBucket:
+    """Rate limiter shared by all workers through Redis.
+
+    Falls back to a per-worker bucket when Redis is unavailable.
+    """
+
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local time = redis.call("TIME")
+    local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+    local state = redis.call("HMGET", KEYS[1], "tokens", "updated")
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call("HSET", KEYS[1], "tokens", tokens, "updated", now)
+    redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, rate, capacity=1, redis=None, key="geocoder:rate"):
+        self.rate = rate
+        self.capacity = capacity
+        self.key = key
+        self._script = redis.register_script(self.SCRIPT) if redis else None
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take_local(self):
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def _take(self):
+        if self._script is not None:
+            try:
+                return float(
+                    self._script(keys=[self.key], args=[self.rate, self.capacity])
+                )
+            except RedisError:
+                pass
+        return self._take_local()
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise GeocoderUnavailable("Geocoder rate limit exceeded.")
+            time.sleep(wait)
+
+
+class RateLimitedGeocoder:
+    def __init__(self, backend, limiter, timeout):
+        self.backend = backend
+        self.limiter = limiter
+        self.timeout = timeout
+
+    def geocode(self, address):
+        self.limiter.acquire(self.timeout)
+        return self.backend.geocode(address)
+
+    def reverse(self, latitude, longitude):
+        self.limiter.acquire(self.timeout)
+        return self.backend.reverse(latitude, longitude)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Lets concurrent callers with the same key share one computation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, compute):
+        """Return (value, shared)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+        try:
+            call.value = compute()
+            return call.value, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class GeocoderClient:
+    """Geocoder used by the application.
+
+    An `offline` geocoder (the gazetteer) answers first when configured;
+    only its misses go further. Lookups hit a per-worker LRU first, then
+    Redis shared by all workers, and only then the backend. Addresses are
+    keyed by their normalized form, reverse lookups by coordinates rounded
+    to `precision` decimal places. "Not found" answers are cached as well.
+
+    Concurrent misses for the same key are coalesced: within a worker
+    threads share one call, across workers a short Redis lock makes the
+    others wait for the first one's result.
+    """
+
+    LOCK_TIMEOUT = 10
+
+    def __init__(
+        self,
+        backend,
+        redis=None,
+        ttl=30 * 24 * 3600,
+        local_size=1024,
+        local_ttl=3600,
+        precision=4,
+        offline=None,
+    ):
+        self.backend = backend
+        self.offline = offline
+        self.redis = redis
+        self.ttl = ttl
+        self.precision = precision
+        self.local = LRUCache(local_size, min(local_ttl, ttl))
+        self.single_flight = SingleFlight()
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def geocode(self, address):
+        found = self._offline("geocode", address)
+        if found:
+            return found
+        key = f"geocode:{normalize_name(address)}"
+        found = self._cached(key, lambda: self.backend.geocode(address))
+        return tuple(found) if found else None
+
+    def reverse(self, latitude, longitude):
+        found = self._offline("reverse", latitude, longitude)
+        if found:
+            return found
+        key = "reverse:{:.{p}f},{:.{p}f}".format(latitude, longitude, p=self.precision)
+        return self._cached(key, lambda: self.backend.reverse(latitude, longitude))
+
+    def geocode_many(self, addresses):
+        """Geocode a batch, looking up each distinct address once.
+
+        Returns a dict mapping every given address to its coordinates or None.
+        """
+        by_key = {}
+        for address in addresses:
+            by_key.setdefault(normalize_name(address), address)
+        found = {key: self.geocode(address) for key, address in by_key.items()}
+        return {address: found[normalize_name(address)] for address in addresses}
+
+    def _offline(self, method, *args):
+        if self.offline is None:
+            return None
+        found = getattr(self.offline, method)(*args)
+        self._count("offline_hits" if found else "offline_misses")
+        return found
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _redis_call(self, method, *args, **kwargs):
+        if self.redis is None:
+            return None
+        try:
+            return getattr(self.redis, method)(*args, **kwargs)
+        except RedisError:
+            self._count("redis_errors")
+            return None
+
+    def _cached(self, key, compute):
+        found, value = self.local.get(key)
+        if found:
+            self._count("local_hits")
+            return value
+        value, shared = self.single_flight.do(key, lambda: self._load(key, compute))
+        if shared:
+            self._count("coalesced")
+        return value
+
+    def _load(self, key, compute):
+        cached = self._redis_call("get", key)
+        if cached is not None:
+            self._count("redis_hits")
+        elif not self._redis_call(
+            "set", f"{key}:lock", 1, nx=True, ex=self.LOCK_TIMEOUT
+        ):
+            cached = self._wait_for_other_worker(key)
+
+        if cached is not None:
+            value = json.loads(cached)
+        else:
+            self._count("misses")
+            try:
+                value = compute()
+            except Exception:
+                self._redis_call("delete", f"{key}:lock")
+                raise
+            # The value goes in before the lock goes away, so a waiting
+            # worker never sees neither and geocodes again.
+            self._redis_call("set", key, json.dumps(value), ex=self.ttl)
+            self._redis_call("delete", f"{key}:lock")
+        self.local.set(key, value)
+        return value
+
+    def _wait_for_other_worker(self, key):
+        if self.redis is None:
+            return None
+        deadline = time.monotonic() + self.LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            cached = self._redis_call("get", key)
+            if cached is not None:
+                self._count("coalesced")
+                return cached
+            if not self._redis_call("exists", f"{key}:lock"):
+                break
+        return None
+
+
+GEOCODER_BACKENDS = {"nominatim": NominatimGeocoder, "fake": FakeGeocoder}
+
+
+def get_geocoder():
+    if "geocoder" not in current_app.extensions:
+        config = current_app.config
+        redis = get_redis() if config["GEOCODER_CACHE_REDIS"] else None
+        backend = TimedCalls(
+            GEOCODER_BACKENDS[config["GEOCODER_BACKEND"]](), "geocoder"
+        )
+        if backend.rate_limited:
+            limiter = TokenBucket(
+                config["GEOCODER_RATE_LIMIT"],
+                capacity=config["GEOCODER_RATE_BURST"],
+                redis=redis,
+            )
+            limiter = TimedCalls(limiter, "geocoder_rate_limit")
+            backend = RateLimitedGeocoder(
+                backend, limiter, config["GEOCODER_RATE_LIMIT_TIMEOUT"]
+            )
+        offline = None
+        if config["GEOCODER_GAZETTEER"]:
+            try:
+                offline = Gazetteer(
+                    config["GEOCODER_GAZETTEER"],
+                    max_distance=config["GEOCODER_GAZETTEER_MAX_DISTANCE"],
+                )
+            except GazetteerError:
+                # Everything is still resolved, only by the backend.
+                logger.exception("Gazetteer not used.")
+        current_app.extensions["geocoder"] = GeocoderClient(
+            backend,
+            redis=redis,
+            ttl=config["GEOCODER_CACHE_TTL"],
+            local_size=config["GEOCODER_CACHE_SIZE"],
+            local_ttl=config["GEOCODER_CACHE_LOCAL_TTL"],
+            precision=config["GEOCODER_CACHE_PRECISION"],
+            offline=offline,
+        )
+    return current_app.extensions["geocoder"]
+
+
+def locate(geocoder, latitude=None, longitude=None, address=None):
+    """Resolve a post's location like the API documents it.
+
+    The address is tried first, then the coordinates (if given) are turned
+    back into a full address. Raises geopy's GeocoderUnavailable.
+    """
+    if address:
+        found = geocoder.geocode(address)
+        if found:
+            latitude, longitude = found
+    if latitude is not None and longitude is not None:
+        address = geocoder.reverse(latitude, longitude) or address
+    return latitude, longitude, address
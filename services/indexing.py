@@ -0,0 +1,113 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+
+_local_indexes = []
+
+
+class LocalIndex(ABC):
+    """Per-worker in-memory index over database tables.
+
+    Used where the database cannot index a lookup itself (e.g. SQLite).
+    The index is built lazily and rebuilt at most every LOCAL_INDEX_TTL
+    seconds to pick up changes made by other workers. Rows this worker
+    commits are passed to `update` on the next use, bulk statements drop
+    the whole index (see `mark_local_indexes_dirty`). Changes to other
+    columns than `columns`, like counters, are ignored.
+    """
+
+    models = ()
+    columns = ()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+        self._built = 0
+        self._changed = set()
+        self._changed_lock = threading.Lock()
+        _local_indexes.append(self)
+
+    def invalidate(self):
+        self._state = None
+
+    def changed(self, rows):
+        """Queue (model, id) rows for the next `get_state`."""
+        with self._changed_lock:
+            self._changed |= rows
+
+    def get_state(self):
+        ttl = current_app.config["LOCAL_INDEX_TTL"]
+        with self._lock:
+            with self._changed_lock:
+                rows, self._changed = self._changed, set()
+            if self._state is None or time.monotonic() - self._built > ttl:
+                self._state = self.build()
+                self._built = time.monotonic()
+            elif rows:
+                self._state = self.update(self._state, rows)
+            return self._state
+
+    @abstractmethod
+    def build(self):
+        """Return the state of the index over the whole tables."""
+
+    def update(self, state, rows):
+        """Return `state` with the (model, id) `rows` read again.
+
+        A row that no longer exists was deleted. `state` may be in use by
+        other threads, so it must not be changed in place.
+        """
+        return self.build()
+
+
+def _changes_columns(instance, columns):
+    mapper = instance.__mapper__
+    return any(
+        attributes.get_history(instance, column).has_changes()
+        for column in columns
+        if column in mapper.attrs
+    )
+
+
+def mark_local_indexes_dirty(session, *models):
+    """Rebuild the indexes over `models` once `session` commits.
+
+    For bulk statements, which the flush events below do not see.
+    """
+    for index in _local_indexes:
+        if any(issubclass(model, index.models) for model in models):
+            session.info.setdefault("dirty_local_indexes", set()).add(index)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_rows(session, flush_context):
+    changed = session.info.setdefault("local_index_rows", {})
+    for index in _local_indexes:
+        for instance in (*session.new, *session.dirty, *session.deleted):
+            if not isinstance(instance, index.models):
+                continue
+            if instance in session.dirty and not _changes_columns(
+                instance, index.columns
+            ):
+                continue
+            changed.setdefault(index, set()).add((type(instance), instance.id))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_local_indexes(session):
+    dirty = session.info.pop("dirty_local_indexes", set())
+    for index in dirty:
+        index.invalidate()
+    for index, rows in session.info.pop("local_index_rows", {}).items():
+        if index not in dirty:
+            index.changed(rows)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_local_indexes(session):
+    session.info.pop("dirty_local_indexes", None)
+    session.info.pop("local_index_rows", None)
@@ -0,0 +1,206 @@
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from geopy.exc import GeocoderServiceError
+from sqlalchemy import update
+from sqlalchemy.exc import SQLAlchemyError
+
+from flask import g
+
+from db import db
+from metrics import metrics
+from models import ImportJobModel, IngestJobModel, PostModel, UserModel
+from services.bulk_import import process_import_job
+from services.filenames import (
+    discard_reservations,
+    release_filenames,
+    reserve_filenames,
+)
+from services.geocoding import get_geocoder, locate
+from services.jobs import claimable
+from services.lookup import get_or_create_author, get_or_create_title
+from services.recommendations import refresh_stale_recommendations
+from services.uploads import UploadError, get_uploader
+
+logger = logging.getLogger(__name__)
+
+
+class IngestError(Exception):
+    pass
+
+
+class IngestPipeline:
+    """Runs geocoding, photo upload and post creation outside the request.
+
+    It runs single posts (`process`) as well as bulk imports
+    (`process_import_job`) and recommendation refreshes. INGEST_EXECUTOR selects where jobs run: "thread"
+    (a pool of INGEST_WORKERS threads in each web worker), "inline" (inside
+    the request, useful in tests) or "external" (only enqueued, processed by
+    `flask ingest work`).
+
+    Every failure marks the job failed. `flask ingest work` also takes over
+    jobs nobody finished within INGEST_JOB_TIMEOUT, e.g. because the web
+    worker running them was restarted.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["ingest"] = self
+
+    def submit(self, job_id, process=None):
+        process = process or self.process
+        mode = self.app.config["INGEST_EXECUTOR"]
+        if mode == "inline":
+            process(job_id)
+        elif mode == "thread":
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.app.config["INGEST_WORKERS"],
+                        thread_name_prefix="ingest",
+                    )
+            self._executor.submit(self._process_in_context, process, job_id)
+
+    def work(self, once=False, poll_interval=1.0):
+        """Process pending and abandoned jobs, e.g. from a separate worker process.
+
+        Stale recommendations are refreshed as well.
+        """
+        while True:
+            jobs = [
+                (process, id)
+                for model, runnable, process in (
+                    (IngestJobModel, claimable(IngestJobModel), self.process),
+                    (ImportJobModel, claimable(ImportJobModel), process_import_job),
+                    (
+                        UserModel,
+                        UserModel.recommendations_computed.is_(None),
+                        refresh_stale_recommendations,
+                    ),
+                )
+                for id, in db.session.query(model.id)
+                .filter(runnable)
+                .order_by(model.id)
+                .limit(100)
+            ]
+            db.session.rollback()
+            for process, job_id in jobs:
+                process(job_id)
+            if once and not jobs:
+                return
+            if not jobs:
+                time.sleep(poll_interval)
+
+    def _process_in_context(self, process, job_id):
+        with self.app.app_context():
+            try:
+                process(job_id)
+            except Exception:
+                logger.exception("Ingest job %s crashed.", job_id)
+
+    def process(self, job_id):
+        # SQL and Redis calls outside a request are reported under "ingest".
+        g.metrics_endpoint = "ingest"
+        if not self._claim(job_id):
+            return
+        job = db.session.get(IngestJobModel, job_id)
+        try:
+            self._ingest(job)
+        except IngestError as e:
+            self._fail(job_id, str(e))
+        except Exception:
+            logger.exception("Ingest job %s failed.", job_id)
+            self._fail(job_id, "Post could not be created.")
+
+    def _fail(self, job_id, error):
+        db.session.rollback()
+        job = db.session.get(IngestJobModel, job_id)
+        job.status = IngestJobModel.FAILED
+        job.error = error[:256]
+        job.photo = None
+        db.session.commit()
+
+    def _claim(self, job_id):
+        result = db.session.execute(
+            update(IngestJobModel)
+            .where(IngestJobModel.id == job_id, claimable(IngestJobModel))
+            .values(status=IngestJobModel.PROCESSING, updated=datetime.utcnow())
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def _stage(self, stage):
+        return metrics.timer("ingest_stage_duration_seconds", stage=stage)
+
+    def _ingest(self, job):
+        try:
+            with self._stage("locate"):
+                latitude, longitude, address = locate(
+                    get_geocoder(), job.latitude, job.longitude, job.address
+                )
+        except GeocoderServiceError:
+            raise IngestError("Geocoder currently not available. Try later.")
+
+        job_id, photo = job.id, job.photo
+        post = PostModel(
+            user_id=job.user_id,
+            quote=job.quote,
+            latitude=latitude,
+            longitude=longitude,
+            address=address,
+            added=job.added,
+        )
+        author, title = job.author, job.title
+        try:
+            # Commits the reservation, so no transaction stays open during
+            # the upload.
+            with self._stage("reserve_filename"):
+                (post.filename,) = reserve_filenames(post.user_id, post.added)
+        except SQLAlchemyError:
+            raise IngestError("Post could not be saved.")
+
+        uploader = get_uploader()
+        try:
+            with self._stage("upload"):
+                uploaded = uploader.upload(io.BytesIO(photo), public_id=post.filename)
+        except UploadError as e:
+            discard_reservations([post.filename])
+            raise IngestError(str(e) or "Photo upload failed.")
+
+        try:
+            with self._stage("resolve_names"):
+                post.author_id = get_or_create_author(author).id
+                post.title_id = get_or_create_title(title, post.author_id).id
+            post.thumbnail_url = uploaded["thumbnail_url"]
+            post.photo_url = uploaded["photo_url"]
+            db.session.add(post)
+            release_filenames([post.filename])
+            db.session.flush()
+            job = db.session.get(IngestJobModel, job_id)
+            job.post_id = post.id
+            job.status = IngestJobModel.DONE
+            job.photo = None
+            with self._stage("commit"):
+                db.session.commit()
+        except Exception as e:
+            # Whatever went wrong, the photo and its name are not kept.
+            db.session.rollback()
+            uploader.destroy(public_id=uploaded["public_id"])
+            discard_reservations([post.filename])
+            if isinstance(e, SQLAlchemyError):
+                raise IngestError("Post could not be saved.") from e
+            raise
+
+
+ingest_pipeline = IngestPipeline()
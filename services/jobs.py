@@ -0,0 +1,20 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_
+
+
+def claimable(model):
+    """Condition for jobs that are pending or whose worker gave up on them.
+
+    Workers set `updated` when they claim a job and while they work on it;
+    a job processing without an update for INGEST_JOB_TIMEOUT seconds is
+    taken over.
+    """
+    stale = datetime.utcnow() - timedelta(
+        seconds=current_app.config["INGEST_JOB_TIMEOUT"]
+    )
+    return or_(
+        model.status == model.PENDING,
+        and_(model.status == model.PROCESSING, model.updated < stale),
+    )
@@ -0,0 +1,189 @@
+from collections import Counter
+
+from flask import current_app
+from sqlalchemy import func, literal
+
+from db import db
+from models import AuthorModel, TitleModel
+from pagination import paginate_query
+from services.indexing import LocalIndex
+from services.utils import normalize_name
+
+
+def trigrams(text):
+    # Same padding as pg_trgm, so both backends score alike.
+    grams = set()
+    for word in normalize_name(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NgramIndex(LocalIndex):
+    """Trigram index over one name column, used when pg_trgm is unavailable."""
+
+    def __init__(self, model, column, scope_column=None):
+        super().__init__()
+        self.models = (model,)
+        self.columns = tuple(
+            column.key for column in (column, scope_column) if column is not None
+        )
+        self.model = model
+        self.column = column
+        self.scope_column = scope_column
+
+    def _rows(self, ids=None):
+        columns = [self.model.id, self.column]
+        if self.scope_column is not None:
+            columns.append(self.scope_column)
+        query = db.session.query(*columns)
+        if ids is not None:
+            query = query.filter(self.model.id.in_(ids))
+        for id, name, *scope in query:
+            yield id, trigrams(name), scope[0] if scope else None
+
+    def build(self):
+        postings, documents = {}, {}
+        for id, grams, scope in self._rows():
+            documents[id] = (grams, scope)
+            for gram in grams:
+                postings.setdefault(gram, set()).add(id)
+        return postings, documents
+
+    def update(self, state, rows):
+        postings, documents = dict(state[0]), dict(state[1])
+        ids = {id for _, id in rows}
+        # Sets shared with the previous state are copied before changing.
+        copied = set()
+
+        def posting(gram):
+            if gram not in copied:
+                postings[gram] = set(postings.get(gram, ()))
+                copied.add(gram)
+            return postings[gram]
+
+        for id in ids:
+            grams, _ = documents.pop(id, ((), None))
+            for gram in grams:
+                posting(gram).discard(id)
+        for id, grams, scope in self._rows(ids):
+            documents[id] = (grams, scope)
+            for gram in grams:
+                posting(gram).add(id)
+        return postings, documents
+
+    def match(self, text, threshold, word=False, scope=None):
+        """Return [(id, score)] best first.
+
+        The score is the trigram similarity of the whole names or, with
+        `word`, the share of the query's trigrams found in the name.
+        """
+        postings, documents = self.get_state()
+        grams = trigrams(text)
+        if not grams:
+            return []
+        shared = Counter()
+        for gram in grams:
+            shared.update(postings.get(gram, ()))
+        matches = []
+        for id, count in shared.items():
+            id_grams, id_scope = documents[id]
+            size = len(id_grams)
+            if scope is not None and id_scope != scope:
+                continue
+            if word:
+                score = count / len(grams)
+            else:
+                score = count / (len(grams) + size - count)
+            if score >= threshold:
+                matches.append((id, score))
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches
+
+
+def fold_name(expression):
+    """SQL lower-casing and accent stripping of a name on PostgreSQL.
+
+    Must stay identical to the trigram indexes created in the migrations.
+    """
+    return func.lower(func.immutable_unaccent(expression))
+
+
+class NameLookup:
+    """Fuzzy lookup of authors or titles by name.
+
+    On PostgreSQL it uses pg_trgm, unaccent and the trigram indexes from
+    the migrations, elsewhere an in-process `NgramIndex`.
+    """
+
+    def __init__(self, model, column, scope_column=None):
+        self.model = model
+        self.column = column
+        self.scope_column = scope_column
+        self.local_index = NgramIndex(model, column, scope_column)
+
+    def _query(self, text, threshold, word=False, scope=None):
+        # Both sides are folded alike, so a name always matches itself.
+        target = fold_name(self.column)
+        text = fold_name(literal(text))
+        if word:
+            score = func.word_similarity(text, target)
+            condition = text.op("<%")(target)
+        else:
+            score = func.similarity(target, text)
+            condition = target.op("%")(text)
+        query = self.model.query.filter(condition, score >= threshold)
+        if scope is not None:
+            query = query.filter(self.scope_column == scope)
+        return query.order_by(score.desc(), self.model.id)
+
+    def find(self, text, scope=None):
+        threshold = current_app.config["LOOKUP_SIMILARITY_THRESHOLD"]
+        if db.engine.dialect.name == "postgresql":
+            return self._query(text, threshold, scope=scope).first()
+        matches = self.local_index.match(text, threshold, scope=scope)
+        return db.session.get(self.model, matches[0][0]) if matches else None
+
+    def autocomplete(self, text, pagination_parameters, options=()):
+        threshold = current_app.config["LOOKUP_AUTOCOMPLETE_THRESHOLD"]
+        if db.engine.dialect.name == "postgresql":
+            query = self._query(text, threshold, word=True).options(*options)
+            return paginate_query(query, pagination_parameters)
+        matches = self.local_index.match(text, threshold, word=True)
+        pagination_parameters.item_count = len(matches)
+        ids = [
+            id
+            for id, _ in matches[
+                pagination_parameters.first_item : pagination_parameters.first_item
+                + pagination_parameters.page_size
+            ]
+        ]
+        found = {
+            item.id: item
+            for item in self.model.query.options(*options).filter(
+                self.model.id.in_(ids)
+            )
+        }
+        return [found[id] for id in ids if id in found]
+
+
+author_lookup = NameLookup(AuthorModel, AuthorModel.name)
+title_lookup = NameLookup(TitleModel, TitleModel.title, TitleModel.author_id)
+
+
+def get_or_create_author(name):
+    author = author_lookup.find(name)
+    if author is None:
+        author = AuthorModel(name=name)
+        db.session.add(author)
+        db.session.flush()
+    return author
+
+
+def get_or_create_title(title, author_id):
+    title_in_db = title_lookup.find(title, scope=author_id)
+    if title_in_db is None:
+        title_in_db = TitleModel(title=title, author_id=author_id)
+        db.session.add(title_in_db)
+        db.session.flush()
+    return title_in_db
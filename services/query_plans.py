@@ -0,0 +1,193 @@
+import json
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, func, select, text
+
+from db import db
+from models import AuthorModel, CollectionModel, PostModel, TitleModel, UserModel
+from pagination import encode_cursor
+from services.spatial import area_filter, boxes_around
+
+
+def hot_queries():
+    """Filters and joins the resources run on every request, by name."""
+    return {
+        "user posts": select(PostModel.id)
+        .where(PostModel.user_id == 1)
+        .order_by(PostModel.added, PostModel.id),
+        "posts feed": select(PostModel.id)
+        .where(PostModel.added > datetime(2000, 1, 1))
+        .order_by(PostModel.added, PostModel.id),
+        "posts by author": select(PostModel.id).where(PostModel.author_id == 1),
+        "posts by title": select(PostModel.id).where(PostModel.title_id == 1),
+        "post by filename": select(PostModel.id).where(PostModel.filename == "1_0"),
+        "user collection": select(CollectionModel.post_id).where(
+            CollectionModel.user_id == 1
+        ),
+        "post collectors": select(CollectionModel.user_id).where(
+            CollectionModel.post_id == 1
+        ),
+        "collection entry": select(CollectionModel.id).where(
+            CollectionModel.user_id == 1, CollectionModel.post_id == 1
+        ),
+        "author by name": select(AuthorModel.id).where(AuthorModel.name == "a"),
+        "title by name": select(TitleModel.id).where(
+            TitleModel.title == "t", TitleModel.author_id == 1
+        ),
+        "author titles": select(TitleModel.id).where(TitleModel.author_id == 1),
+        "posts in area": select(PostModel.id).where(
+            area_filter(boxes_around(52.52, 13.4, 5000))
+        ),
+    }
+
+
+def _compile(statement):
+    return str(
+        statement.compile(
+            dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def explain(statement):
+    """Return (uses_index, plan lines) for `statement`.
+
+    A statement "uses an index" when no table is read with a full scan.
+    PostgreSQL is told to avoid sequential scans, so small test tables give
+    the same answer as production ones.
+    """
+    sql = _compile(statement)
+    with db.engine.connect() as connection:
+        if db.engine.dialect.name == "postgresql":
+            connection.execute(text("SET enable_seqscan = off"))
+            plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            lines = list(_postgres_nodes(plan[0]["Plan"]))
+            return not any(line.startswith("Seq Scan") for line in lines), lines
+        rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        lines = [row[-1] for row in rows]
+        uses_index = not any(
+            line.startswith("SCAN") and "USING" not in line for line in lines
+        )
+        return uses_index, lines
+
+
+def _postgres_nodes(node):
+    yield f"{node['Node Type']} {node.get('Relation Name', '')}".strip()
+    for child in node.get("Plans", ()):
+        yield from _postgres_nodes(child)
+
+
+def check_query_plans():
+    """Return {name: (uses_index, plan lines)} for all hot queries."""
+    return {name: explain(statement) for name, statement in hot_queries().items()}
+
+
+# Most queries a request may run, whatever the page size. A higher count
+# usually means a relationship is lazy-loaded once per serialized item.
+QUERY_BUDGETS = {
+    ("GET", "/posts/?page_size=50"): 2,
+    ("GET", "/posts/?after={cursor}&page_size=50"): 1,
+    ("GET", "/posts/?bbox=-180,-90,180,90&page_size=50"): 2,
+    ("GET", "/posts/nearby?lat=52.52&lon=13.4&radius=50000&page_size=50"): 2,
+    ("GET", "/posts/clusters?bbox=-180,-85,180,85&zoom=2"): 1,
+    ("GET", "/posts/{post}"): 2,
+    ("GET", "/authors/?page_size=50"): 4,
+    ("GET", "/authors/{author}"): 3,
+    ("GET", "/titles/?page_size=50"): 3,
+    ("GET", "/titles/{title}"): 2,
+    ("GET", "/users/{user}/posts/?page_size=50"): 3,
+    ("GET", "/users/{user}/collections/?page_size=50"): 3,
+    ("POST", "/users/recommendations/?page_size=50"): 4,
+}
+
+
+@contextmanager
+def count_queries():
+    """Collect the SQL statements run inside the block."""
+    statements = []
+
+    def record(connection, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+
+def sample_parameters():
+    """Values for the placeholders in QUERY_BUDGETS, None for empty tables.
+
+    These are the lowest post, author, title and user id, and a feed cursor
+    halfway through the posts, so keyset pages are measured away from the
+    start of the index.
+    """
+    parameters = {
+        name: db.session.scalar(select(func.min(model.id)))
+        for name, model in (
+            ("post", PostModel),
+            ("author", AuthorModel),
+            ("title", TitleModel),
+            ("user", UserModel),
+        )
+    }
+    middle = db.session.execute(
+        select(PostModel.added, PostModel.id)
+        .order_by(PostModel.added, PostModel.id)
+        .offset(db.session.scalar(select(func.count(PostModel.id))) // 2)
+        .limit(1)
+    ).first()
+    parameters["cursor"] = encode_cursor(*middle) if middle else None
+    return parameters
+
+
+def _headers(user_id):
+    """Authorization headers of `user_id`, as issued by /login."""
+    if user_id is None:
+        return {}
+    return {"Authorization": "Bearer " + create_access_token(identity=user_id)}
+
+
+def check_query_counts(budgets=None):
+    """Return {(method, url): (query count, budget, status code)} for every endpoint.
+
+    Each endpoint is requested once before counting, so one-off work like
+    building the local indexes is not included. The response cache is
+    bypassed and background jobs, like refreshing recommendations, run
+    inside that first request. Endpoints whose ids do not exist in the database yet are
+    skipped. A check only counts when the status code is 2xx; an error
+    response usually runs fewer queries than the real one.
+    """
+    parameters = sample_parameters()
+    headers = _headers(parameters["user"])
+    db.session.remove()
+
+    # Cached responses would hide the queries being checked.
+    cache_enabled = current_app.config["RESPONSE_CACHE_ENABLED"]
+    current_app.config["RESPONSE_CACHE_ENABLED"] = False
+    executor = current_app.config["INGEST_EXECUTOR"]
+    current_app.config["INGEST_EXECUTOR"] = "inline"
+    client = current_app.test_client()
+    results = {}
+    try:
+        for (method, url), budget in (budgets or QUERY_BUDGETS).items():
+            if any(
+                value is None and f"{{{name}}}" in url
+                for name, value in parameters.items()
+            ):
+                continue
+            url = url.format(**parameters)
+            client.open(url, method=method, headers=headers)
+            with count_queries() as statements:
+                response = client.open(url, method=method, headers=headers)
+            results[(method, url)] = (len(statements), budget, response.status_code)
+    finally:
+        current_app.config["RESPONSE_CACHE_ENABLED"] = cache_enabled
+        current_app.config["INGEST_EXECUTOR"] = executor
+    return results
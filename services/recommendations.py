@@ -0,0 +1,154 @@
+import threading
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, literal, select, union, update
+
+from db import db
+from models import CollectionModel, PostModel, RecommendationModel, UserModel
+
+# Users whose refresh was submitted by this worker and has not started yet.
+_scheduled = set()
+_scheduled_lock = threading.Lock()
+
+
+def recommendation_scores(user_id):
+    """Score posts for `user_id` in a single aggregate query.
+
+    Every other user who collected some of the same posts gets one point per
+    shared post. A candidate post scores the sum of the points of all users
+    who collected it. Posts already collected or written by `user_id` are
+    skipped.
+    """
+    collected = (
+        select(CollectionModel.user_id, CollectionModel.post_id)
+        .where(
+            CollectionModel.user_id.is_not(None), CollectionModel.post_id.is_not(None)
+        )
+        .distinct()
+        .cte("collected")
+    )
+    chosen = collected.alias("chosen")
+    candidates = collected.alias("candidates")
+
+    own_choice = select(chosen.c.post_id).where(chosen.c.user_id == user_id)
+    own_posts = select(PostModel.id).where(PostModel.user_id == user_id)
+
+    neighbours = (
+        select(collected.c.user_id, func.count().label("points"))
+        .where(collected.c.post_id.in_(own_choice), collected.c.user_id != user_id)
+        .group_by(collected.c.user_id)
+        .subquery("neighbours")
+    )
+    return (
+        select(candidates.c.post_id, func.sum(neighbours.c.points).label("score"))
+        .join(neighbours, candidates.c.user_id == neighbours.c.user_id)
+        .where(
+            candidates.c.post_id.not_in(own_choice),
+            candidates.c.post_id.not_in(own_posts),
+        )
+        .group_by(candidates.c.post_id)
+        .subquery("scores")
+    )
+
+
+def refresh_recommendations(user_id):
+    """Store the top RECOMMENDATIONS_TOP_N posts for `user_id`.
+
+    The recommendations are only marked computed if they did not go stale
+    since the refresh started; otherwise they are refreshed again later.
+    The caller commits.
+    """
+    # Locking the user keeps concurrent refreshes from inserting the same rows.
+    version = db.session.scalar(
+        select(UserModel.recommendations_version)
+        .where(UserModel.id == user_id)
+        .with_for_update()
+    )
+    scores = recommendation_scores(user_id)
+    top = (
+        select(literal(user_id), scores.c.post_id, scores.c.score)
+        .order_by(scores.c.score.desc(), scores.c.post_id.desc())
+        .limit(current_app.config["RECOMMENDATIONS_TOP_N"])
+    )
+    db.session.execute(
+        delete(RecommendationModel).where(RecommendationModel.user_id == user_id)
+    )
+    db.session.execute(
+        insert(RecommendationModel).from_select(["user_id", "post_id", "score"], top)
+    )
+    db.session.execute(
+        update(UserModel)
+        .where(UserModel.id == user_id, UserModel.recommendations_version == version)
+        .values(recommendations_computed=datetime.utcnow())
+    )
+
+
+def refresh_stale_recommendations(user_id):
+    """Refresh and commit the recommendations of `user_id` if they are stale.
+
+    Runs as a background job of the ingest pipeline, see `recommended_posts`.
+    """
+    with _scheduled_lock:
+        _scheduled.discard(user_id)
+    stale = db.session.scalar(
+        select(UserModel.recommendations_computed.is_(None)).where(
+            UserModel.id == user_id
+        )
+    )
+    if stale:
+        refresh_recommendations(user_id)
+    db.session.commit()
+
+
+def mark_recommendations_stale(user_id, *post_ids):
+    """Flag users whose scores change when `user_id` (un)collects `post_ids`.
+
+    These are `user_id`, everyone sharing a collected post with them and
+    everyone who collected one of `post_ids`. Their recommendations are
+    refreshed in the background on next read, by `flask ingest work` or by
+    `flask recommendations refresh`.
+    """
+    shared = CollectionModel.__table__.alias("shared")
+    affected = union(
+        select(literal(user_id)),
+        select(shared.c.user_id)
+        .join(CollectionModel, CollectionModel.post_id == shared.c.post_id)
+        .where(CollectionModel.user_id == user_id),
+        select(CollectionModel.user_id).where(CollectionModel.post_id.in_(post_ids)),
+    )
+    db.session.execute(
+        update(UserModel)
+        .where(UserModel.id.in_(affected))
+        .values(
+            recommendations_computed=None,
+            recommendations_version=UserModel.recommendations_version + 1,
+        )
+    )
+
+
+def recommended_posts(user_id):
+    """Stored recommendations of `user_id`, best first.
+
+    Reads never score posts: stale recommendations are served as they are
+    while the ingest pipeline refreshes them in the background (or
+    `flask ingest work`, when INGEST_EXECUTOR is "external").
+    """
+    computed = db.session.scalar(
+        select(UserModel.recommendations_computed).where(UserModel.id == user_id)
+    )
+    if computed is None:
+        with _scheduled_lock:
+            scheduled = user_id in _scheduled
+            _scheduled.add(user_id)
+        if not scheduled:
+            current_app.extensions["ingest"].submit(
+                user_id, process=refresh_stale_recommendations
+            )
+    return (
+        PostModel.query.join(
+            RecommendationModel, RecommendationModel.post_id == PostModel.id
+        )
+        .filter(RecommendationModel.user_id == user_id)
+        .order_by(RecommendationModel.score.desc(), PostModel.id.desc())
+    )
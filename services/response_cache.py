@@ -0,0 +1,223 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import Counter
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, make_response, request
+from redis import RedisError
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, attributes
+
+from db import get_redis
+from models import AuthorModel, CollectionModel, PostModel, TitleModel, UserModel
+from services.utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Cache of serialized GET responses, invalidated by tags.
+
+    Every entry is stored under a key that includes the current version of
+    each of its tags ("authors", "post:42", ...). Committing a change bumps
+    the versions of the tags it touches, so later requests miss and the
+    stale entries simply expire. Versions live in Redis, shared by all
+    workers; entries are kept both in Redis and in a per-worker LRU.
+
+    Without Redis the versions are per-worker, which is only correct with a
+    single worker.
+    """
+
+    def __init__(self, redis=None, ttl=300, local_size=1024, local_ttl=60):
+        self.redis = redis
+        self.ttl = ttl
+        self.local = LRUCache(local_size, min(local_ttl, ttl))
+        self.stats = Counter()
+        self._versions = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def versions(self, tags):
+        if self.redis is None:
+            with self._lock:
+                return [self._versions[tag] for tag in tags]
+        values = self.redis.mget([f"cache:tag:{tag}" for tag in tags])
+        return [int(value or 0) for value in values]
+
+    def invalidate(self, tags):
+        if not tags:
+            return
+        if self.redis is None:
+            with self._lock:
+                self._versions.update(tags)
+            return
+        pipeline = self.redis.pipeline(transaction=False)
+        for tag in tags:
+            pipeline.incr(f"cache:tag:{tag}")
+        pipeline.execute()
+
+    def get(self, key):
+        found, entry = self.local.get(key)
+        if found:
+            self.count("local_hits")
+            return entry
+        if self.redis is not None:
+            cached = self.redis.get(key)
+            if cached is not None:
+                self.count("redis_hits")
+                entry = json.loads(cached)
+                self.local.set(key, entry)
+                return entry
+        self.count("misses")
+        return None
+
+    def set(self, key, entry):
+        self.local.set(key, entry)
+        if self.redis is not None:
+            self.redis.set(key, json.dumps(entry), ex=self.ttl)
+
+
+def get_response_cache():
+    config = current_app.config
+    if not config["RESPONSE_CACHE_ENABLED"]:
+        return None
+    if "response_cache" not in current_app.extensions:
+        current_app.extensions["response_cache"] = ResponseCache(
+            redis=get_redis() if config["RESPONSE_CACHE_REDIS"] else None,
+            ttl=config["RESPONSE_CACHE_TTL"],
+            local_size=config["RESPONSE_CACHE_SIZE"],
+            local_ttl=config["RESPONSE_CACHE_LOCAL_TTL"],
+        )
+    return current_app.extensions["response_cache"]
+
+
+def _conditional(entry):
+    response = make_response(entry["body"], entry["status"], entry["headers"])
+    response.set_etag(entry["etag"])
+    return response.make_conditional(request)
+
+
+def cached_response(*tags):
+    """Cache a GET view's 200 responses and answer If-None-Match.
+
+    `tags` are formatted with the view's URL arguments, e.g. "post:{id}".
+    The key covers the path and all query arguments, pagination included.
+    Put it above the flask-smorest decorators: it stores the response they
+    serialize, headers like X-Pagination included, and keeps their API
+    documentation through functools.wraps.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_response_cache()
+            if cache is None:
+                return view(*args, **kwargs)
+            entry_tags = [tag.format(**kwargs) for tag in tags]
+            try:
+                versions = cache.versions(entry_tags)
+                arguments = urlencode(sorted(request.args.items(multi=True)))
+                digest = hashlib.sha1(
+                    f"{request.path}?{arguments}|{versions}".encode()
+                ).hexdigest()
+                key = f"cache:response:{request.endpoint}:{digest}"
+                entry = cache.get(key)
+            except RedisError:
+                cache.count("redis_errors")
+                return view(*args, **kwargs)
+            if entry is not None:
+                return _conditional(entry)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = response.get_data(as_text=True)
+            entry = {
+                "status": response.status_code,
+                "headers": [
+                    (name, value)
+                    for name, value in response.headers.items()
+                    if name not in ("Content-Length", "ETag")
+                ],
+                "body": body,
+                "etag": hashlib.sha1(body.encode()).hexdigest(),
+            }
+            try:
+                cache.set(key, entry)
+            except RedisError:
+                cache.count("redis_errors")
+            return _conditional(entry)
+
+        return wrapper
+
+    return decorator
+
+
+def _changed_tags(session):
+    tags = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        changed_rows = instance in session.new or instance in session.deleted
+        if isinstance(instance, PostModel):
+            tags.add(f"post:{instance.id}")
+            for column, name in (("author_id", "author"), ("title_id", "title")):
+                history = attributes.get_history(instance, column)
+                if changed_rows or history.has_changes():
+                    ids = {*history.sum(), getattr(instance, column)}
+                    tags.update(f"{name}:{id}" for id in ids if id is not None)
+                    tags.update(("authors", "titles"))
+        elif isinstance(instance, AuthorModel):
+            tags.update(("authors", f"author:{instance.id}"))
+        elif isinstance(instance, TitleModel):
+            tags.update(
+                ("authors", "titles", f"title:{instance.id}"),
+                (f"author:{instance.author_id}",),
+            )
+        elif isinstance(instance, CollectionModel):
+            tags.add(f"post:{instance.post_id}")
+        elif isinstance(instance, UserModel):
+            if instance in session.deleted:
+                collection = inspect(instance).attrs.collection.loaded_value
+                posts = collection if isinstance(collection, list) else ()
+            else:
+                posts = attributes.get_history(instance, "collection").sum()
+            tags.update(f"post:{post.id}" for post in posts)
+    return tags
+
+
+def invalidate_on_commit(session, tags):
+    """Invalidate `tags` once `session` commits.
+
+    For bulk statements, which the flush event below does not see.
+    """
+    if tags:
+        session.info.setdefault("response_cache_tags", set()).update(tags)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_response_cache_tags(session, flush_context):
+    invalidate_on_commit(session, _changed_tags(session))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_response_cache(session):
+    tags = session.info.pop("response_cache_tags", None)
+    if not tags:
+        return
+    cache = get_response_cache()
+    if cache is None:
+        return
+    try:
+        cache.invalidate(tags)
+    except RedisError:
+        logger.exception("Could not invalidate cached responses %s.", tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_response_cache_tags(session):
+    session.info.pop("response_cache_tags", None)
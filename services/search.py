@@ -0,0 +1,262 @@
+import math
+import re
+from bisect import bisect_left
+
+from sqlalchemy import case, func, literal, literal_column, select, union_all
+
+from db import db
+from loaders import post_loaders
+from models import PostModel, TitleModel, AuthorModel
+from services.indexing import LocalIndex
+
+CATEGORIES = ("title", "author", "quote", "address")
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return [token.casefold() for token in TOKEN_PATTERN.findall(text or "")]
+
+
+def search_posts(q, pagination_parameters):
+    """Return one `{"found_in", "post"}` item per matching post and field.
+
+    Every search term has to match (as a word prefix) in the same field.
+    Results are ordered by relevance.
+    """
+    terms = tokenize(q)
+    if not terms:
+        pagination_parameters.item_count = 0
+        return []
+    if db.engine.dialect.name == "postgresql":
+        rows = _search_postgres(terms, pagination_parameters)
+    else:
+        rows = inverted_index.search(terms, pagination_parameters)
+    return [{"found_in": found_in, "post": post} for found_in, post in rows]
+
+
+def search_document(column):
+    # Must stay identical to the expression indexes created in the migrations.
+    return func.to_tsvector(
+        literal_column("'simple'"), func.coalesce(column, literal_column("''"))
+    )
+
+
+def _search_postgres(terms, pagination_parameters):
+    query = func.to_tsquery(
+        literal_column("'simple'"), " & ".join(f"{term}:*" for term in terms)
+    )
+    documents = {
+        "title": (TitleModel.title, TitleModel),
+        "author": (AuthorModel.name, AuthorModel),
+        "quote": (PostModel.quote, None),
+        "address": (PostModel.address, None),
+    }
+    selects = []
+    for found_in, (column, joined) in documents.items():
+        document = search_document(column)
+        statement = select(
+            PostModel.id.label("post_id"),
+            literal(found_in).label("found_in"),
+            func.ts_rank(document, query).label("rank"),
+        )
+        if joined is not None:
+            statement = statement.join(joined)
+        selects.append(statement.where(document.op("@@")(query)))
+    matches = union_all(*selects).subquery()
+
+    category_order = case(
+        {found_in: index for index, found_in in enumerate(CATEGORIES)},
+        value=matches.c.found_in,
+    )
+    rows = (
+        db.session.query(
+            PostModel, matches.c.found_in, func.count().over().label("total")
+        )
+        .join(matches, PostModel.id == matches.c.post_id)
+        .options(*post_loaders(in_collection=False))
+        .order_by(matches.c.rank.desc(), category_order, PostModel.id)
+        .limit(pagination_parameters.page_size)
+        .offset(pagination_parameters.first_item)
+        .all()
+    )
+    if rows:
+        pagination_parameters.item_count = rows[0].total
+    else:
+        pagination_parameters.item_count = (
+            db.session.query(func.count()).select_from(matches).scalar()
+        )
+    return [(found_in, post) for post, found_in, _ in rows]
+
+
+class InvertedIndex(LocalIndex):
+    """Word-prefix index used when the database has no full-text search."""
+
+    models = (PostModel, TitleModel, AuthorModel)
+    columns = ("title_id", "author_id", "quote", "address", "title", "name")
+
+    def search(self, terms, pagination_parameters):
+        state = self.get_state()
+        scored = []
+        for order, found_in in enumerate(CATEGORIES):
+            postings, tokens, documents, posts_of = state[found_in]
+            document_count = len(documents) or 1
+            scores = None
+            for term in terms:
+                matched = set()
+                position = bisect_left(tokens, term)
+                while position < len(tokens) and tokens[position].startswith(term):
+                    matched |= postings[tokens[position]]
+                    position += 1
+                if not matched:
+                    scores = None
+                    break
+                weight = math.log(1 + document_count / len(matched))
+                if scores is None:
+                    scores = dict.fromkeys(matched, weight)
+                else:
+                    scores = {
+                        doc: score + weight
+                        for doc, score in scores.items()
+                        if doc in matched
+                    }
+            for doc, score in (scores or {}).items():
+                for post_id in (doc,) if posts_of is None else posts_of.get(doc, ()):
+                    scored.append((-score, order, post_id, found_in))
+
+        scored.sort()
+        pagination_parameters.item_count = len(scored)
+        window = scored[
+            pagination_parameters.first_item : pagination_parameters.first_item
+            + pagination_parameters.page_size
+        ]
+        posts = {
+            post.id: post
+            for post in PostModel.query.options(
+                *post_loaders(in_collection=False)
+            ).filter(PostModel.id.in_({post_id for _, _, post_id, _ in window}))
+        }
+        return [
+            (found_in, posts[post_id])
+            for _, _, post_id, found_in in window
+            if post_id in posts
+        ]
+
+    def build(self):
+        posts_of_title, posts_of_author = {}, {}
+        title_of, author_of = {}, {}
+        quotes, addresses = {}, {}
+        for id, title_id, author_id, quote, address in self._posts():
+            posts_of_title.setdefault(title_id, set()).add(id)
+            posts_of_author.setdefault(author_id, set()).add(id)
+            title_of[id] = title_id
+            author_of[id] = author_id
+            quotes[id] = quote
+            addresses[id] = address
+        titles = dict(db.session.query(TitleModel.id, TitleModel.title))
+        authors = dict(db.session.query(AuthorModel.id, AuthorModel.name))
+        # title and author documents lead to their posts, the others are posts.
+        return {
+            "title": self._index(titles, posts_of_title),
+            "author": self._index(authors, posts_of_author),
+            "quote": self._index(quotes),
+            "address": self._index(addresses),
+            "parents": {"title": title_of, "author": author_of},
+        }
+
+    def update(self, state, rows):
+        ids = {model: set() for model in self.models}
+        for model, id in rows:
+            ids[model].add(id)
+        state = dict(state)
+        if ids[PostModel]:
+            posts = {id: rest for id, *rest in self._posts(ids[PostModel])}
+            state["parents"] = dict(state["parents"])
+            for found_in, position in (("title", 0), ("author", 1)):
+                state[found_in], state["parents"][found_in] = self._move(
+                    state[found_in],
+                    state["parents"][found_in],
+                    ids[PostModel],
+                    {id: post[position] for id, post in posts.items()},
+                )
+            for found_in, position in (("quote", 2), ("address", 3)):
+                state[found_in] = self._replace(
+                    state[found_in],
+                    ids[PostModel],
+                    {id: post[position] for id, post in posts.items()},
+                )
+        for found_in, model, column in (
+            ("title", TitleModel, TitleModel.title),
+            ("author", AuthorModel, AuthorModel.name),
+        ):
+            if ids[model]:
+                texts = dict(
+                    db.session.query(model.id, column).filter(model.id.in_(ids[model]))
+                )
+                state[found_in] = self._replace(state[found_in], ids[model], texts)
+        return state
+
+    @staticmethod
+    def _posts(ids=None):
+        query = db.session.query(
+            PostModel.id,
+            PostModel.title_id,
+            PostModel.author_id,
+            PostModel.quote,
+            PostModel.address,
+        )
+        if ids is not None:
+            query = query.filter(PostModel.id.in_(ids))
+        return query
+
+    @staticmethod
+    def _index(texts, posts_of=None):
+        documents = {id: set(tokenize(text)) for id, text in texts.items()}
+        postings = {}
+        for id, tokens in documents.items():
+            for token in tokens:
+                postings.setdefault(token, set()).add(id)
+        return postings, sorted(postings), documents, posts_of
+
+    @staticmethod
+    def _replace(index, ids, texts):
+        """Copy of `index` with the documents `ids` set to `texts`, or removed
+        where `texts` has none."""
+        postings, tokens, documents, posts_of = index
+        postings, documents = dict(postings), dict(documents)
+        copied = set()
+        new_tokens = False
+        for id in ids:
+            old = documents.pop(id, set())
+            new = set(tokenize(texts[id])) if id in texts else set()
+            if id in texts:
+                documents[id] = new
+            for token in old ^ new:
+                if token not in copied:
+                    new_tokens |= token not in postings
+                    postings[token] = set(postings.get(token, ()))
+                    copied.add(token)
+                if token in new:
+                    postings[token].add(id)
+                else:
+                    postings[token].discard(id)
+        if new_tokens:
+            tokens = sorted(postings)
+        return postings, tokens, documents, posts_of
+
+    @staticmethod
+    def _move(index, parent_of, post_ids, parents):
+        """Copies of `index` and `parent_of` with the posts `post_ids` under
+        their `parents`, or under none where `parents` has none."""
+        postings, tokens, documents, posts_of = index
+        posts_of, parent_of = dict(posts_of), dict(parent_of)
+        for post_id in post_ids:
+            old, new = parent_of.pop(post_id, None), parents.get(post_id)
+            if old is not None:
+                posts_of[old] = posts_of.get(old, set()) - {post_id}
+            if new is not None:
+                posts_of[new] = posts_of.get(new, set()) | {post_id}
+                parent_of[post_id] = new
+        return (postings, tokens, documents, posts_of), parent_of
+
+
+inverted_index = InvertedIndex()
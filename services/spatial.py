@@ -0,0 +1,276 @@
+import math
+import sqlite3
+
+from sqlalchemy import and_, event, func, or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from db import db
+from loaders import post_loaders
+from models import PostModel
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+# Most geohash cells one area is split into on databases without GiST;
+# the precision is lowered until the area fits.
+MAX_CELLS = 16
+EARTH_RADIUS = 6371008.8
+
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    if latitude is None or longitude is None:
+        return None
+    return _geohash(
+        _interleave(*_grid(latitude, longitude, precision), precision), precision
+    )
+
+
+def _grid(latitude, longitude, precision):
+    """Column and row of the point on the grid of geohashes of `precision`."""
+    bits = 5 * precision
+    columns, rows = 1 << (bits + 1) // 2, 1 << bits // 2
+    x = min(int((longitude + 180) / 360 * columns), columns - 1)
+    y = min(int((latitude + 90) / 180 * rows), rows - 1)
+    return max(x, 0), max(y, 0)
+
+
+def _interleave(x, y, precision):
+    # Geohash bits alternate between longitude and latitude, longitude first.
+    bits = 5 * precision
+    x_bits, y_bits = (bits + 1) // 2, bits // 2
+    value = 0
+    for bit in range(bits):
+        if bit % 2 == 0:
+            x_bits -= 1
+            value = value << 1 | (x >> x_bits) & 1
+        else:
+            y_bits -= 1
+            value = value << 1 | (y >> y_bits) & 1
+    return value
+
+
+def _geohash(value, precision):
+    return "".join(
+        GEOHASH_ALPHABET[value >> 5 * (precision - 1 - position) & 31]
+        for position in range(precision)
+    )
+
+
+def geohash_bounds(geohash):
+    """Return the (south, west, north, east) of a geohash cell."""
+    precision = len(geohash)
+    value = 0
+    for char in geohash:
+        value = value << 5 | GEOHASH_ALPHABET.index(char)
+    x = y = 0
+    for bit in range(5 * precision):
+        if bit % 2 == 0:
+            x = x << 1 | value >> 5 * precision - 1 - bit & 1
+        else:
+            y = y << 1 | value >> 5 * precision - 1 - bit & 1
+    bits = 5 * precision
+    width = 360 / (1 << (bits + 1) // 2)
+    height = 180 / (1 << bits // 2)
+    south, west = y * height - 90, x * width - 180
+    return south, west, south + height, west + width
+
+
+def geohash_cell_count(south, west, north, east, precision):
+    """Number of geohash cells of `precision` the box overlaps."""
+    x0, y0 = _grid(south, west, precision)
+    x1, y1 = _grid(north, east, precision)
+    return (x1 - x0 + 1) * (y1 - y0 + 1)
+
+
+def geohash_ranges(south, west, north, east, precision=GEOHASH_PRECISION):
+    """Return [(first, after)] geohash ranges covering the box.
+
+    `after` is None for a range that runs to the end. The precision is the
+    highest one up to `precision` covering the box with at most MAX_CELLS
+    cells; cells following each other in geohash order are merged into one
+    range. An empty list means the box is too large to be worth narrowing
+    down.
+    """
+    cells = None
+    for precision in range(1, precision + 1):
+        if geohash_cell_count(south, west, north, east, precision) > MAX_CELLS:
+            break
+        x0, y0 = _grid(south, west, precision)
+        x1, y1 = _grid(north, east, precision)
+        cells = precision, [
+            _interleave(x, y, precision)
+            for x in range(x0, x1 + 1)
+            for y in range(y0, y1 + 1)
+        ]
+    if cells is None:
+        return []
+    precision, values = cells
+    ranges = []
+    for value in sorted(values):
+        if ranges and ranges[-1][1] == value:
+            ranges[-1][1] = value + 1
+        else:
+            ranges.append([value, value + 1])
+    return [
+        (
+            _geohash(first, precision),
+            _geohash(after, precision) if after < 1 << 5 * precision else None,
+        )
+        for first, after in ranges
+    ]
+
+
+def location_point():
+    # Must stay identical to the GiST expression index created in the migrations.
+    return func.point(PostModel.longitude, PostModel.latitude)
+
+
+def area_filter(boxes):
+    """Condition matching posts inside any of the (south, west, north, east) boxes."""
+    conditions = []
+    for south, west, north, east in boxes:
+        if db.engine.dialect.name == "postgresql":
+            conditions.append(
+                location_point().op("<@")(
+                    func.box(func.point(west, south), func.point(east, north))
+                )
+            )
+            continue
+        ranges = [
+            (
+                PostModel.geohash >= first
+                if after is None
+                else and_(PostModel.geohash >= first, PostModel.geohash < after)
+            )
+            for first, after in geohash_ranges(south, west, north, east)
+        ]
+        conditions.append(
+            and_(
+                or_(*ranges) if ranges else PostModel.geohash.is_not(None),
+                PostModel.latitude.between(south, north),
+                PostModel.longitude.between(west, east),
+            )
+        )
+    return or_(*conditions)
+
+
+def boxes_around(latitude, longitude, radius):
+    """Boxes bounding the circle of `radius` meters, split at the antimeridian."""
+    angle = radius / EARTH_RADIUS
+    south = latitude - math.degrees(angle)
+    north = latitude + math.degrees(angle)
+    if south <= -90 or north >= 90:
+        return [(max(south, -90), -180, min(north, 90), 180)]
+    ratio = math.sin(angle) / math.cos(math.radians(latitude))
+    if ratio >= 1:
+        return [(south, -180, north, 180)]
+    spread = math.degrees(math.asin(ratio))
+    return split_box(south, longitude - spread, north, longitude + spread)
+
+
+def split_box(south, west, north, east):
+    """Normalize the longitudes of a box, splitting it at the antimeridian."""
+    if east - west >= 360:
+        return [(south, -180, north, 180)]
+    west = (west + 180) % 360 - 180
+    east = (east + 180) % 360 - 180
+    if west <= east:
+        return [(south, west, north, east)]
+    return [(south, west, north, 180), (south, -180, north, east)]
+
+
+def haversine(latitude, longitude, other_latitude, other_longitude):
+    """Distance in meters on a spherical Earth."""
+    lat1, lat2 = math.radians(latitude), math.radians(other_latitude)
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1)
+        * math.cos(lat2)
+        * math.sin(math.radians(other_longitude - longitude) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(a)))
+
+
+def _haversine_term(latitude, longitude):
+    # sin²(d / 2R) of the distance d to each post, the `a` of haversine():
+    # it grows with the distance, so it both filters and orders by the
+    # distance that is reported. Wrapping around the antimeridian needs no
+    # care, sin² of half the longitude difference has a period of 360.
+    half = math.pi / 360
+    north = func.sin((PostModel.latitude - latitude) * half)
+    east = func.sin((PostModel.longitude - longitude) * half)
+    scale = math.cos(math.radians(latitude))
+    return north * north + scale * func.cos(PostModel.latitude * 2 * half) * east * east
+
+
+def posts_nearby(latitude, longitude, radius, pagination_parameters):
+    """Return `{"distance", "post"}` items within `radius` meters, nearest first."""
+    angle = min(radius / EARTH_RADIUS, math.pi)
+    return _posts_by_distance(
+        boxes_around(latitude, longitude, radius),
+        latitude,
+        longitude,
+        pagination_parameters,
+        _haversine_term(latitude, longitude) <= math.sin(angle / 2) ** 2,
+    )
+
+
+def posts_in_box(south, west, north, east, pagination_parameters):
+    """Return `{"distance", "post"}` items inside the box, nearest to its center first."""
+    if east < west:
+        east += 360
+    center = (west + east) / 2
+    return _posts_by_distance(
+        split_box(south, west, north, east),
+        (south + north) / 2,
+        (center + 180) % 360 - 180,
+        pagination_parameters,
+    )
+
+
+def _posts_by_distance(boxes, latitude, longitude, pagination_parameters, *where):
+    condition = and_(area_filter(boxes), *where)
+    rows = (
+        db.session.query(PostModel, func.count().over().label("total"))
+        .options(*post_loaders(in_collection=False))
+        .filter(condition)
+        .order_by(_haversine_term(latitude, longitude), PostModel.id)
+        .limit(pagination_parameters.page_size)
+        .offset(pagination_parameters.first_item)
+        .all()
+    )
+    if rows:
+        pagination_parameters.item_count = rows[0].total
+    else:
+        pagination_parameters.item_count = (
+            db.session.query(func.count(PostModel.id)).filter(condition).scalar()
+        )
+    return [
+        {
+            "distance": haversine(latitude, longitude, post.latitude, post.longitude),
+            "post": post,
+        }
+        for post, _ in rows
+    ]
+
+
+@event.listens_for(Engine, "connect")
+def _add_math_functions(dbapi_connection, connection_record):
+    # SQLite has sin() and cos() only when built with its math functions.
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    try:
+        dbapi_connection.execute("SELECT sin(0), cos(0)")
+    except sqlite3.OperationalError:
+        dbapi_connection.create_function("sin", 1, math.sin, deterministic=True)
+        dbapi_connection.create_function("cos", 1, math.cos, deterministic=True)
+
+
+@event.listens_for(Session, "before_flush")
+def _update_geohashes(session, flush_context, instances):
+    # Bulk inserts set the geohash themselves with geohash_encode().
+    for instance in (*session.new, *session.dirty):
+        if isinstance(instance, PostModel):
+            geohash = geohash_encode(instance.latitude, instance.longitude)
+            if instance.geohash != geohash:
+                instance.geohash = geohash
@@ -0,0 +1,87 @@
+from flask import current_app
+
+from metrics import TimedCalls
+
+FOLDER = "picturesque"
+
+
+class UploadError(Exception):
+    pass
+
+
+class CloudinaryUploader:
+    def __init__(self, cloud_name, api_key, api_secret):
+        # Imported here, the SDK is slow to import and needs no loading in
+        # processes that never upload.
+        import cloudinary
+        import cloudinary.uploader
+
+        cloudinary.config(
+            cloud_name=cloud_name,
+            api_key=api_key,
+            api_secret=api_secret,
+            secure=True,
+        )
+        self.cloudinary = cloudinary
+
+    def upload(self, file, public_id):
+        try:
+            response = self.cloudinary.uploader.upload(
+                file,
+                public_id=public_id,
+                folder=FOLDER,
+                width=800,
+                height=600,
+                crop="limit",
+            )
+        except self.cloudinary.exceptions.GeneralError as e:
+            raise UploadError(str(e)) from e
+        thumbnail_url = self.cloudinary.CloudinaryImage(response["public_id"]).image(
+            gravity="auto", height=120, width=150, crop="thumb"
+        )
+        return {
+            "public_id": response["public_id"],
+            "photo_url": response["secure_url"],
+            "thumbnail_url": thumbnail_url,
+        }
+
+    def destroy(self, public_id):
+        self.cloudinary.uploader.destroy(public_id=public_id)
+
+
+class FakeUploader:
+    """Offline uploader for tests and benchmarks, keeps only the public ids."""
+
+    def __init__(self, **credentials):
+        self.uploaded = set()
+
+    def upload(self, file, public_id):
+        public_id = f"{FOLDER}/{public_id}"
+        self.uploaded.add(public_id)
+        url = f"https://images.invalid/{public_id}"
+        return {
+            "public_id": public_id,
+            "photo_url": url,
+            "thumbnail_url": f'<img src="{url}_thumb"/>',
+        }
+
+    def destroy(self, public_id):
+        self.uploaded.discard(public_id)
+
+
+UPLOADER_BACKENDS = {"cloudinary": CloudinaryUploader, "fake": FakeUploader}
+
+
+def get_uploader():
+    if "uploader" not in current_app.extensions:
+        config = current_app.config
+        backend = UPLOADER_BACKENDS[config["UPLOADER_BACKEND"]]
+        uploader = backend(
+            cloud_name=config["CLOUDINARY_CLOUD_NAME"],
+            api_key=config["CLOUDINARY_API_KEY"],
+            api_secret=config["CLOUDINARY_API_SECRET"],
+        )
+        current_app.extensions["uploader"] = TimedCalls(
+            uploader, config["UPLOADER_BACKEND"]
+        )
+    return current_app.extensions["uploader"]
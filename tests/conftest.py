@@ -0,0 +1,67 @@
+import os
+from uuid import uuid4
+
+import pytest
+
+from benchmarks.environment import OFFLINE_BACKENDS
+
+for name, value in OFFLINE_BACKENDS.items():
+    os.environ.setdefault(name, value)
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from app import create_app  # noqa: E402
+from benchmarks import generate_data  # noqa: E402
+from db import db  # noqa: E402
+from models import AuthorModel, PostModel, TitleModel  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """The app on a SQLite database seeded with a little synthetic data."""
+    path = tmp_path_factory.mktemp("db") / "test.db"
+    app = create_app(f"sqlite:///{path}")
+    with app.app_context():
+        db.create_all()
+        generate_data(users=5, authors=10, posts=200, collections=100)
+    return app
+
+
+@pytest.fixture
+def auth_headers(app):
+    """Return the Authorization headers of a user id, as issued by /login."""
+
+    def headers(user_id):
+        if user_id is None:
+            return {}
+        with app.app_context():
+            token = create_access_token(identity=user_id)
+        return {"Authorization": f"Bearer {token}"}
+
+    return headers
+
+
+@pytest.fixture(scope="session")
+def add_post(app):
+    """Return a function committing a post, with a new author and title."""
+
+    def add(
+        quote="A quote.", title="Untitled", author="Anonymous", user_id=1, **fields
+    ):
+        with app.app_context():
+            author = AuthorModel(name=author)
+            post = PostModel(
+                user_id=user_id,
+                author=author,
+                title=TitleModel(title=title, author=author),
+                quote=quote,
+                filename=f"test_{uuid4().hex}",
+                thumbnail_url="<img/>",
+                photo_url="https://images.invalid/test",
+                **fields,
+            )
+            db.session.add(post)
+            db.session.commit()
+            return post.id
+
+    return add
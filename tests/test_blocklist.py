@@ -0,0 +1,86 @@
+import time
+
+from memory_redis import MemoryRedis
+from services.blocklist import TokenBlocklist
+
+
+class CountingRedis(MemoryRedis):
+    def __init__(self):
+        super().__init__()
+        self.gets = 0
+
+    def get(self, key):
+        self.gets += 1
+        return super().get(key)
+
+
+def _ready(blocklist, timeout=5):
+    blocklist.is_revoked("warm-up")
+    deadline = time.monotonic() + timeout
+    while not blocklist.ready:
+        assert time.monotonic() < deadline, "blocklist never subscribed"
+        time.sleep(0.01)
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_logout_revokes_only_its_token(app, auth_headers):
+    client = app.test_client()
+    revoked, other = auth_headers(1), auth_headers(1)
+    assert client.post("/users/recommendations/", headers=revoked).status_code == 200
+    assert client.delete("/logout", headers=revoked).status_code == 200
+    response = client.post("/users/recommendations/", headers=revoked)
+    assert "token_revoked" in response.get_data(as_text=True)
+    response = client.post("/users/recommendations/", headers=other)
+    assert response.status_code == 200
+    assert "token_revoked" not in response.get_data(as_text=True)
+
+
+def test_revocations_reach_other_workers():
+    redis = CountingRedis()
+    revoked_before = TokenBlocklist(redis)
+    revoked_before.revoke("before")
+    worker = TokenBlocklist(redis)
+    _ready(worker)
+    # Seeded from the sorted set of recent revocations.
+    assert worker.is_revoked("before")
+
+    TokenBlocklist(redis).revoke("after")
+    # Published to subscribed workers.
+    _wait_for(lambda: worker._might_contain("after"))
+    assert worker.is_revoked("after")
+
+
+def test_unrevoked_tokens_are_checked_without_redis():
+    redis = CountingRedis()
+    worker = TokenBlocklist(redis)
+    _ready(worker)
+    worker.revoke("revoked")
+    gets = redis.gets
+    assert not any(worker.is_revoked(f"token-{number}") for number in range(100))
+    assert redis.gets == gets
+
+
+def test_bloom_filter_hits_are_confirmed_with_redis():
+    redis = CountingRedis()
+    worker = TokenBlocklist(redis)
+    _ready(worker)
+    # In the filter, but expired in Redis.
+    worker._add("expired", time.time() + 60)
+    gets = redis.gets
+    assert not worker.is_revoked("expired")
+    assert redis.gets == gets + 1
+
+
+def test_filters_of_expired_slices_are_dropped():
+    worker = TokenBlocklist(MemoryRedis(), slice=10)
+    worker._add("old", time.time() - 20)
+    worker._add("new", time.time() + 20)
+    assert not worker._might_contain("old")
+    assert worker._might_contain("new")
+    assert len(worker._filters) == 1
@@ -0,0 +1,190 @@
+import base64
+import io
+import json
+import zipfile
+from datetime import datetime, timedelta
+
+import pytest
+
+from db import db
+from models import ImportJobModel, PostModel
+from services import get_uploader
+from services.bulk_import import BulkImporter, open_import, process_import_job
+from services.uploads import UploadError
+
+PHOTO = base64.b64encode(b"photo").decode()
+
+
+def _item(number, **fields):
+    item = {
+        "author": "Imported Author",
+        "title": "Imported Title",
+        "quote": f"Imported quote {number}.",
+        "address": "krakow",
+        "photo_data": PHOTO,
+    }
+    item.update(fields)
+    # None leaves a field out, e.g. photo_data for items with a photo file.
+    return {name: value for name, value in item.items() if value is not None}
+
+
+def _ndjson(*lines):
+    return "\n".join(
+        line if isinstance(line, str) else json.dumps(line) for line in lines
+    ).encode()
+
+
+def _archive(manifest, photos, manifest_name="import/posts.ndjson"):
+    file = io.BytesIO()
+    with zipfile.ZipFile(file, "w") as archive:
+        archive.writestr(manifest_name, manifest)
+        for name, photo in photos.items():
+            archive.writestr(f"import/{name}", photo)
+    return file.getvalue()
+
+
+def _upload(app, headers, content, name="posts.zip"):
+    response = app.test_client().post(
+        "/posts/import",
+        data={"file": (io.BytesIO(content), name)},
+        headers=headers,
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 202
+    return app.test_client().get(response.headers["Location"], headers=headers)
+
+
+def _quotes(app, prefix):
+    with app.app_context():
+        return {
+            quote
+            for quote, in db.session.query(PostModel.quote).filter(
+                PostModel.quote.startswith(prefix)
+            )
+        }
+
+
+def test_failed_items_are_reported_and_skipped(app, auth_headers):
+    manifest = _ndjson(
+        _item(1, quote="Archive quote 1.", photo="one.jpg", photo_data=None),
+        "{not json",
+        _item(3, quote="Archive quote 3.", author=""),
+        _item(4, quote="Archive quote 4.", photo="missing.jpg", photo_data=None),
+        _item(5, quote="Archive quote 5.", photo="notes.txt", photo_data=None),
+        _item(6, quote="Archive quote 6."),
+    )
+    content = _archive(manifest, {"one.jpg": b"photo", "notes.txt": b"text"})
+
+    job = _upload(app, auth_headers(4), content).get_json()
+
+    assert job["status"] == ImportJobModel.DONE
+    assert (job["total"], job["created"], job["failed"]) == (6, 2, 4)
+    assert [error["item"] for error in job["errors"]] == [2, 3, 4, 5]
+    assert job["errors"][0]["error"] == "Invalid JSON."
+    assert job["errors"][1]["error"].startswith("author:")
+    assert job["errors"][2]["error"] == "Photo not found in the archive."
+    assert job["errors"][3]["error"] == "Invalid format."
+    assert _quotes(app, "Archive quote") == {"Archive quote 1.", "Archive quote 6."}
+
+
+def test_ndjson_without_archive(app, auth_headers):
+    content = _ndjson(
+        _item(1, quote="Plain quote 1."),
+        _item(2, quote="Plain quote 2.", photo="one.jpg", photo_data=None),
+        _item(3, quote="Plain quote 3.", photo_data="not base64!"),
+    )
+
+    job = _upload(app, auth_headers(4), content, name="posts.ndjson").get_json()
+
+    assert (job["total"], job["created"], job["failed"]) == (3, 1, 2)
+    assert [error["error"] for error in job["errors"]] == [
+        "Without an archive photos must be sent as photo_data.",
+        "photo_data is not valid base64.",
+    ]
+    assert _quotes(app, "Plain quote") == {"Plain quote 1."}
+
+
+def test_unreadable_archive_fails_the_job(app, auth_headers):
+    file = io.BytesIO()
+    with zipfile.ZipFile(file, "w") as archive:
+        archive.writestr("a.ndjson", _ndjson(_item(1)))
+        archive.writestr("b.ndjson", _ndjson(_item(1)))
+
+    job = _upload(app, auth_headers(4), file.getvalue()).get_json()
+
+    assert job["status"] == ImportJobModel.FAILED
+    assert job["error"] == "The archive must contain one NDJSON file."
+
+
+def test_upload_errors_fail_only_their_items(app, monkeypatch):
+    with app.app_context():
+        uploader = get_uploader()._target
+        upload = uploader.upload
+        calls = []
+
+        def upload_some(file, public_id):
+            calls.append(public_id)
+            if len(calls) % 2 == 0:
+                raise UploadError("Upload rejected.")
+            return upload(file, public_id)
+
+        monkeypatch.setattr(uploader, "upload", upload_some)
+        source = open_import(
+            io.BytesIO(
+                _ndjson(*(_item(n, quote=f"Uploaded quote {n}.") for n in range(4)))
+            )
+        )
+        report = BulkImporter(4, chunk_size=2, upload_workers=1).run(source)
+
+    assert (report["total"], report["created"], report["failed"]) == (4, 2, 2)
+    assert [error["item"] for error in report["errors"]] == [2, 4]
+    assert _quotes(app, "Uploaded quote") == {"Uploaded quote 0.", "Uploaded quote 2."}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 100])
+def test_resumed_import_skips_counted_items(app, chunk_size):
+    prefix = f"Resumed quote {chunk_size}"
+    lines = _ndjson("{not json", *(_item(n, quote=f"{prefix}-{n}.") for n in range(4)))
+    with app.app_context():
+        report = BulkImporter(
+            4,
+            chunk_size=chunk_size,
+            report={
+                "total": 3,
+                "created": 2,
+                "failed": 1,
+                "errors": [{"item": 1, "error": "Invalid JSON."}],
+            },
+        ).run(open_import(io.BytesIO(lines)))
+
+    assert (report["total"], report["created"], report["failed"]) == (5, 4, 1)
+    assert len(report["errors"]) == 1
+    assert _quotes(app, prefix) == {f"{prefix}-2.", f"{prefix}-3."}
+
+
+def test_worker_continues_abandoned_jobs(app):
+    lines = _ndjson(*(_item(n, quote=f"Abandoned quote {n}.") for n in range(3)))
+    timeout = timedelta(seconds=app.config["INGEST_JOB_TIMEOUT"])
+    with app.app_context():
+        job = ImportJobModel(
+            user_id=4,
+            archive=lines,
+            archive_name="posts.ndjson",
+            status=ImportJobModel.PROCESSING,
+            total=1,
+            created=1,
+            updated=datetime.utcnow() - 2 * timeout,
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        process_import_job(job.id)
+
+        job = db.session.get(ImportJobModel, job.id)
+        assert job.status == ImportJobModel.DONE
+        assert (job.total, job.created, job.failed) == (3, 3, 0)
+        assert job.archive is None
+    assert _quotes(app, "Abandoned quote") == {
+        "Abandoned quote 1.",
+        "Abandoned quote 2.",
+    }
@@ -0,0 +1,32 @@
+from sqlalchemy import func
+
+from db import db
+from models import PostModel
+
+
+def test_clusters_count_the_posts_in_their_cells(app):
+    client = app.test_client()
+    response = client.get("/posts/clusters?bbox=-10,35,30,60&zoom=6")
+    assert response.status_code == 200
+    clusters = response.get_json()["clusters"]
+    assert clusters
+    with app.app_context():
+        for cluster in clusters:
+            assert cluster["count"] == db.session.scalar(
+                db.select(func.count()).where(
+                    PostModel.geohash.startswith(cluster["geohash"])
+                )
+            )
+
+
+def test_clusters_of_the_whole_map_count_every_located_post(app):
+    client = app.test_client()
+    response = client.get("/posts/clusters?bbox=-180,-90,180,90&zoom=0")
+    assert response.status_code == 200
+    with app.app_context():
+        located = db.session.scalar(
+            db.select(func.count()).where(PostModel.geohash.is_not(None))
+        )
+    assert sum(cluster["count"] for cluster in response.get_json()["clusters"]) == (
+        located
+    )
@@ -0,0 +1,114 @@
+from db import db
+from models import CollectionModel, PostModel
+from services.collections import ALREADY_COLLECTED, NOT_COLLECTED, NOT_FOUND, OWN_POST
+
+USER_ID = 5
+
+
+def _collected(app, post_ids):
+    with app.app_context():
+        return set(
+            db.session.scalars(
+                db.select(CollectionModel.post_id).where(
+                    CollectionModel.user_id == USER_ID,
+                    CollectionModel.post_id.in_(post_ids),
+                )
+            )
+        )
+
+
+def _size(app):
+    with app.app_context():
+        return CollectionModel.query.filter_by(user_id=USER_ID).count()
+
+
+def _missing_id(app):
+    with app.app_context():
+        return db.session.scalar(db.select(db.func.max(PostModel.id))) + 1000
+
+
+def test_batch_adds_and_reports_skipped_posts(app, auth_headers, add_post):
+    first, second = add_post(user_id=1), add_post(user_id=2)
+    own, collected = add_post(user_id=USER_ID), add_post(user_id=3)
+    missing = _missing_id(app)
+    client = app.test_client()
+    client.post(f"/collections/{collected}", headers=auth_headers(USER_ID))
+
+    response = client.post(
+        "/collections/",
+        json={"add": [first, second, first, own, collected, missing]},
+        headers=auth_headers(USER_ID),
+    )
+
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result["added"] == [first, second]
+    assert result["removed"] == []
+    assert result["skipped"] == [
+        {"post_id": own, "reason": OWN_POST},
+        {"post_id": missing, "reason": NOT_FOUND},
+        {"post_id": collected, "reason": ALREADY_COLLECTED},
+    ]
+    assert result["collection_size"] == _size(app)
+    assert _collected(app, [first, second, own, collected]) == {
+        first,
+        second,
+        collected,
+    }
+
+
+def test_batch_adds_and_removes_at_once(app, auth_headers, add_post):
+    kept, removed, added = (add_post(user_id=1) for _ in range(3))
+    never_collected = add_post(user_id=1)
+    client = app.test_client()
+    client.post(
+        "/collections/", json={"add": [kept, removed]}, headers=auth_headers(USER_ID)
+    )
+
+    result = client.post(
+        "/collections/",
+        json={"add": [added], "remove": [removed, never_collected]},
+        headers=auth_headers(USER_ID),
+    ).get_json()
+
+    assert result["added"] == [added]
+    assert result["removed"] == [removed]
+    assert result["skipped"] == [{"post_id": never_collected, "reason": NOT_COLLECTED}]
+    assert _collected(app, [kept, removed, added, never_collected]) == {kept, added}
+    assert result["collection_size"] == _size(app)
+
+
+def test_batch_rejects_adding_and_removing_a_post(app, auth_headers, add_post):
+    post_id = add_post(user_id=1)
+    response = app.test_client().post(
+        "/collections/",
+        json={"add": [post_id], "remove": [post_id]},
+        headers=auth_headers(USER_ID),
+    )
+    assert response.status_code == 422
+    assert not _collected(app, [post_id])
+
+
+def test_single_post_errors(app, auth_headers, add_post):
+    post_id, own = add_post(user_id=1), add_post(user_id=USER_ID)
+    missing = _missing_id(app)
+    client = app.test_client()
+    headers = auth_headers(USER_ID)
+
+    assert client.post(f"/collections/{missing}", headers=headers).status_code == 404
+    assert client.post(f"/collections/{own}", headers=headers).status_code == 400
+    assert client.delete(f"/collections/{post_id}", headers=headers).status_code == 400
+    assert client.delete(f"/collections/{missing}", headers=headers).status_code == 404
+
+    response = client.post(f"/collections/{post_id}", headers=headers)
+    assert response.status_code == 201
+    assert response.get_json()["in_collection"] is True
+    assert client.post(f"/collections/{post_id}", headers=headers).status_code == 400
+
+    response = client.delete(f"/collections/{post_id}", headers=headers)
+    assert response.status_code == 201
+    assert response.get_json() == {
+        "post_id": post_id,
+        "in_collection": False,
+        "collection_size": _size(app),
+    }
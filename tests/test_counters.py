@@ -0,0 +1,116 @@
+from sqlalchemy import func, select
+
+from db import db
+from models import AuthorModel, CollectionModel, PostModel, TitleModel, UserModel
+from services import recount_counters
+
+
+def _stored(model, column, ids):
+    return dict(
+        db.session.execute(
+            select(model.id, getattr(model, column)).where(model.id.in_(ids))
+        ).all()
+    )
+
+
+def _counted(model, key, ids):
+    counts = dict(
+        db.session.execute(
+            select(key, func.count()).where(key.in_(ids)).group_by(key)
+        ).all()
+    )
+    return {id: counts.get(id, 0) for id in ids}
+
+
+def _assert_counters_match(app):
+    """Every stored counter equals the count of rows it stands for."""
+    with app.app_context():
+        for model, column, key in (
+            (TitleModel, "post_count", PostModel.title_id),
+            (AuthorModel, "post_count", PostModel.author_id),
+            (PostModel, "collected_count", CollectionModel.post_id),
+        ):
+            ids = db.session.scalars(select(model.id)).all()
+            assert _stored(model, column, ids) == _counted(model, key, ids)
+
+
+def test_counters_follow_posts_and_collections(app, auth_headers, add_post):
+    first, second = add_post(user_id=1), add_post(user_id=1)
+    _assert_counters_match(app)
+
+    client = app.test_client()
+    for user_id in (2, 3):
+        client.post(
+            "/collections/",
+            json={"add": [first, second]},
+            headers=auth_headers(user_id),
+        )
+    client.delete(f"/collections/{second}", headers=auth_headers(3))
+    _assert_counters_match(app)
+
+    with app.app_context():
+        moved = db.session.get(PostModel, first)
+        target = db.session.get(PostModel, second)
+        moved.author_id, moved.title_id = target.author_id, target.title_id
+        db.session.commit()
+        assert db.session.get(TitleModel, target.title_id).post_count == 2
+        db.session.delete(db.session.get(PostModel, second))
+        db.session.commit()
+    _assert_counters_match(app)
+
+
+def test_deleted_users_are_uncounted(app, auth_headers, add_post):
+    post_id = add_post(user_id=1)
+    with app.app_context():
+        user = UserModel(username="leaving", password="x")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    app.test_client().post(f"/collections/{post_id}", headers=auth_headers(user_id))
+    with app.app_context():
+        assert db.session.get(PostModel, post_id).collected_count == 1
+        db.session.delete(db.session.get(UserModel, user_id))
+        db.session.commit()
+        assert db.session.get(PostModel, post_id).collected_count == 0
+    _assert_counters_match(app)
+
+
+def test_recount_repairs_counters(app, add_post):
+    post_id = add_post(user_id=1)
+    with app.app_context():
+        post = db.session.get(PostModel, post_id)
+        post.collected_count = 7
+        post.author.post_count = 0
+        post.title.post_count = 3
+        db.session.commit()
+        recount_counters()
+    _assert_counters_match(app)
+
+
+def test_gc_orphans_deletes_names_without_posts(app, add_post):
+    kept, deleted = add_post(user_id=1), add_post(user_id=1)
+    with app.app_context():
+        post = db.session.get(PostModel, deleted)
+        author_id, title_id = post.author_id, post.title_id
+        # An author whose only title has no posts goes with it.
+        orphan = AuthorModel(name="Orphaned Author")
+        orphan.titles.append(TitleModel(title="Orphaned Title"))
+        db.session.add(orphan)
+        db.session.delete(post)
+        db.session.commit()
+        orphan_id = orphan.id
+
+    result = app.test_cli_runner().invoke(args=["gc-orphans"])
+
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith("Deleted ")
+    with app.app_context():
+        assert db.session.get(TitleModel, title_id) is None
+        assert db.session.get(AuthorModel, author_id) is None
+        assert db.session.get(AuthorModel, orphan_id) is None
+        post = db.session.get(PostModel, kept)
+        assert db.session.get(AuthorModel, post.author_id) is not None
+        assert db.session.get(TitleModel, post.title_id) is not None
+        assert not db.session.scalar(
+            select(func.count()).where(TitleModel.post_count == 0)
+        )
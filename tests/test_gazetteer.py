@@ -0,0 +1,88 @@
+import math
+import random
+
+import pytest
+
+from services.gazetteer import Gazetteer, GazetteerError, build_gazetteer
+from services.spatial import haversine
+
+
+def _geonames_line(id, name, latitude, longitude, country, population):
+    columns = [""] * 19
+    columns[0] = str(id)
+    columns[1] = columns[2] = name
+    columns[4], columns[5] = f"{latitude:.5f}", f"{longitude:.5f}"
+    columns[6], columns[8], columns[14] = "P", country, str(population)
+    return "\t".join(columns)
+
+
+@pytest.fixture(scope="module")
+def places(tmp_path_factory):
+    rng = random.Random(1)
+    places = [
+        (
+            f"Place {id}",
+            round(math.degrees(math.asin(rng.uniform(-1, 1))), 5),
+            round(rng.uniform(-180, 180), 5),
+            rng.choice(["FR", "PL", "US"]),
+            rng.randint(0, 10**6),
+        )
+        for id in range(2000)
+    ]
+    # Two places of one name, the more populous one in Texas.
+    places += [
+        ("Paris", 48.85341, 2.3488, "FR", 2138551),
+        ("Paris", 33.66094, -95.55551, "US", 24782),
+    ]
+    directory = tmp_path_factory.mktemp("gazetteer")
+    source = directory / "cities.txt"
+    source.write_text(
+        "\n".join(_geonames_line(id, *place) for id, place in enumerate(places, 1))
+        + "\n",
+        encoding="utf-8",
+    )
+    path = directory / "places.gaz"
+    assert build_gazetteer(source, path) == len(places)
+    return path, places
+
+
+def test_reverse_finds_the_nearest_place(places):
+    path, places = places
+    gazetteer = Gazetteer(path, max_distance=500000)
+    rng = random.Random(2)
+    for _ in range(300):
+        latitude = math.degrees(math.asin(rng.uniform(-1, 1)))
+        longitude = rng.uniform(-180, 180)
+        distance, nearest = min(
+            (haversine(latitude, longitude, place[1], place[2]), place)
+            for place in places
+        )
+        expected = f"{nearest[0]}, {nearest[3]}" if distance <= 500000 else None
+        assert gazetteer.reverse(latitude, longitude) == expected
+
+
+def test_geocode_prefers_the_most_populous_place(places):
+    gazetteer = Gazetteer(places[0])
+    assert gazetteer.geocode("paris") == (48.85341, 2.3488)
+    assert gazetteer.geocode("Paris, US") == (33.66094, -95.55551)
+    # Coordinates are stored as 32-bit floats.
+    assert gazetteer.geocode("Place 17") == pytest.approx(places[1][17][1:3], abs=1e-4)
+    assert gazetteer.geocode("Nowhere") is None
+
+
+def test_empty_gazetteer_finds_nothing(tmp_path):
+    source = tmp_path / "cities.txt"
+    source.write_text("", encoding="utf-8")
+    assert build_gazetteer(source, tmp_path / "places.gaz") == 0
+    gazetteer = Gazetteer(tmp_path / "places.gaz")
+    assert gazetteer.reverse(48.85, 2.35) is None
+    assert gazetteer.geocode("Paris") is None
+
+
+@pytest.mark.parametrize("content", [None, b"", b"PQGAZ"])
+def test_unreadable_file_is_rejected(tmp_path, content):
+    path = tmp_path / "places.gaz"
+    if content is not None:
+        path.write_bytes(content)
+    with pytest.raises(GazetteerError):
+        Gazetteer(path)
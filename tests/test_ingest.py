@@ -0,0 +1,170 @@
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from geopy.exc import GeocoderUnavailable
+
+from db import db
+from models import FilenameReservationModel, IngestJobModel, PostModel
+from services import UploadError, get_geocoder, get_uploader, ingest_pipeline
+
+
+def _post(app, headers, address="london"):
+    return app.test_client().post(
+        "/posts/",
+        data={
+            "author": "Ingested Author",
+            "title": "Ingested Title",
+            "quote": "An ingested quote.",
+            "address": address,
+            "photo": (io.BytesIO(b"photo"), "photo.jpg"),
+        },
+        headers=headers,
+        content_type="multipart/form-data",
+    )
+
+
+def _job(app, id):
+    with app.app_context():
+        job = db.session.get(IngestJobModel, id)
+        db.session.expunge(job)
+        return job
+
+
+@pytest.fixture
+def uploader(app):
+    with app.app_context():
+        return get_uploader()._target
+
+
+def _fail_with(monkeypatch, target, name, exception):
+    def fail(*args, **kwargs):
+        raise exception
+
+    monkeypatch.setattr(target, name, fail)
+
+
+def test_job_creates_the_post(app, auth_headers, uploader):
+    response = _post(app, auth_headers(2))
+    assert response.status_code == 202
+    location = response.headers["Location"]
+
+    status = app.test_client().get(location, headers=auth_headers(2)).get_json()
+    assert status["status"] == IngestJobModel.DONE
+    assert status["error"] is None
+    job = _job(app, status["id"])
+    assert job.photo is None
+    with app.app_context():
+        post = db.session.get(PostModel, job.post_id)
+        assert post.user_id == 2
+        assert (post.latitude, post.longitude) == get_geocoder().geocode("london")
+        assert post.author.name == "Ingested Author"
+        assert post.photo_url.endswith(post.filename)
+        assert not db.session.get(FilenameReservationModel, post.filename)
+    assert any(post.filename in public_id for public_id in uploader.uploaded)
+
+
+def test_job_status_is_private(app, auth_headers):
+    location = _post(app, auth_headers(2)).headers["Location"]
+    response = app.test_client().get(location, headers=auth_headers(3))
+    assert response.status_code == 401
+
+
+def test_geocoder_outage_fails_the_job(app, auth_headers, monkeypatch):
+    with app.app_context():
+        geocoder = get_geocoder()
+    _fail_with(monkeypatch, geocoder, "geocode", GeocoderUnavailable("down"))
+    job = _job(app, _post(app, auth_headers(2)).get_json()["id"])
+    assert job.status == IngestJobModel.FAILED
+    assert job.error == "Geocoder currently not available. Try later."
+    assert job.photo is None
+    assert job.post_id is None
+
+
+def test_upload_error_fails_the_job(app, auth_headers, uploader, monkeypatch):
+    _fail_with(monkeypatch, uploader, "upload", UploadError("Photo too large."))
+    with app.app_context():
+        reservations = FilenameReservationModel.query.count()
+    job = _job(app, _post(app, auth_headers(2)).get_json()["id"])
+    assert job.status == IngestJobModel.FAILED
+    assert job.error == "Photo too large."
+    with app.app_context():
+        assert FilenameReservationModel.query.count() == reservations
+
+
+def test_failure_after_upload_removes_the_photo(
+    app, auth_headers, uploader, monkeypatch
+):
+    import services.ingest
+
+    _fail_with(monkeypatch, services.ingest, "get_or_create_author", ValueError())
+    uploaded = set(uploader.uploaded)
+    with app.app_context():
+        posts = PostModel.query.count()
+    job = _job(app, _post(app, auth_headers(2)).get_json()["id"])
+    assert job.status == IngestJobModel.FAILED
+    assert job.error == "Post could not be created."
+    assert uploader.uploaded == uploaded
+    with app.app_context():
+        assert PostModel.query.count() == posts
+
+
+def test_worker_takes_over_abandoned_jobs(app):
+    now = datetime.utcnow()
+    timeout = timedelta(seconds=app.config["INGEST_JOB_TIMEOUT"])
+    cases = {
+        "pending": (IngestJobModel.PENDING, None),
+        "abandoned": (IngestJobModel.PROCESSING, now - 2 * timeout),
+        "running": (IngestJobModel.PROCESSING, now),
+        "failed": (IngestJobModel.FAILED, now - 2 * timeout),
+    }
+    with app.app_context():
+        jobs = {
+            name: IngestJobModel(
+                user_id=2,
+                author="Reclaimed Author",
+                title="Reclaimed Title",
+                quote="A reclaimed quote.",
+                address="paris",
+                photo=b"photo",
+                photo_name="photo.jpg",
+                status=status,
+                updated=updated,
+            )
+            for name, (status, updated) in cases.items()
+        }
+        db.session.add_all(jobs.values())
+        db.session.commit()
+        ids = {name: job.id for name, job in jobs.items()}
+
+        ingest_pipeline.work(once=True)
+
+    statuses = {name: _job(app, id).status for name, id in ids.items()}
+    assert statuses == {
+        "pending": IngestJobModel.DONE,
+        "abandoned": IngestJobModel.DONE,
+        "running": IngestJobModel.PROCESSING,
+        "failed": IngestJobModel.FAILED,
+    }
+
+
+def test_claimed_jobs_are_not_processed_twice(app):
+    with app.app_context():
+        job = IngestJobModel(
+            user_id=2,
+            author="Claimed Author",
+            title="Claimed Title",
+            quote="A claimed quote.",
+            address="dublin",
+            photo=b"photo",
+            photo_name="photo.jpg",
+        )
+        db.session.add(job)
+        db.session.commit()
+        id = job.id
+        ingest_pipeline.process(id)
+        post_id = db.session.get(IngestJobModel, id).post_id
+        ingest_pipeline.process(id)
+        job = db.session.get(IngestJobModel, id)
+        assert job.status == IngestJobModel.DONE
+        assert job.post_id == post_id
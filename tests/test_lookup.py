@@ -0,0 +1,55 @@
+from db import db
+from services.lookup import author_lookup, get_or_create_author, get_or_create_title
+
+
+def test_authors_are_found_despite_case_accents_and_typos(app):
+    with app.app_context():
+        author = get_or_create_author("Gabriel García Márquez")
+        db.session.commit()
+        for name in (
+            "Gabriel García Márquez",
+            "gabriel garcia marquez",
+            "Gabriel García Márquezz",
+        ):
+            assert author_lookup.find(name).id == author.id, name
+        assert get_or_create_author("GABRIEL GARCIA MARQUEZ").id == author.id
+
+
+def test_names_match_themselves(app):
+    with app.app_context():
+        author = get_or_create_author("Wisława Szymborska")
+        db.session.commit()
+        assert author_lookup.find("Wisława Szymborska").id == author.id
+
+
+def test_different_authors_are_created(app):
+    with app.app_context():
+        first = get_or_create_author("Olga Tokarczuk")
+        second = get_or_create_author("Olga Tokarska")
+        db.session.commit()
+        assert first.id != second.id
+
+
+def test_titles_are_matched_within_their_author(app):
+    with app.app_context():
+        author = get_or_create_author("Italo Calvinoesque")
+        other = get_or_create_author("Jorge Borgesian")
+        title = get_or_create_title("Invisible Cities", author.id)
+        db.session.commit()
+        assert get_or_create_title("Invisible cities!", author.id).id == title.id
+        assert get_or_create_title("The Invisible Cities", author.id).id == title.id
+        assert get_or_create_title("Invisible Cities", other.id).id != title.id
+        db.session.commit()
+
+
+def test_autocomplete_matches_name_prefixes(app):
+    with app.app_context():
+        author_id = get_or_create_author("Yasunari Kawabatanabe").id
+        db.session.commit()
+    client = app.test_client()
+    for q in ("kawabatanabe", "Kawabatan", "yasunari kawabatanab"):
+        response = client.get(f"/authors/?q={q}&page_size=100")
+        assert response.status_code == 200
+        assert author_id in [item["id"] for item in response.get_json()], q
+    response = client.get("/authors/?q=zzyzx&page_size=100")
+    assert author_id not in [item["id"] for item in response.get_json()]
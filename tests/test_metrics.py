@@ -0,0 +1,21 @@
+import pytest
+
+import resources.posts
+from metrics import metrics
+
+
+def test_requests_that_raise_are_timed(app, monkeypatch):
+    def search_posts(*args):
+        raise RuntimeError("search is down")
+
+    monkeypatch.setattr(resources.posts, "search_posts", search_posts)
+    # Unhandled exceptions skip after_request when they propagate.
+    monkeypatch.setitem(app.config, "PROPAGATE_EXCEPTIONS", True)
+    with pytest.raises(RuntimeError):
+        app.test_client().get("/posts/?q=river")
+    assert any(
+        line.startswith("http_request_duration_seconds_count{")
+        and 'endpoint="posts.PostsList"' in line
+        and 'status="500"' in line
+        for line in metrics.render().splitlines()
+    )
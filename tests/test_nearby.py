@@ -0,0 +1,118 @@
+import json
+
+import pytest
+from sqlalchemy import select
+
+from db import db
+from models import PostModel
+from services.spatial import haversine
+
+# (latitude, longitude) of test posts: around a point in the South Pacific,
+# across the antimeridian from it, and near the north pole.
+PLACES = [
+    (-40.0, -170.0),
+    (-40.001, -170.0),
+    (-40.0, -170.003),
+    (-40.02, -169.98),
+    (-40.2, -170.0),
+    (-41.0, -170.0),
+    (-20.0, 179.998),
+    (-20.0, -179.999),
+    (-20.001, 179.99),
+    (89.99, 0.0),
+    (89.99, 180.0),
+]
+
+
+@pytest.fixture(scope="module")
+def places(add_post):
+    """The ids of posts at PLACES, added once for the module."""
+    return [
+        add_post(quote=f"Nearby quote {n}.", latitude=latitude, longitude=longitude)
+        for n, (latitude, longitude) in enumerate(PLACES)
+    ]
+
+
+def _expected(app, latitude, longitude, radius=None):
+    """Ids nearest first, ties by id, by the distance of every post."""
+    with app.app_context():
+        rows = db.session.execute(
+            select(PostModel.id, PostModel.latitude, PostModel.longitude).where(
+                PostModel.latitude.is_not(None)
+            )
+        ).all()
+    distances = {id: haversine(latitude, longitude, lat, lon) for id, lat, lon in rows}
+    return [
+        id
+        for id in sorted(distances, key=lambda id: (distances[id], id))
+        if radius is None or distances[id] <= radius
+    ]
+
+
+def _nearby(app, latitude, longitude, radius, page_size=100):
+    response = app.test_client().get(
+        "/posts/nearby",
+        query_string={
+            "lat": latitude,
+            "lon": longitude,
+            "radius": radius,
+            "page_size": page_size,
+        },
+    )
+    assert response.status_code == 200
+    return response
+
+
+@pytest.mark.parametrize(
+    "latitude, longitude, radius",
+    [
+        (-40.0, -170.0, 1000),
+        (-40.0, -170.0, 50000),
+        (-40.0, -170.0, 500000),
+        (-20.0, 180.0, 2000),
+        (-20.0, -180.0, 20000),
+        (90.0, 0.0, 5000),
+    ],
+)
+def test_nearby_matches_brute_force(app, places, latitude, longitude, radius):
+    items = _nearby(app, latitude, longitude, radius).get_json()
+
+    assert [item["post"]["id"] for item in items] == _expected(
+        app, latitude, longitude, radius
+    )
+    distances = [item["distance"] for item in items]
+    assert distances == sorted(distances)
+    assert all(distance <= radius for distance in distances)
+    assert set(places) & {item["post"]["id"] for item in items}
+
+
+def test_nearby_pages_continue_in_distance_order(app, places):
+    expected = _expected(app, -40.0, -170.0, 500000)
+    first = _nearby(app, -40.0, -170.0, 500000, page_size=2)
+    assert json.loads(first.headers["X-Pagination"])["total"] == len(expected)
+
+    ids = []
+    for page in range(1, len(expected) // 2 + 2):
+        response = app.test_client().get(
+            "/posts/nearby",
+            query_string={
+                "lat": -40.0,
+                "lon": -170.0,
+                "radius": 500000,
+                "page": page,
+                "page_size": 2,
+            },
+        )
+        ids += [item["post"]["id"] for item in response.get_json()]
+    assert ids == expected
+
+
+def test_box_is_ordered_by_distance_to_its_center(app, places):
+    # West of east: the box spans the antimeridian.
+    response = app.test_client().get(
+        "/posts/", query_string={"bbox": "179.9,-20.1,-179.9,-19.9", "page_size": 100}
+    )
+    assert response.status_code == 200
+    ids = [item["post"]["id"] for item in response.get_json()]
+    assert ids == _expected(app, -20.0, 180.0, 15000)
+    assert set(ids) == set(places[6:9])
@@ -0,0 +1,36 @@
+from contextlib import contextmanager
+
+import pytest
+
+from db import db
+from services.query_plans import QUERY_BUDGETS, count_queries, sample_parameters
+
+
+@contextmanager
+def assert_max_queries(limit):
+    with count_queries() as statements:
+        yield statements
+    if len(statements) > limit:
+        raise AssertionError(
+            f"{len(statements)} queries run, at most {limit} expected:\n"
+            + "\n".join(statements)
+        )
+
+
+@pytest.mark.parametrize("method, url", list(QUERY_BUDGETS))
+def test_endpoint_stays_within_query_budget(
+    app, auth_headers, monkeypatch, method, url
+):
+    # Cached responses would hide the queries being checked.
+    monkeypatch.setitem(app.config, "RESPONSE_CACHE_ENABLED", False)
+    client = app.test_client()
+    with app.app_context():
+        parameters = sample_parameters()
+        headers = auth_headers(parameters["user"])
+        db.session.remove()
+        path = url.format(**parameters)
+        # The first request builds the local indexes.
+        client.open(path, method=method, headers=headers)
+        with assert_max_queries(QUERY_BUDGETS[(method, url)]):
+            response = client.open(path, method=method, headers=headers)
+    assert 200 <= response.status_code < 300, response.get_json()
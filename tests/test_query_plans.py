@@ -0,0 +1,8 @@
+from services.query_plans import check_query_plans
+
+
+def test_hot_queries_use_indexes(app):
+    with app.app_context():
+        plans = check_query_plans()
+    scans = {name: plan for name, (uses_index, plan) in plans.items() if not uses_index}
+    assert not scans, f"Full table scans: {scans}"
@@ -0,0 +1,83 @@
+from sqlalchemy import select
+
+from db import db
+from models import CollectionModel, PostModel, UserModel
+from services.recommendations import recommendation_scores
+
+
+def _baseline(user_id):
+    """The original per-user scoring: {post id: points}."""
+    collected = {}
+    for collector, post_id in db.session.execute(
+        select(CollectionModel.user_id, CollectionModel.post_id)
+    ):
+        collected.setdefault(collector, set()).add(post_id)
+    own_choice = collected.get(user_id, set())
+    own_posts = set(db.session.scalars(select(PostModel.id).filter_by(user_id=user_id)))
+    points = {}
+    for other, likes in collected.items():
+        if other == user_id or not likes & own_choice:
+            continue
+        for post_id in likes - own_choice - own_posts:
+            points[post_id] = points.get(post_id, 0) + len(likes & own_choice)
+    return points
+
+
+def _ranked(points):
+    return sorted(points, key=lambda post_id: (-points[post_id], -post_id))
+
+
+def _user_ids(app):
+    with app.app_context():
+        return list(db.session.scalars(select(UserModel.id).order_by(UserModel.id)))
+
+
+def test_scores_match_the_baseline(app):
+    with app.app_context():
+        for user_id in _user_ids(app):
+            scores = recommendation_scores(user_id)
+            assert dict(db.session.execute(select(scores)).all()) == _baseline(user_id)
+
+
+def test_endpoint_lists_the_best_posts_first(app, auth_headers):
+    client = app.test_client()
+    for user_id in _user_ids(app):
+        response = client.post(
+            "/users/recommendations/?page_size=100", headers=auth_headers(user_id)
+        )
+        assert response.status_code == 200
+        with app.app_context():
+            top = _ranked(_baseline(user_id))[: app.config["RECOMMENDATIONS_TOP_N"]]
+        assert [post["id"] for post in response.get_json()] == top[:100]
+
+
+def test_collection_changes_reach_the_recommendations(app, auth_headers):
+    client = app.test_client()
+    user_id, other = _user_ids(app)[:2]
+    with app.app_context():
+        post_id = db.session.scalar(
+            select(PostModel.id)
+            .where(
+                PostModel.user_id.not_in((user_id, other)),
+                PostModel.id.not_in(
+                    select(CollectionModel.post_id).where(
+                        CollectionModel.user_id.in_((user_id, other))
+                    )
+                ),
+            )
+            .order_by(PostModel.id)
+        )
+    # Read once, so the stored recommendations are up to date.
+    client.post("/users/recommendations/", headers=auth_headers(user_id))
+    for collector in (user_id, other):
+        response = client.post(
+            f"/collections/{post_id}", headers=auth_headers(collector)
+        )
+        assert response.status_code == 201
+
+    response = client.post(
+        "/users/recommendations/?page_size=100", headers=auth_headers(user_id)
+    )
+    with app.app_context():
+        expected = _ranked(_baseline(user_id))
+    assert [post["id"] for post in response.get_json()] == expected[:100]
@@ -0,0 +1,110 @@
+from sqlalchemy import func, select
+
+from db import db
+from models import CollectionModel, PostModel
+
+
+def _post(app, offset):
+    """(post id, owner id, a user who did not collect it) of some post."""
+    with app.app_context():
+        post = db.session.scalars(
+            select(PostModel).order_by(PostModel.id.desc()).offset(offset).limit(1)
+        ).one()
+        collectors = select(CollectionModel.user_id).where(
+            CollectionModel.post_id == post.id
+        )
+        other = db.session.scalar(
+            select(func.min(PostModel.user_id)).where(
+                PostModel.user_id != post.user_id,
+                PostModel.user_id.not_in(collectors),
+            )
+        )
+        return post.id, post.user_id, other
+
+
+def test_unchanged_response_is_not_modified(app):
+    client = app.test_client()
+    post_id, _, _ = _post(app, 0)
+    response = client.get(f"/posts/{post_id}")
+    assert response.status_code == 200
+    assert response.headers["ETag"]
+    response = client.get(
+        f"/posts/{post_id}", headers={"If-None-Match": response.headers["ETag"]}
+    )
+    assert response.status_code == 304
+
+
+def test_cached_list_keeps_pagination_headers(app):
+    client = app.test_client()
+    first = client.get("/authors/?page_size=3")
+    second = client.get("/authors/?page_size=3")
+    assert second.headers["X-Pagination"] == first.headers["X-Pagination"]
+
+
+def test_updated_post_is_served_fresh(app, auth_headers):
+    client = app.test_client()
+    post_id, owner, _ = _post(app, 1)
+    etag = client.get(f"/posts/{post_id}").headers["ETag"]
+    response = client.put(
+        f"/posts/{post_id}",
+        data={"quote": "A quote written by the cache test."},
+        headers=auth_headers(owner),
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 201
+    response = client.get(f"/posts/{post_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["quote"] == "A quote written by the cache test."
+
+
+def test_new_title_refreshes_the_old_title_and_the_author(app, auth_headers):
+    client = app.test_client()
+    post_id, owner, _ = _post(app, 2)
+    with app.app_context():
+        post = db.session.get(PostModel, post_id)
+        title_id, author_id = post.title_id, post.author_id
+    assert post_id in client.get(f"/titles/{title_id}").get_json()["posts"]
+    client.get(f"/authors/{author_id}")
+
+    response = client.put(
+        f"/posts/{post_id}",
+        data={"title": "Cache Invalidation Considered Harmful"},
+        headers=auth_headers(owner),
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 201
+    assert post_id not in client.get(f"/titles/{title_id}").get_json()["posts"]
+    titles = client.get(f"/authors/{author_id}").get_json()["titles"]
+    assert any(
+        title["title"] == "Cache Invalidation Considered Harmful"
+        and post_id in title["posts"]
+        for title in titles
+    )
+
+
+def test_collecting_a_post_refreshes_it(app, auth_headers):
+    client = app.test_client()
+    post_id, _, collector = _post(app, 3)
+    before = client.get(f"/posts/{post_id}").get_json()["collected_count"]
+    response = client.post(f"/collections/{post_id}", headers=auth_headers(collector))
+    assert response.status_code == 201
+    post = client.get(f"/posts/{post_id}").get_json()
+    assert post["collected_count"] == before + 1
+    assert collector in [user["id"] for user in post["in_collection"]]
+
+    response = client.post(
+        "/collections/",
+        json={"remove": [post_id]},
+        headers=auth_headers(collector),
+    )
+    assert response.status_code == 200
+    assert client.get(f"/posts/{post_id}").get_json()["collected_count"] == before
+
+
+def test_deleted_post_is_not_served(app, auth_headers):
+    client = app.test_client()
+    post_id, owner, _ = _post(app, 4)
+    assert client.get(f"/posts/{post_id}").status_code == 200
+    response = client.delete(f"/posts/{post_id}", headers=auth_headers(owner))
+    assert response.status_code == 200
+    assert client.get(f"/posts/{post_id}").status_code == 400
@@ -0,0 +1,62 @@
+from db import db
+from models import PostModel
+
+
+def _search(app, q, page_size=100):
+    response = app.test_client().get(f"/posts/?q={q}&page_size={page_size}")
+    assert response.status_code == 200
+    return [(item["found_in"], item["post"]["id"]) for item in response.get_json()]
+
+
+def test_terms_match_word_prefixes(app, add_post):
+    post_id = add_post(quote="The zanzibarian tortoise walked home.")
+    assert _search(app, "zanzib") == [("quote", post_id)]
+    assert _search(app, "ZANZIBARIAN tort") == [("quote", post_id)]
+    assert _search(app, "anzibarian") == []
+
+
+def test_all_terms_match_in_the_same_field(app, add_post):
+    post_id = add_post(quote="A quiet kingfisher.", address="Ouagadougou")
+    assert _search(app, "kingfisher") == [("quote", post_id)]
+    assert _search(app, "kingfisher ouagadougou") == []
+
+
+def test_each_matching_field_is_an_item(app, add_post):
+    post_id = add_post(
+        quote="Every cormorant knows.", title="Cormorant", author="Ann Cormorant"
+    )
+    assert sorted(_search(app, "cormorant")) == [
+        ("author", post_id),
+        ("quote", post_id),
+        ("title", post_id),
+    ]
+
+
+def test_rare_matches_rank_first(app, add_post):
+    common = [add_post(quote=f"Kumquat number {number}.") for number in range(30)]
+    rare = add_post(title="Kumquat")
+    results = _search(app, "kumquat")
+    # Among the titles the word is unique, among the quotes it is common.
+    assert results[0] == ("title", rare)
+    assert sorted(post_id for _, post_id in results[1:]) == common
+
+
+def test_edits_are_searchable_after_commit(app, add_post):
+    post_id = add_post(quote="An albatross.")
+    with app.app_context():
+        db.session.get(PostModel, post_id).quote = "A pelican."
+        db.session.commit()
+    assert _search(app, "albatross") == []
+    assert _search(app, "pelican") == [("quote", post_id)]
+
+
+def test_pages_split_the_results(app, add_post):
+    for number in range(7):
+        add_post(quote=f"Marmalade jar {number}.")
+    client = app.test_client()
+    everything = _search(app, "marmalade")
+    response = client.get("/posts/?q=marmalade&page=2&page_size=3")
+    assert [item["post"]["id"] for item in response.get_json()] == [
+        post_id for _, post_id in everything[3:6]
+    ]
+    assert '"total": 7' in response.headers["X-Pagination"]